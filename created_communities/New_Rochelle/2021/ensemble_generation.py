@@ -0,0 +1,153 @@
+# ------------------------------------------------------------------
+#
+#	Generate an ensemble of New Rochelle populations
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import abm_residential as res
+import abm_public as public
+import abm_transit as travel
+import abm_agents as agents
+import abm_ensemble as ens
+
+# ------------------------------------------------------------------
+#
+# Generate multiple New Rochelle populations for the COVID model
+#
+# ------------------------------------------------------------------
+
+#
+# Input files
+#
+
+# GIS and type data files database
+dpath = '../../../town_data/NewRochelle/database/'
+cpath = '../../../town_data/NewRochelle/census_data/'
+year = '2021'
+
+# File with residential GIS data
+res_file = dpath + 'residential.txt'
+# File with residential building types
+res_type_file = dpath + 'residential_types.txt'
+# File with residential units data
+units_file = cpath + 'unit_stats.txt'
+# File with public places GIS data (used only for special workplaces)
+pb_file = dpath + 'public.txt'
+# File with regular workplaces inside (with business type)
+pb_file_gis = dpath + year + '_core_poi_NewRochelleIn_WorkTrimmed.csv'
+# File with regular workplaces inside (with occupation)
+pb_file_in = dpath + year + '_core_poi_NewRochelleIn_OccupationTrimmed.csv'
+# File with public places GIS data that are outside (with occupation)
+pb_file_out = dpath + year + '_core_poi_NewRochelleOut_WorkTrimmed.csv'
+# File with building types
+pb_type_file = dpath + 'public_types_mobility.txt'
+# File with leisure inside of town
+pb_leisure_file_in = dpath + year + '_core_poi_NewRochelleIn_LeisureTrimmed.csv'
+# File with leisure outside of town
+pb_leisure_file_out = dpath + year + '_core_poi_NewRochelleOut_LeisureTrimmed.csv'
+
+# File with age distribution
+file_age_dist = cpath + 'age_distribution.txt'
+# File with age distribution of the household head
+file_hs_age = cpath + 'age_household_head.txt'
+# File with household size distribution
+file_hs_size = cpath + 'household_size.txt'
+# File with travel times to work
+ftimes = cpath + 'travel_time_to_work.txt'
+# File with means of transportation to work
+fmodes = cpath + 'transit_mode.txt'
+# Carpool count of passengers and fraction of carpools that have it
+fcpools = cpath + 'carpool_stats.txt'
+# Public transit routes in the area
+fpt_routes = dpath + 'public_transit_routes.txt'
+# Occupation statistics
+foccupation = dpath + 'match_occupation.txt'
+focc_cap = dpath + 'occupation_capacity.txt'
+agent_occ = dpath + 'occupation_stats.txt'
+
+#
+# Other input
+#
+
+# Total number of units (households + vacancies)
+n_tot = 29645
+# Fraction of vacant households
+fr_vacant = 0.053
+# Total number of agents
+n_agents = 79205
+# Number of employed agents (summed from occupation stats file)
+n_employed = 39758
+# Longest time to travel to work
+tmax = 60*24 
+# Acceptable transit modes
+travel_modes = ['car', 'carpool', 'public', 'walk', 'other', 'wfh']
+# Speed of each travel mode used to compute distance
+mode_speed = {'car': 30, 'carpool': 30, 'public': 20, 
+					'walk': 2, 'other': 3, 'wfh': 0}
+t_wfh = 5.0
+t_walk = 12.0
+# Assumed maximum age
+max_age = 100
+# Fraction of families
+fr_fam = 0.6727
+# Fraction of couple no children
+fr_couple = 0.49
+# Fraction of single parents
+fr_sp = 0.25
+# Fraction of households with a 60+ person
+fr_60 = 0.423
+# Initially infected
+n_infected = 1
+# Max working age (same for hospitals and non-hospitals now)
+max_working_age = 70
+
+#
+# Ensemble settings
+#
+
+# Number of populations to generate
+n_replicates = 8
+# Number of processes, None for all available cores
+n_proc = None
+# Root seed, same seed gives the same populations
+seed = 2021
+# Each population is saved in out_dir/replicate_i
+out_dir = 'ensemble'
+
+if __name__ == '__main__':
+
+	#
+	# Generate places - shared by all the populations
+	#
+
+	households = res.Households(n_tot, res_file, res_type_file)
+	retirement_homes = public.RetirementHomes(pb_file, pb_type_file)
+	hospitals = public.Hospitals(pb_file, pb_type_file)
+	schools = public.Schools(pb_file, pb_type_file)
+	workplaces = public.Workplaces(pb_file_gis, pb_file_out, pb_type_file, foccupation, pb_file_in, focc_cap)
+	workplaces.merge_with_special_workplaces(schools.schools, retirement_homes.retirement_homes, hospitals.hospitals)
+	leisure = public.LeisureLocations(pb_leisure_file_in, pb_leisure_file_out, True)
+	transit = travel.Transit(ftimes, fmodes, fcpools, fpt_routes, mode_speed, t_wfh, t_walk)
+
+	places = {'households': households, 'retirement_homes': retirement_homes,
+				'hospitals': hospitals, 'schools': schools, 
+				'workplaces': workplaces, 'leisure': leisure}
+
+	# Census data is loaded only once too
+	census = agents.Agents(file_age_dist, file_hs_age, file_hs_size, n_agents, max_age, n_tot, fr_vacant, fr_fam, fr_couple, fr_sp, fr_60, n_infected, agent_occ)
+	params = {'fr_vacancy': fr_vacant, 'max_working_age': max_working_age, 'n_employed': n_employed}
+
+	#
+	# Create the populations
+	#
+
+	ensemble = ens.Ensemble(places, census, transit, params, out_dir, seed)
+	for replicate_dir in ensemble.run(n_replicates, n_proc):
+		print('Saved population in ' + replicate_dir)
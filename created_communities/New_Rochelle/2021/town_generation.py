@@ -19,6 +19,12 @@ import abm_residential as res
 import abm_public as public
 import abm_transit as travel
 import abm_agents as agents
+import abm_random as ar
+import abm_instrumentation as inst
+import abm_poi_tables as apt
+import abm_candidates as cand
+import abm_columns as columns
+import abm_shards as shard_gen
 
 # ------------------------------------------------------------------
 #
@@ -96,6 +102,12 @@ mode_speed = {'car': 30, 'carpool': 30, 'public': 20,
 					'walk': 2, 'other': 3, 'wfh': 0}
 t_wfh = 5.0
 t_walk = 12.0
+# Candidate leisure locations of each household - number of
+# nearest locations and maximum distance in km (None for no limit)
+n_leisure_candidates = 20
+leisure_radius = None
+# Processes for the leisure candidates, all cores if None
+leisure_processes = None
 # Assumed maximum age
 max_age = 100
 # Fraction of families
@@ -110,6 +122,46 @@ fr_60 = 0.423
 n_infected = 1
 # Max working age (same for hospitals and non-hospitals now)
 max_working_age = 70
+# Workplaces whose distance differs from the work travel 
+# distance by less than this (km) are considered
+dist_tol = 5.0
+# Household members - 'sequential' one head at a time, 
+# 'batch' all heads at once
+household_composition = 'sequential'
+# Workplace selection - 'sequential' one agent at a time, 
+# 'batch' all agents at once with workplace capacities
+workplace_assignment = 'sequential'
+# Processes for 'batch' workplace selection, all cores if None
+workplace_processes = None
+# Directory with stored household - workplace distances, 
+# reused by later generations with the same places (None to skip)
+distance_cache = None
+# Search 'batch' workplace candidates with planar distances 
+# (less than 0.5% off in this area, candidates are verified)
+planar_distances = False
+# Household residents generated per shard (e.g. census tract) with 
+# its own distributions - list of dicts with files and household IDs 
+# of each shard (see abm_shards), None to generate the town at once;
+# shard households must not overlap and shard agents, retirement home
+# residents, and patients must add up to n_agents
+shards = None
+# Processes for shard generation, all cores if None
+shard_processes = None
+# Generate households and schools in blocks of households written 
+# to agent_store, for populations that do not fit in memory; later
+# stages read and write the stored agents. Households are always 
+# completed in 'batch', shards and regenerate_work are not supported
+out_of_core = False
+household_block_size = 10000
+# Load households and agents from hs_out and ag_out of a previous 
+# generation and only redo workplaces and transit, e.g. after
+# changing t_wfh, t_walk, mode_speed, dist_tol, or max_working_age
+regenerate_work = False
+# Seed of all random number streams, None for a random one
+seed = None
+# Read the SafeGraph tables from columnar (.npz) copies,
+# created next to the text files when missing or outdated
+use_poi_cache = False
 
 # 
 # Output files
@@ -124,59 +176,162 @@ ag_out = 'NR_agents.txt'
 cpool_out = 'NR_carpool.txt'
 public_out = 'NR_public.txt'
 leisure_out = 'NR_leisure.txt'
+# Prefix of the binary files with candidate leisure locations
+leisure_cand_out = 'NR_leisure_candidates'
+# Directory with agent columns (.npy) in out-of-core generation
+agent_store = 'NR_agents_columns'
+# Indexes from places to their agents
+membership_out = 'NR_membership.npz'
+# Timing and memory report
+instr_out = 'NR_generation_report.json'
 
-#
-# Generate places
-#
+if __name__ == '__main__':
+
+	if out_of_core:
+		if shards is not None:
+			raise ValueError('Sharded generation is not supported in out-of-core generation')
+		if regenerate_work:
+			raise ValueError('Regenerating work is not supported in out-of-core generation')
+		if household_composition != 'batch':
+			raise ValueError('Out-of-core generation completes households in batch, ' 
+								+ 'set household_composition to \'batch\'')
+
+	#
+	# Generate places
+	#
+
+	if use_poi_cache:
+		pb_file_gis = apt.cached_table(pb_file_gis, 'work_in')
+		pb_file_out = apt.cached_table(pb_file_out, 'work_out')
+		pb_leisure_file_in = apt.cached_table(pb_leisure_file_in, 'leisure')
+		pb_leisure_file_out = apt.cached_table(pb_leisure_file_out, 'leisure')
 
-# Households
-households = res.Households(n_tot, res_file, res_type_file)
-with open(hs_out, 'w') as fout:
-	fout.write(repr(households))
+	# Random number streams shared by all generation stages
+	rng = ar.RandomContext(seed)
+	# Timing and memory of each stage and of the hot functions
+	instr = inst.Instrumentation()
+
+	# Households
+	with instr.stage('households') as record:
+		if regenerate_work:
+			households = res.Households.load(hs_out)
+		else:
+			households = res.Households(n_tot, res_file, res_type_file, rng=rng)
+		record['count'] = len(households.households)
+	if not regenerate_work:
+		with open(hs_out, 'w') as fout:
+			fout.write(repr(households))
 	
-# Retirement homes
-retirement_homes = public.RetirementHomes(pb_file, pb_type_file)
-with open(rh_out, 'w') as fout:
-	fout.write(repr(retirement_homes))
+	# Retirement homes
+	with instr.stage('retirement homes') as record:
+		retirement_homes = public.RetirementHomes(pb_file, pb_type_file)
+		record['count'] = len(retirement_homes.retirement_homes)
+	with open(rh_out, 'w') as fout:
+		fout.write(repr(retirement_homes))
 	
-# Hospitals
-hospitals = public.Hospitals(pb_file, pb_type_file)
-with open(hsp_out, 'w') as fout:
-	fout.write(repr(hospitals))
-
-# Schools
-schools = public.Schools(pb_file, pb_type_file)
-with open(sch_out, 'w') as fout:
-	fout.write(repr(schools))
+	# Hospitals
+	with instr.stage('hospitals') as record:
+		hospitals = public.Hospitals(pb_file, pb_type_file)
+		record['count'] = len(hospitals.hospitals)
+	with open(hsp_out, 'w') as fout:
+		fout.write(repr(hospitals))
+
+	# Schools
+	with instr.stage('schools') as record:
+		schools = public.Schools(pb_file, pb_type_file)
+		record['count'] = len(schools.schools)
+	with open(sch_out, 'w') as fout:
+		fout.write(repr(schools))
 	
-# Workplaces
-workplaces = public.Workplaces(pb_file_gis, pb_file_out, pb_type_file, foccupation, pb_file_in, focc_cap)
-# Merge workplaces for distribution
-workplaces.merge_with_special_workplaces(schools.schools, retirement_homes.retirement_homes, hospitals.hospitals)
-with open(wk_out, 'w') as fout:
-	fout.write(repr(workplaces))
-
-# Leisure/time off locations
-leisure = public.LeisureLocations(pb_leisure_file_in, pb_leisure_file_out, True)
-with open(leisure_out, 'w') as fout:
-	fout.write(repr(leisure))
+	# Workplaces
+	with instr.stage('workplaces') as record:
+		workplaces = public.Workplaces(pb_file_gis, pb_file_out, pb_type_file, foccupation, pb_file_in, focc_cap)
+		# Merge workplaces for distribution
+		workplaces.merge_with_special_workplaces(schools.schools, retirement_homes.retirement_homes, hospitals.hospitals)
+		record['count'] = len(workplaces.workplaces)
+	with open(wk_out, 'w') as fout:
+		fout.write(repr(workplaces))
+
+	# Leisure/time off locations and candidates of each 
+	# household, same as before if only work is redone
+	if not regenerate_work:
+		with instr.stage('leisure locations') as record:
+			leisure = public.LeisureLocations(pb_leisure_file_in, pb_leisure_file_out, True)
+			record['count'] = leisure.ntot
+		with open(leisure_out, 'w') as fout:
+			fout.write(repr(leisure))
+
+		with instr.stage('leisure candidates', len(households.households)):
+			candidates = cand.CandidateTable.build(leisure, households.households, n_leisure_candidates, leisure_radius, 
+														leisure_processes)
+		candidates.save(leisure_cand_out)
 	
-# Transit
-transit = travel.Transit(ftimes, fmodes, fcpools, fpt_routes, mode_speed, t_wfh, t_walk)
+	# Transit
+	transit = travel.Transit(ftimes, fmodes, fcpools, fpt_routes, mode_speed, t_wfh, t_walk, rng=rng)
 
-#
-# Create the population
-#
+	#
+	# Create the population
+	#
+
+	agents = agents.Agents(file_age_dist, file_hs_age, file_hs_size, n_agents, max_age, n_tot, fr_vacant, fr_fam, fr_couple, fr_sp, fr_60, n_infected, agent_occ, rng=rng)
+	instr.attach(agents, ['select_workplace', 'select_workplaces_batch', 'complete_households', 'complete_households_batch', 
+							'group_carpools', 'group_public_transit', 'match_workplace_to_occupation'])
+
+	if regenerate_work:
+		# Households, ages, and schools of the previous generation
+		with instr.stage('loaded agents') as record:
+			agents.load_agents(ag_out)
+			agents.reset_work()
+			record['count'] = len(agents.agents)
+	else:
+		with instr.stage('retirement home residents') as record:
+			agents.distribute_retirement_homes(retirement_homes.retirement_homes)
+			record['count'] = len(agents.agents)
+		with instr.stage('hospital patients'):
+			agents.distribute_hospital_patients(hospitals.hospitals)
+
+	n_places = {'households': len(households.households), 'retirement_homes': len(retirement_homes.retirement_homes),
+				'workplaces': len(workplaces.workplaces), 'schools': len(schools.schools), 'hospitals': len(hospitals.hospitals)}
+
+	# Agent columns on disk in out-of-core generation
+	store = None
+	if out_of_core:
+		store = columns.AgentStore(agent_store, n_agents)
+		with instr.stage('household residents and schools', n_agents):
+			agents.distribute_households_out_of_core(households.households, fr_vacant, schools.schools, store, 
+														household_block_size)
+	elif not regenerate_work:
+		with instr.stage('household residents') as record:
+			if shards is None:
+				agents.distribute_households(households.households, fr_vacant, household_composition)
+			else:
+				shard_params = {'max_age': max_age, 'fr_vacancy': fr_vacant, 'fr_fam': fr_fam, 'fr_couple': fr_couple, 
+									'fr_sp': fr_sp, 'fr_60': fr_60, 'fname_census': agent_occ, 
+									'composition': household_composition}
+				shard_gen.Shards(shards, shard_params, seed).generate(agents, households.households, shard_processes)
+			record['count'] = len(agents.agents)
+
+		with instr.stage('schools', len(agents.agents)):
+			agents.distribute_schools(schools.schools)
+
+	n_generated = len(agents.agents) if store is None else store.n
+	with instr.stage('transit and workplaces', n_generated):
+		agents.distribute_transit_and_workplaces(households.households, workplaces.workplaces, transit, max_working_age, 
+							n_employed, workplaces.occ_map, workplace_assignment, workplace_processes, 
+							distance_cache, planar_distances, dist_tol, store)
 
-agents = agents.Agents(file_age_dist, file_hs_age, file_hs_size, n_agents, max_age, n_tot, fr_vacant, fr_fam, fr_couple, fr_sp, fr_60, n_infected, agent_occ)
-agents.distribute_retirement_homes(retirement_homes.retirement_homes)
-agents.distribute_hospital_patients(hospitals.hospitals)
-agents.distribute_households(households.households, fr_vacant)
+	transit.print_public_transit(public_out)
+	transit.print_carpools(cpool_out)
+	if store is None:
+		with open(ag_out, 'w') as fout:
+			fout.write(repr(agents))
+	else:
+		agents.set_infected(n_infected, store)
+		store.close()
+		store.write(ag_out)
 
-agents.distribute_schools(schools.schools)
-agents.distribute_transit_and_workplaces(households.households, workplaces.workplaces, transit, max_working_age, n_employed, workplaces.occ_map)
+	with instr.stage('membership indexes', n_generated):
+		agents.save_membership_indexes(membership_out, n_places, store)
 
-transit.print_public_transit(public_out)
-transit.print_carpools(cpool_out)
-with open(ag_out, 'w') as fout:
-	fout.write(repr(agents))
+	instr.save(instr_out)
+	print(instr)
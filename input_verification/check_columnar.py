@@ -0,0 +1,244 @@
+# ------------------------------------------------------------------
+#
+#	Module for testing generated agents and households
+#	 using columnar (array) agent data
+#
+# ------------------------------------------------------------------
+
+#
+# Same output files as check_agents and check_households,
+# all places are listed in order of their first appearance
+# in the agent list
+#
+
+import numpy as np
+
+class AgentColumns(object):
+	''' Class that stores agent properties as arrays, one per property '''
+
+	# Agent property : numpy type
+	int_keys = ['yrs', 'houseID', 'schoolID', 'workID', 'hospitalID']
+	bool_keys = ['student', 'works', 'isPatient', 'RetirementHome', 'worksRH',
+					'worksSchool', 'worksHospital', 'isFamily']
+	float_keys = ['lon', 'lat']
+
+	# Columns of NR_agents.txt, as written by Agents.__repr__
+	file_columns = {'student': 0, 'works': 1, 'yrs': 2, 'lon': 3, 'lat': 4,
+						'houseID': 5, 'isPatient': 6, 'schoolID': 7, 'RetirementHome': 8,
+						'worksRH': 9, 'worksSchool': 10, 'workID': 11, 'worksHospital': 12,
+						'hospitalID': 13}
+
+	def __init__(self, columns):
+		''' Store columns, a dict of property name : array '''
+		self.columns = columns
+		self.n = len(columns['yrs'])
+
+	@classmethod
+	def from_agents(cls, agents):
+		''' Create from a list of agents (dicts) '''
+
+		columns = {}
+		n = len(agents)
+		for key in cls.int_keys:
+			columns[key] = np.fromiter((x[key] for x in agents), dtype=np.int64, count=n)
+		for key in cls.bool_keys:
+			columns[key] = np.fromiter((x[key] for x in agents), dtype=bool, count=n)
+		for key in cls.float_keys:
+			columns[key] = np.fromiter((x[key] for x in agents), dtype=np.float64, count=n)
+		return cls(columns)
+
+	@classmethod
+	def from_file(cls, fname):
+		''' Create from a saved population file (NR_agents.txt);
+				family information is not saved in that file '''
+
+		cols = sorted(cls.file_columns.values())
+		data = np.loadtxt(fname, usecols=cols, dtype=np.float64, ndmin=2)
+
+		columns = {}
+		for key, col in cls.file_columns.items():
+			values = data[:, cols.index(col)]
+			if key in cls.int_keys:
+				columns[key] = values.astype(np.int64)
+			elif key in cls.bool_keys:
+				columns[key] = values.astype(bool)
+			else:
+				columns[key] = values
+		return cls(columns)
+
+	def __getitem__(self, key):
+		''' Column of property key '''
+		if not (key in self.columns):
+			raise KeyError('Agent property ' + key + ' is not available')
+		return self.columns[key]
+
+def group_by(keys):
+	''' Group equal keys; returns unique keys in order of first
+			appearance, index of each key's group, and first position
+			of each group '''
+
+	uniq, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+	# Relabel groups in order of appearance instead of sorted
+	order = np.argsort(first, kind='stable')
+	rank = np.empty(len(order), dtype=np.int64)
+	rank[order] = np.arange(len(order))
+	return uniq[order], rank[inverse.ravel()], first[order]
+
+def group_lists(keys, values):
+	''' Groups of values with the same key, values in original order;
+			returns unique keys and a list of arrays '''
+
+	uniq, group, first = group_by(keys)
+	perm = np.argsort(group, kind='stable')
+	counts = np.bincount(group, minlength=len(uniq))
+	return uniq, np.split(values[perm], np.cumsum(counts)[:-1])
+
+def write_counts(fout, keys, *columns):
+	''' Write lines with key followed by values from columns '''
+	for line in zip(keys.tolist(), *[x.tolist() for x in columns]):
+		fout.write((' ').join([str(x) for x in line]) + '\n')
+
+def write_lists(fout, keys, lists):
+	''' Write lines with key followed by all values in its list '''
+	for key, values in zip(keys.tolist(), lists):
+		fout.write(str(key) + ' ' + (' ').join([str(x) for x in values.tolist()]) + '\n')
+
+#
+# Agents - same as in check_agents
+#
+
+def print_age_distribution(fname, ranges, agents):
+	''' Write obtained age distribution as defined in ranges.'''
+
+	# Ranges is a list of tuples with components
+	#	(min age, max age) as ints for each range.
+	# agents - AgentColumns object
+	# Saves as percent of total population
+
+	yrs = agents['yrs']
+	with open(fname, 'w') as fout:
+		for min_age, max_age in ranges:
+			count = int(np.count_nonzero((yrs >= min_age) & (yrs <= max_age)))
+			fout.write(str(min_age) + '-' + str(max_age) + ' ' + str(count/agents.n*100) + '\n')
+
+def print_other_sizes(fname, agents, tagW, tagRS, keyType):
+	''' Computes and saves info on places that have both employees and
+		another agent type associated with them '''
+
+	#
+	# tagW - key that identifies type of place/workplace e.g. 'worksSchool'
+	# tagRS - key that identifies if the agent is the second associated
+	#			type e.g. student or RetirementHome
+	# keyType - key that identifies ID of the place
+	#
+
+	# Merge both associations, ordered as if agents were
+	# checked one by one, the second type first
+	is_rs = agents[tagRS]
+	is_w = agents[tagW]
+	pos = np.concatenate((2*np.flatnonzero(is_rs), 2*np.flatnonzero(is_w)+1))
+	keys = np.concatenate((agents[keyType][is_rs], agents['workID'][is_w]))
+	is_worker = np.concatenate((np.zeros(np.count_nonzero(is_rs), dtype=bool), np.ones(np.count_nonzero(is_w), dtype=bool)))
+	order = np.argsort(pos, kind='stable')
+	keys = keys[order]
+	is_worker = is_worker[order]
+
+	uniq, group, first = group_by(keys)
+	n_work = np.bincount(group[is_worker], minlength=len(uniq))
+	n_other = np.bincount(group[~is_worker], minlength=len(uniq))
+
+	with open(fname, 'w') as fout:
+		write_counts(fout, uniq, n_work, n_other)
+
+def print_household_sizes(fname, agents):
+	''' Computes and saves household size '''
+
+	in_rh = agents['RetirementHome']
+	with open(fname, 'w') as fout:
+		# Retirement homes first
+		for mask in [in_rh, ~in_rh]:
+			uniq, group, first = group_by(agents['houseID'][mask])
+			write_counts(fout, uniq, np.bincount(group, minlength=len(uniq)))
+
+def print_household_sizes_w_coords(fname, agents):
+	''' Computes and saves household size and coordinates '''
+
+	in_rh = agents['RetirementHome']
+	with open(fname, 'w') as fout:
+		for mask in [in_rh, ~in_rh]:
+			uniq, group, first = group_by(agents['houseID'][mask])
+			# Coordinates of the first agent in that household
+			lon = agents['lon'][mask][first]
+			lat = agents['lat'][mask][first]
+			write_counts(fout, uniq, np.bincount(group, minlength=len(uniq)), lon, lat)
+
+def print_building_sizes_w_coords(fname, agents):
+	''' Computes and saves residential building size and coordinates '''
+
+	# Buildings are identified by the sum of coordinates
+	uniq, group, first = group_by(agents['lon'] + agents['lat'])
+	with open(fname, 'w') as fout:
+		write_counts(fout, uniq, np.bincount(group, minlength=len(uniq)),
+						agents['lon'][first], agents['lat'][first])
+
+def print_workplace_sizes(fname, agents):
+	''' Computes and saves workplace size '''
+
+	uniq, group, first = group_by(agents['workID'])
+	with open(fname, 'w') as fout:
+		write_counts(fout, uniq, np.bincount(group, minlength=len(uniq)))
+
+def print_school_sizes(fname, agents):
+	''' Computes and saves school size '''
+
+	uniq, group, first = group_by(agents['schoolID'])
+	with open(fname, 'w') as fout:
+		write_counts(fout, uniq, np.bincount(group, minlength=len(uniq)))
+
+#
+# Households - same as in check_households
+#
+
+def print_houses_and_age(fname, agents):
+	''' Outputs house ID | age of every agent that lives there '''
+	print_houses_and_property(fname, agents, agents['yrs'])
+
+def print_houses_and_work_status(fname, fname_fam, agents):
+	''' Outputs house ID | and work flag of every
+			agent that lives there; includes the hospitals '''
+
+	# fname_fam is for separate file with families
+
+	works = agents['works'] | agents['worksHospital']
+	print_houses_and_property(fname, agents, works)
+
+	in_family = agents['isFamily'] & ~agents['RetirementHome']
+	uniq, lists = group_lists(agents['houseID'][in_family], works[in_family])
+	with open(fname_fam, 'w') as fout:
+		write_lists(fout, uniq, lists)
+
+def print_houses_and_work_ID(fname, agents):
+	''' Outputs house ID | and work ID of every
+			agent that lives there; no work is marked as 0;
+			hospitals are marked by a negative value '''
+
+	ID = np.where(agents['works'], agents['workID'],
+				np.where(agents['worksHospital'], -1*agents['hospitalID'], 0))
+	uniq, lists = group_lists(agents['houseID'], ID)
+	with open(fname, 'w') as fout:
+		write_lists(fout, uniq, lists)
+
+def print_houses_and_student_status(fname, agents):
+	''' Outputs house ID | and student flag of every
+			agent that lives there; includes the hospital '''
+	print_houses_and_property(fname, agents, agents['student'])
+
+def print_houses_and_property(fname, agents, values):
+	''' Outputs house ID | values of every agent that lives there,
+			retirement homes first '''
+
+	in_rh = agents['RetirementHome']
+	with open(fname, 'w') as fout:
+		for mask in [in_rh, ~in_rh]:
+			uniq, lists = group_lists(agents['houseID'][mask], values[mask])
+			write_lists(fout, uniq, lists)
@@ -0,0 +1,298 @@
+# ------------------------------------------------------------------
+#
+#	Module for validating saved populations (NR_*.txt files)
+#	 without regenerating them
+#
+#	Usage: python check_files.py population_dir [census_dir [occupation_file]]
+#	 occupation_file defaults to database/occupation_stats.txt next
+#	 to census_dir
+#
+# ------------------------------------------------------------------
+
+import os, sys
+import numpy as np
+
+class PopulationFiles(object):
+	''' Class for streaming checks of a saved population. Agents are
+			read in chunks, memory depends only on the chunk size
+			and the number of places '''
+
+	# Default names of the population files
+	file_names = {'agents': 'NR_agents.txt', 'households': 'NR_households.txt',
+					'retirement_homes': 'NR_retirement_homes.txt', 'hospitals': 'NR_hospitals.txt',
+					'schools': 'NR_schools.txt', 'workplaces': 'NR_workplaces.txt',
+					'carpools': 'NR_carpool.txt', 'public': 'NR_public.txt'}
+
+	# Columns of NR_agents.txt, as written by Agents.__repr__
+	columns = {'student': 0, 'works': 1, 'yrs': 2, 'houseID': 5, 'isPatient': 6,
+				'schoolID': 7, 'RetirementHome': 8, 'worksRH': 9, 'worksSchool': 10,
+				'workID': 11, 'worksHospital': 12, 'hospitalID': 13, 'wfh': 15,
+				'mode': 17, 'carpoolID': 19, 'publicID': 20}
+
+	def __init__(self, path, chunk_size=100000, max_carpool_size=5, max_examples=10):
+		''' Load the places, agents are only read during validation '''
+
+		#
+		# path - directory with the population files
+		# chunk_size - number of agents read at a time
+		# max_carpool_size - largest allowed number of agents in a carpool
+		# max_examples - number of offending agents stored per failed check
+		#
+
+		self.path = path
+		self.chunk_size = chunk_size
+		self.max_carpool_size = max_carpool_size
+		self.max_examples = max_examples
+
+		# Number of places, IDs are 1 to n
+		self.n_places = {}
+		for key in ['households', 'retirement_homes', 'hospitals', 'schools', 'workplaces']:
+			self.n_places[key] = self.count_places(key)
+		# Carpools and public transit - IDs that exist
+		self.carpool_IDs = self.load_IDs('carpools')
+		self.public_IDs = self.load_IDs('public')
+
+		# Check name : [number of violations, examples (line numbers)]
+		self.violations = {}
+		# Accumulated counts for capacity and distribution checks
+		self.counts = {}
+
+	def fname(self, key):
+		''' Full name of the file with key '''
+		return os.path.join(self.path, self.file_names[key])
+
+	def count_places(self, key):
+		''' Check that place IDs are 1 to n, returns n '''
+
+		n = 0
+		with open(self.fname(key), 'r') as fin:
+			for line in fin:
+				if not line.strip():
+					continue
+				n += 1
+				if int(line.split()[0]) != n:
+					raise ValueError('Non-consecutive ID ' + line.split()[0] + ' in ' + self.fname(key))
+		return n
+
+	def load_IDs(self, key):
+		''' Flag array with True for every ID present in file key '''
+
+		IDs = []
+		with open(self.fname(key), 'r') as fin:
+			for line in fin:
+				if line.strip():
+					IDs.append(int(line.split()[0]))
+		present = np.zeros(max(IDs, default=0)+1, dtype=bool)
+		present[IDs] = True
+		return present
+
+	def agent_chunks(self):
+		''' Yields first line number and a dict with columns
+				for chunk_size agents at a time '''
+
+		with open(self.fname('agents'), 'r') as fin:
+			lines = []
+			first = 1
+			for line in fin:
+				if not line.strip():
+					continue
+				lines.append(line.split())
+				if len(lines) == self.chunk_size:
+					yield first, self.to_columns(lines)
+					first += len(lines)
+					lines = []
+			if lines:
+				yield first, self.to_columns(lines)
+
+	def to_columns(self, lines):
+		''' Columns of agent properties from split lines '''
+
+		data = np.array(lines)
+		chunk = {}
+		for key, col in self.columns.items():
+			if key == 'mode':
+				chunk[key] = data[:, col]
+			else:
+				chunk[key] = data[:, col].astype(np.int64)
+		return chunk
+
+	def record(self, name, bad, first):
+		''' Register agents flagged in bad as violating check name '''
+
+		entry = self.violations.setdefault(name, [0, []])
+		n_bad = int(np.count_nonzero(bad))
+		if n_bad == 0:
+			return
+		entry[0] += n_bad
+		n_store = self.max_examples - len(entry[1])
+		if n_store > 0:
+			entry[1] += (np.flatnonzero(bad)[:n_store] + first).tolist()
+
+	def accumulate(self, key, IDs, size=None):
+		''' Add number of occurences of each ID to counter key;
+				size is the number of IDs, None if not known '''
+
+		counts = np.bincount(IDs, minlength=size or 0)
+		if size is not None:
+			counts = counts[:size]
+		if key in self.counts:
+			total = self.counts[key]
+			if len(total) < len(counts):
+				total = np.concatenate((total, np.zeros(len(counts)-len(total), dtype=np.int64)))
+			total[:len(counts)] += counts
+			self.counts[key] = total
+		else:
+			self.counts[key] = counts
+
+	def validate(self):
+		''' Stream all agents and run all the checks;
+				returns True if all integrity and capacity checks passed '''
+
+		self.violations = {}
+		self.counts = {}
+		n_agents = 0
+		n_hs = self.n_places['households']
+		n_rh = self.n_places['retirement_homes']
+
+		for first, agents in self.agent_chunks():
+			n_agents += len(agents['yrs'])
+			in_rh = agents['RetirementHome'] == 1
+			patient = agents['isPatient'] == 1
+			home = ~(in_rh | patient)
+			wfh = agents['wfh'] == 1
+			works_out = (agents['works'] == 1) & ~wfh
+
+			#
+			# Referential integrity
+			#
+
+			self.record('houseID', (home & ((agents['houseID'] < 1) | (agents['houseID'] > n_hs))) |
+							(in_rh & ((agents['houseID'] < 1) | (agents['houseID'] > n_rh))), first)
+			self.record('hospitalID', ((patient | (agents['worksHospital'] == 1)) &
+							((agents['hospitalID'] < 1) | (agents['hospitalID'] > self.n_places['hospitals']))), first)
+			self.record('schoolID', (agents['student'] == 1) &
+							((agents['schoolID'] < 1) | (agents['schoolID'] > self.n_places['schools'])), first)
+			self.record('workID', (works_out | (agents['worksHospital'] == 1)) &
+							((agents['workID'] < 1) | (agents['workID'] > self.n_places['workplaces'])), first)
+			self.record('work from home ID', wfh & (agents['workID'] != agents['houseID']), first)
+			self.record('carpoolID', self.missing(agents['carpoolID'], self.carpool_IDs), first)
+			self.record('publicID', self.missing(agents['publicID'], self.public_IDs), first)
+			self.record('carpool mode', (agents['carpoolID'] > 0) & (agents['mode'] != 'carpool'), first)
+			self.record('public transit mode', (agents['publicID'] > 0) & (agents['mode'] != 'public'), first)
+
+			#
+			# Counts for capacities and distributions
+			#
+
+			valid_hs = home & (agents['houseID'] >= 1) & (agents['houseID'] <= n_hs)
+			self.accumulate('households', agents['houseID'][valid_hs], n_hs+1)
+			valid_cp = (agents['carpoolID'] > 0) & (agents['carpoolID'] < len(self.carpool_IDs))
+			self.accumulate('carpools', agents['carpoolID'][valid_cp], len(self.carpool_IDs))
+			self.accumulate('ages', np.clip(agents['yrs'], 0, None))
+			self.counts['employed'] = self.counts.get('employed', 0) + int(np.count_nonzero((agents['works'] == 1) | (agents['worksHospital'] == 1)))
+
+		self.counts['agents'] = n_agents
+
+		#
+		# Capacities
+		#
+
+		cp_sizes = self.counts.get('carpools', np.zeros(1, dtype=np.int64))
+		self.record('carpool size', cp_sizes > self.max_carpool_size, 0)
+		self.record('carpool with one agent', cp_sizes == 1, 0)
+
+		return all([value[0] == 0 for value in self.violations.values()])
+
+	def missing(self, IDs, present):
+		''' True for non-zero IDs that are not in flag array present '''
+
+		bad = IDs > 0
+		inside = bad & (IDs < len(present))
+		bad[inside] = ~present[IDs[inside]]
+		return bad
+
+	def compare_age_distribution(self, fname, max_age, tol):
+		''' Compare percent of agents in census age groups in fname,
+				returns a list of (group, census, generated, passed) '''
+
+		ages = self.counts['ages']
+		ages = np.concatenate((ages, np.zeros(max(0, max_age+1-len(ages)), dtype=np.int64)))
+		results = []
+		with open(fname, 'r') as fin:
+			# First line is different - up to 4 years
+			line = next(fin).strip().split()
+			groups = [('0-4', 0, 4, float(line[-1]))]
+			for line in fin:
+				line = line.strip().split()
+				if line[0] == '85':
+					groups.append(('85-' + str(max_age), 85, max_age, float(line[-1])))
+				else:
+					groups.append((line[0] + '-' + line[2], int(line[0]), int(line[2]), float(line[-1])))
+		for name, min_age, max_age, census in groups:
+			value = ages[min_age:max_age+1].sum()/self.counts['agents']*100
+			results.append((name, census, value, abs(value - census) <= tol))
+		return results
+
+	def compare_household_sizes(self, fname, tol):
+		''' Compare percent of households of each size in fname,
+				the last size includes all larger households '''
+
+		sizes = self.counts['households'][1:]
+		sizes = sizes[sizes > 0]
+		census = {}
+		with open(fname, 'r') as fin:
+			for line in fin:
+				line = line.strip().split()
+				census[int(line[0])] = float(line[1])
+
+		results = []
+		max_size = max(census.keys())
+		for size, value in census.items():
+			if size == max_size:
+				num = np.count_nonzero(sizes >= size)
+			else:
+				num = np.count_nonzero(sizes == size)
+			percent = num/len(sizes)*100
+			results.append((str(size), value, percent, abs(percent - value) <= tol))
+		return results
+
+	def compare_employment(self, fname, tol):
+		''' Compare number of employed with the sum of
+				occupation statistics in fname, tol is relative '''
+
+		with open(fname, 'r') as fin:
+			census = sum([int(line.split()[1]) for line in fin if line.strip()])
+		value = self.counts['employed']
+		return [('employed', census, value, abs(value - census) <= tol*census)]
+
+	def __repr__(self):
+		''' Summary of all the checks '''
+
+		info = [str(self.counts.get('agents', 0)) + ' agents\n']
+		for name, (n_bad, examples) in self.violations.items():
+			if n_bad == 0:
+				info.append('  ' + name + ': passed\n')
+			else:
+				info.append('  ' + name + ': ' + str(n_bad) + ' violations, e.g. lines ' +
+								(', ').join([str(x) for x in examples]) + '\n')
+		return ''.join(info)
+
+if __name__ == '__main__':
+	population = PopulationFiles(sys.argv[1])
+	passed = population.validate()
+	print(population)
+
+	if len(sys.argv) > 2:
+		cpath = sys.argv[2]
+		results = population.compare_age_distribution(os.path.join(cpath, 'age_distribution.txt'), 100, 1.0)
+		results += population.compare_household_sizes(os.path.join(cpath, 'household_size.txt'), 1.0)
+		if len(sys.argv) > 3:
+			focc = sys.argv[3]
+		else:
+			focc = os.path.join(cpath, '..', 'database', 'occupation_stats.txt')
+		results += population.compare_employment(focc, 0.05)
+		for name, census, value, ok in results:
+			print('  {0:<10}{1:>10.2f}{2:>10.2f}  {3}'.format(name, census, value, 'passed' if ok else 'failed'))
+			passed = passed and ok
+
+	sys.exit(0 if passed else 1)
@@ -4,9 +4,13 @@
 #
 # ------------------------------------------------------------------
 
-import math, random, warnings
+import math, warnings
 import numpy as np
-import abm_utils as aut
+import abm_random as ar
+import abm_profiling as prof
+import abm_assignment as asg
+import abm_distances as adist
+import abm_columns as acol
 from copy import deepcopy
 from collections import defaultdict
 
@@ -14,9 +18,12 @@ class Agents(object):
 	''' Class for generating the population - agents '''
 
 	def __init__(self, fname_age, fname_hs_age, fname_hs_size, ntot, max_age, n_houses, 
-					fr_vacancy, fr_fam, fr_couple, fr_sp, fr_60, n_infected, fname_census):
+					fr_vacancy, fr_fam, fr_couple, fr_sp, fr_60, n_infected, fname_census, rng=None):
 		''' Load basic data '''
 
+		# rng - RandomContext object, each generation stage draws
+		#	from its own stream; None for a random seed
+
 		# Total number of people
 		self.ntot = ntot
 		# Maximum age to assume
@@ -35,6 +42,10 @@ class Agents(object):
 		self.fr_60 = fr_60
 		# Total number of initially infected
 		self.n_infected = n_infected
+		# Random number streams
+		if rng is None:
+			rng = ar.RandomContext()
+		self.rng = rng
 
 		# Age group : number of people in that group
 		self.age_dist = self.load_age_dist(fname_age, self.ntot, 0, 4)
@@ -52,8 +63,13 @@ class Agents(object):
 
 		# Agents
 		self.agents = []
+		# ID of the first agent in the list, earlier agents
+		# are already stored in out-of-core generation
+		self.first_ID = 1
 		# List of agents in retirement homes
 		self.rh_agents = []
+		# Household size of each household head, in order of heads
+		self.head_sizes = None
 		
 		# Census statistics of occupation distribution
 		# { occupation type : number of agents, percentage }
@@ -74,6 +90,12 @@ class Agents(object):
 							  'carpoolID': 0, 'publicID': 0, 'occupation': 'none',
 							  'work_type': 'muzikant'}
 
+		# Profiling of distribution stages, only if requested
+		# through the environment (see abm_profiling)
+		self.profiling = prof.ProfilingHooks.from_environment()
+		if self.profiling is not None:
+			self.profiling.attach(self)
+
 	def load_age_dist(self, fname_age, ntot, min_age, max_min_age):
 		''' Read and process an age distribution '''
 		# Returns a map with age group : number of people
@@ -144,7 +166,8 @@ class Agents(object):
 	
 	def distribute_retirement_homes(self, retirement_homes):
 		''' Select agents 75+ for retirement homes '''
-	
+
+		rng = self.rng.stream('retirement_homes')
 		for rh in retirement_homes:
 			n_residents = rh['num residents']
 			for ai in range(n_residents):
@@ -154,7 +177,7 @@ class Agents(object):
 				temp['ID'] = self.ID
 				self.ID += 1
 				# Age + update
-				temp['yrs'] = np.random.randint(75, self.max_age+1)
+				temp['yrs'] = int(rng.integers(75, self.max_age+1))
 				self.update_ages(temp['yrs'])
 				# Agents position
 				temp['lon'] = rh['lon']
@@ -171,7 +194,8 @@ class Agents(object):
 	def distribute_hospital_patients(self, hospitals):
 		''' Select patients with conditions other than 
 				COVID, all ages '''
-	
+
+		rng = self.rng.stream('hospital_patients')
 		for hosp in hospitals:
 			n_patients = hosp['num patients']
 			for ai in range(n_patients):
@@ -181,7 +205,7 @@ class Agents(object):
 				temp['ID'] = self.ID
 				self.ID += 1
 				# Age + update
-				temp['yrs'] = np.random.randint(0, self.max_age+1)
+				temp['yrs'] = int(rng.integers(0, self.max_age+1))
 				self.update_ages(temp['yrs'])
 				# Agents position
 				temp['lon'] = hosp['lon']
@@ -191,25 +215,125 @@ class Agents(object):
 				temp['hospitalID'] = hosp['ID']
 				self.agents.append(temp)
 
-	def distribute_households(self, households, fr_vacancy):
+	def distribute_households(self, households, fr_vacancy, composition='sequential', house_IDs=None):
 		''' Assign agents to households '''
 		
 		# fr_vacancy - fraction of vacant households
+		# composition - 'sequential' to add household members one head
+		#	at a time, 'batch' to draw them for all heads at once
+		# house_IDs - IDs of the households to populate, e.g. of one
+		#	shard (abm_shards), all households if None
 		
+		if house_IDs is None:
+			house_IDs = range(1, len(households)+1)
+
 		# Exclude vacant
-		houses_tot = len(households)
+		houses_tot = len(house_IDs)
 		nh_vacant = math.floor(fr_vacancy*houses_tot)
-		ind_vacant = random.sample(range(1, houses_tot+1), nh_vacant)
+		rng = self.rng.stream('households')
+		ind_vacant = [house_IDs[ind] for ind in rng.choice(houses_tot, nh_vacant, replace=False).tolist()]
 
 		# Select head of each household			
-		ind_available = list(set(range(1,houses_tot+1))-set(ind_vacant))
+		ind_available = list(set(house_IDs)-set(ind_vacant))
 		household_heads = self.select_household_heads(households, ind_available)
 	
 		# Select household type for each head
 		# Returns total number of households in each category
 		hs_size_totals = self.assign_household_type(household_heads)
 		# Assign remaining agents
-		self.complete_households(hs_size_totals, household_heads, households)
+		if composition == 'batch':
+			self.complete_households_batch(hs_size_totals, household_heads, households, sizes=self.head_sizes)
+		else:
+			self.complete_households(hs_size_totals, household_heads, households)
+
+	def distribute_households_out_of_core(self, households, fr_vacancy, schools, store, block_size=10000):
+		''' Assign agents to households and schools one block of 
+				households at a time, agents of each block are moved
+				to store and not kept in memory '''
+
+		#
+		# households - list of households, IDs start from 1
+		# fr_vacancy - fraction of vacant households
+		# schools - list of schools
+		# store - AgentStore object (abm_columns) with space for all agents
+		# block_size - number of households generated at a time
+		#
+		# Agents already generated (retirement homes, hospital patients)
+		# are stored first. Between blocks only the age pool, school 
+		# capacities, and arrays of head houses, ages, and household
+		# sizes are kept. Members are drawn as in complete_households_batch,
+		# agents left in the pool are distributed after the last block.
+		#
+
+		rng = self.rng.stream('households')
+		capacities = self.school_capacities(schools)
+		self.distribute_schools(schools, capacities)
+		self.store_agents(store)
+
+		# Exclude vacant
+		houses_tot = len(households)
+		nh_vacant = math.floor(fr_vacancy*houses_tot)
+		occupied = np.ones(houses_tot, dtype=bool)
+		occupied[rng.choice(houses_tot, nh_vacant, replace=False)] = False
+
+		# House, age group, and household size of each head
+		head_groups = list(self.hs_age_dist.values())
+		n_groups = [group['number'] for group in head_groups]
+		n_heads = sum(n_groups)
+		if n_heads > houses_tot - nh_vacant:
+			raise RuntimeError('Not enough households for household heads')
+		houses = rng.permutation(np.flatnonzero(occupied))[:n_heads]
+		groups = rng.permutation(np.repeat(np.arange(len(head_groups)), n_groups))
+		hs_numbers = self.household_size_numbers(n_heads)
+		sizes = np.repeat(np.array([int(key) for key in hs_numbers.keys()], dtype=np.int64), list(hs_numbers.values()))
+		sizes = rng.permutation(sizes)[:n_heads]
+
+		# Specific head ages, maintain 60+ fraction; taken from
+		# the pool before any members like in select_household_heads
+		group_min = np.array([group['min'] for group in head_groups], dtype=np.int64)[groups]
+		group_max = np.array([group['max'] for group in head_groups], dtype=np.int64)[groups]
+		ages = rng.integers(group_min, group_max+1)
+		redo = np.flatnonzero((ages >= 60) & (rng.uniform(0, 1, n_heads) > self.fr_60))
+		while len(redo) > 0:
+			ages[redo] = rng.integers(group_min[redo], group_max[redo]+1)
+			redo = redo[(ages[redo] >= 60) & (rng.uniform(0, 1, len(redo)) > self.fr_60)]
+		for spec_age in ages.tolist():
+			self.update_ages(spec_age)
+
+		# IDs of 4 person households for the remaining agents
+		houses_4p = []
+		for start in range(0, n_heads, block_size):
+			end = min(start+block_size, n_heads)
+			household_heads = []
+			for ind, spec_age in zip(houses[start:end].tolist(), ages[start:end].tolist()):
+				temp = dict(self.default_parameters)
+				temp['ID'] = self.ID
+				self.ID += 1
+				temp['yrs'] = spec_age
+				temp['lon'] = households[ind]['lon']
+				temp['lat'] = households[ind]['lat']
+				temp['houseID'] = households[ind]['ID']
+				self.agents.append(temp)
+				household_heads.append({'ID': temp['ID'], 'yrs' : spec_age, 'houseID': temp['houseID'], 
+											'lon' : temp['lon'], 'lat': temp['lat']})
+
+			houses_4p += self.complete_households_batch(hs_numbers, household_heads, households, 
+															sizes=sizes[start:end], correction=False)
+			self.distribute_schools(schools, capacities)
+			self.store_agents(store)
+
+		# Agents left in the pool
+		houses_4p = [{'houseID' : houseID, 'size' : 4} for houseID in houses_4p]
+		self.household_agents_correction_batch(houses_4p, households)
+		self.distribute_schools(schools, capacities)
+		self.store_agents(store)
+
+	def store_agents(self, store):
+		''' Move all agents in the list to store (abm_columns.AgentStore) '''
+
+		store.append(self.agents)
+		self.first_ID = self.ID
+		self.agents = []
 
 	def update_ages(self, age):
 		''' Reduce the number of agents in a given age group by 1 '''
@@ -236,6 +360,7 @@ class Agents(object):
 		''' Defines the head of the household 
 				and stores relevant information ''' 
 
+		rng = self.rng.stream('households')
 		household_heads = []
 		for key, value in self.hs_age_dist.items():
 			for head in range(value['number']):
@@ -244,14 +369,14 @@ class Agents(object):
 
 				# Randomly select index and remove it
 				# These are actually IDs
-				ind = house_ind[random.sample(range(0, len(house_ind)), 1)[0]]
+				ind = house_ind[rng.integers(0, len(house_ind))]
 				house_ind.remove(ind)
 					
 				# Select specific age
-				spec_age = np.random.randint(value['min'], value['max']+1)
+				spec_age = int(rng.integers(value['min'], value['max']+1))
 				# Maintain 60+ fraction
-				while (spec_age >= 60) and (np.random.uniform(0,1) > self.fr_60): 
-					spec_age = np.random.randint(value['min'], value['max']+1)
+				while (spec_age >= 60) and (rng.uniform(0,1) > self.fr_60): 
+					spec_age = int(rng.integers(value['min'], value['max']+1))
 				age_dist_key = self.find_age_range(spec_age)
 	
 				# Remove that age from total poll and create agent entry
@@ -277,8 +402,26 @@ class Agents(object):
 		''' Associate a household type with a 
 				head - randomly '''
 	
-		# Turn percents into numbers
 		h_tot = len(household_heads)
+		hs_numbers = self.household_size_numbers(h_tot)
+
+		# Exact number of heads of each size in random order
+		rng = self.rng.stream('households')
+		sizes = np.repeat(np.array([int(key) for key in hs_numbers.keys()], dtype=np.int64), 
+							[hs_numbers[key] for key in hs_numbers.keys()])
+		if len(sizes) < h_tot:
+			raise RuntimeError('Not enough households for household heads')
+		# Typed column in order of heads
+		self.head_sizes = rng.permutation(sizes)[:h_tot]
+		for agent, h_size in zip(household_heads, self.head_sizes.tolist()):
+			agent['household size'] = h_size
+
+		return hs_numbers
+
+	def household_size_numbers(self, h_tot):
+		''' Number of households of each size out of h_tot '''
+
+		# Turn percents into numbers
 		hs_numbers = {}
 		h_cur = 0
 		for h_size, value in self.hs_size_dist.items():
@@ -296,31 +439,7 @@ class Agents(object):
 					ind += 1
 				else:
 					ind = 0
-
-		# For later calculation - totals
-		hs_total_numbers = deepcopy(hs_numbers)
-
-		# Now randomly distribute the agents
-		# using the dict with actual numbers of each houseld type
-		for agent in household_heads:
-			h_ind = np.random.randint(1,5)
-			h_size = hs_numbers[str(h_ind)]
-			if h_size > 0:
-				hs_numbers[str(h_ind)] -= 1
-				agent['household size'] = h_ind
-			else:
-				# Pick next available
-				found_household = False
-				for key, value in hs_numbers.items():
-					if value > 0:
-						agent['household size'] = int(key)
-						hs_numbers[key] -= 1
-						found_household = True
-						break
-				if found_household == False:
-					raise RuntimeError('Not enough households for household heads')
-
-		return hs_total_numbers
+		return hs_numbers
 
 	def complete_households(self, hs_size_totals, household_heads, households):
 		''' Assign remaining agents to households based on heads and 
@@ -328,6 +447,7 @@ class Agents(object):
 
 		# IDs of houses that have 4+ members for correction
 		houses_4p = []
+		rng = self.rng.stream('households')
 
 		for head in household_heads:
 			# Nothing to do for one person	
@@ -335,13 +455,13 @@ class Agents(object):
 				continue
 			elif  head['household size'] == 2:
 				# Probability a family
-				if (np.random.uniform(0,1) <= self.fr_families):
+				if (rng.uniform(0,1) <= self.fr_families):
 					# Probability a married couple, no children
 					if head['yrs'] > 60:
 						# Married couple
 						self.add_spouse(head)
 					else:
-						if (np.random.uniform(0,1) <= self.fr_couple):
+						if (rng.uniform(0,1) <= self.fr_couple):
 							# Married couple
 							self.add_spouse(head)
 						else:
@@ -355,9 +475,9 @@ class Agents(object):
 					self.add_agent_iterate_age(head, 18, self.max_age)
 			elif head['household size'] == 3:
 				# Probability a family
-				if ((np.random.uniform(0,1) <= self.fr_families) and (head['yrs'] <= 60)):
+				if ((rng.uniform(0,1) <= self.fr_families) and (head['yrs'] <= 60)):
 					# Probability single parent 
-					if (np.random.uniform(0,1) <= self.fr_single_parent):
+					if (rng.uniform(0,1) <= self.fr_single_parent):
 						# Add two children
 						self.add_children(head, 2, head['yrs'], head['yrs'])
 					else:
@@ -374,9 +494,9 @@ class Agents(object):
 
 			elif head['household size'] == 4:
 				# Probability a family
-				if ((np.random.uniform(0,1) <= self.fr_families) and (head['yrs'] <= 60)):					
+				if ((rng.uniform(0,1) <= self.fr_families) and (head['yrs'] <= 60)):					
 					# Probability single parent 
-					if (np.random.uniform(0,1) <= self.fr_single_parent):
+					if (rng.uniform(0,1) <= self.fr_single_parent):
 						# Add three children
 						self.add_children(head, 3, head['yrs'], head['yrs'])
 						houses_4p.append({'houseID' : head['houseID'], 'size' : 4})
@@ -396,6 +516,147 @@ class Agents(object):
 			
 		self.household_agents_correction(houses_4p, households)
 
+	def complete_households_batch(self, hs_size_totals, household_heads, households, block_size=1000, sizes=None,
+										correction=True):
+		''' Assign remaining agents to households based on heads and 
+				household sizes, all heads at once; same rules as 
+				complete_households '''
+
+		#
+		# block_size - number of heads whose members are drawn 
+		#	together, blocks take ages from the remaining pool 
+		#	in order of heads like complete_households
+		# sizes - household size of each head as an array,
+		#	taken from the heads if None
+		# correction - if False, agents left in the pool are not 
+		#	distributed and IDs of 4 person households are returned
+		#
+
+		rng = self.rng.stream('households')
+		n_heads = len(household_heads)
+		if sizes is None:
+			sizes = [head['household size'] for head in household_heads]
+		size = np.asarray(sizes, dtype=np.int64)
+		age = np.array([head['yrs'] for head in household_heads], dtype=np.int64)
+
+		# Household type of each head
+		u_family = rng.uniform(0, 1, n_heads)
+		u_type = rng.uniform(0, 1, n_heads)
+		# Two people - couple, single parent + child, or roommate
+		family_2 = (size == 2) & (u_family <= self.fr_families)
+		spouse_2 = family_2 & ((age > 60) | (u_type <= self.fr_couple))
+		child_2 = family_2 & (~spouse_2)
+		# Three and four - single parent or couple with children, 
+		# or roommates
+		size_34 = (size == 3) | (size == 4)
+		family_34 = size_34 & (u_family <= self.fr_families) & (age <= 60)
+		single_34 = family_34 & (u_type <= self.fr_single_parent)
+		couple_34 = family_34 & (~single_34)
+
+		has_spouse = spouse_2 | couple_34
+		n_children = child_2 + single_34*(size-1) + couple_34*(size-2)
+		n_roommates = ((size == 2) & (~family_2)) + (size_34 & (~family_34))*(size-1)
+
+		n_members = n_children + n_roommates
+		member_start = np.concatenate(([0], np.cumsum(n_members)))
+		member_head = np.repeat(np.arange(n_heads), n_members)
+		is_child = np.repeat(n_children > 0, n_members)
+		spouse_age = np.full(n_heads, -1, dtype=np.int64)
+		member_age = np.zeros(len(member_head), dtype=np.int64)
+
+		for start in range(0, n_heads, block_size):
+			end = min(start+block_size, n_heads)
+			# Spouses, at most 15 years apart
+			ind = start + np.flatnonzero(has_spouse[start:end])
+			spouse_age[ind] = self.draw_member_ages(np.maximum(18, age[ind]-15), 
+									np.minimum(self.max_age, age[ind]+15), rng)
+
+			# Children and roommates, in order of heads
+			ind = np.arange(member_start[start], member_start[end])
+			# Children age range - hardcoded to 18-43 age difference
+			# with parent but not strongly enforced
+			parent_1 = age[member_head[ind]]
+			parent_2 = np.where(spouse_age[member_head[ind]] >= 0, spouse_age[member_head[ind]], parent_1)
+			min_age = np.where(is_child[ind], np.maximum(0, np.minimum(17, np.maximum(parent_1, parent_2)-43)), 18)
+			max_age = np.where(is_child[ind], np.maximum(0, np.minimum(17, np.minimum(parent_1, parent_2)-18)), self.max_age)
+			member_age[ind] = self.draw_member_ages(min_age, max_age, rng)
+		
+		# Register agents of each household together
+		member_age = member_age.tolist()
+		is_child = is_child.tolist()
+		houses_4p = []
+		for ih, head in enumerate(household_heads):
+			new_ages = []
+			if spouse_age[ih] >= 0:
+				new_ages.append((int(spouse_age[ih]), True))
+			for im in range(member_start[ih], member_start[ih+1]):
+				new_ages.append((member_age[im], is_child[im]))
+			for agent_age, family in new_ages:
+				temp = dict(self.default_parameters)
+				temp['ID'] = self.ID
+				self.ID += 1
+				temp['yrs'] = agent_age 
+				temp['lon'] = head['lon']
+				temp['lat'] = head['lat']
+				temp['houseID'] = head['houseID']
+				temp['isFamily'] = family
+				self.agents.append(temp)
+			if has_spouse[ih] or (n_children[ih] > 0):
+				self.agents[head['ID']-self.first_ID]['isFamily'] = True
+			if size[ih] == 4:
+				houses_4p.append({'houseID' : head['houseID'], 'size' : 4})
+
+		if not correction:
+			return [house['houseID'] for house in houses_4p]
+		self.household_agents_correction_batch(houses_4p, households)
+
+	def draw_member_ages(self, min_age, max_age, rng):
+		''' Ages of new household members within min/max ranges, 
+				in order; same as add_agent_iterate_age but all
+				at once - draws that exceed the remaining number
+				in their age group are replaced with any age '''
+
+		# Same range corrections
+		min_age = np.asarray(min_age, dtype=np.int64)
+		max_age = np.asarray(max_age, dtype=np.int64)
+		swap = min_age > (max_age+1)
+		min_age, max_age = np.where(swap, max_age+1, min_age), np.where(swap, min_age, max_age)
+		max_age = np.where(min_age == max_age+1, np.minimum(100, max_age+2), max_age)
+		ages = rng.integers(min_age, max_age+1)
+
+		# Age group of every age and number left in each group
+		keys = list(self.age_remaining.keys())
+		max_group_age = max([value['max'] for value in self.age_remaining.values()])
+		age_group = np.full(max(max_group_age, int(max_age.max(initial=0)))+1, -1, dtype=np.int64)
+		for ig, key in enumerate(keys):
+			age_group[self.age_remaining[key]['min']:self.age_remaining[key]['max']+1] = ig
+		remaining = np.array([self.age_remaining[key]['number'] for key in keys], dtype=np.int64)
+		# Replacement ages - any age, 60+ less likely
+		any_age = np.arange(self.max_age+1)
+		any_weight = np.where(any_age >= 60, self.fr_60, 1.0)
+		
+		todo = np.arange(len(ages))
+		while len(todo) > 0:
+			groups = age_group[ages[todo]]
+			if np.any(groups < 0):
+				raise RuntimeError('Agents age not found in the age groups')
+			# Earlier draws are accepted first 
+			order = np.argsort(groups, kind='stable')
+			rank = np.empty(len(todo), dtype=np.int64)
+			rank[order] = np.arange(len(todo)) - np.searchsorted(groups[order], groups[order])
+			accepted = rank < remaining[groups]
+			remaining -= np.bincount(groups[accepted], minlength=len(remaining))
+			todo = todo[~accepted]
+			if len(todo) > 0:
+				weight = any_weight*(remaining[age_group[any_age]] > 0)
+				if weight.sum() == 0:
+					raise RuntimeError('Number of agents in the age group below zero')
+				ages[todo] = rng.choice(any_age, len(todo), p=weight/weight.sum())
+
+		for ig, key in enumerate(keys):
+			self.age_remaining[key]['number'] = int(remaining[ig])
+		return ages
+
 	def add_children(self, head, n_children, age_1, age_2):
 		''' Add n_children to agents of age_1 and age_2 '''
 
@@ -429,7 +690,8 @@ class Agents(object):
 	def add_agent_iterate_age(self, head, min_age, max_age, family = False):	
 		''' Find and register agent with age in min/max range.
 				If range depleted - add random age. '''
-	
+
+		rng = self.rng.stream('households')
 		if min_age > (max_age+1):
 			temp = max_age+1
 			max_age = min_age
@@ -437,7 +699,7 @@ class Agents(object):
 		if min_age == max_age + 1:
 			max_age = min(100, max_age+2)
 
-		agent_age = np.random.randint(min_age, max_age+1)
+		agent_age = int(rng.integers(min_age, max_age+1))
 		key = self.find_age_range(agent_age)
 
 		if self.age_remaining[key]['number'] == 0:
@@ -445,9 +707,9 @@ class Agents(object):
 			# Add any age that is not zero and less than 60
 			while (self.age_remaining[key]['number'] == 0) or flag_60 == True:
 				flag_60 = False
-				agent_age = np.random.randint(0, self.max_age+1)
+				agent_age = int(rng.integers(0, self.max_age+1))
 				if agent_age >= 60:
-					if (np.random.uniform(0,1) > self.fr_60):
+					if (rng.uniform(0,1) > self.fr_60):
 						flag_60 = True
 						continue
 				key = self.find_age_range(agent_age)
@@ -478,28 +740,29 @@ class Agents(object):
 				retirement homes '''
 		
 		# Simple random assignment for now
+		rng = self.rng.stream('households')
 		num_houses = len(houses_4p)
 		num_rh = len(self.rh_agents)
 		
 		for key, value in self.age_remaining.items():
 			while not (value['number'] == 0):
-				agent_age = np.random.randint(value['min'], value['max']+1)
+				agent_age = int(rng.integers(value['min'], value['max']+1))
 				self.update_ages(agent_age)
 				
 				temp = deepcopy(self.default_parameters)
 				if agent_age >= 60:
 					# Determine if placed in a household 
-					if (np.random.uniform(0,1) <= self.fr_60):
-						ind4p = np.random.randint(0, num_houses)
+					if (rng.uniform(0,1) <= self.fr_60):
+						ind4p = rng.integers(0, num_houses)
 						houseID = houses_4p[ind4p]['houseID']
 						houses_4p[ind4p]['size'] += 1
 					else:
 						# Place in a retirment home
-						indRH = np.random.randint(0, num_rh)
+						indRH = rng.integers(0, num_rh)
 						houseID = self.rh_agents[indRH]['houseID']
 						temp['RetirementHome'] = True
 				else:
-					ind4p = np.random.randint(0, num_houses)
+					ind4p = rng.integers(0, num_houses)
 					houseID = houses_4p[ind4p]['houseID']
 					houses_4p[ind4p]['size'] += 1
 
@@ -515,15 +778,68 @@ class Agents(object):
 				temp['houseID'] = houseID
 				self.agents.append(temp)	
 
-	def distribute_schools(self, schools):
-		''' Assigns school IDs (daycare - college) to agents '''
+	def household_agents_correction_batch(self, houses_4p, households):
+		''' Same as household_agents_correction with ages, 
+				households, and retirement homes drawn at once '''
+
+		rng = self.rng.stream('households')
+		num_houses = len(houses_4p)
+		num_rh = len(self.rh_agents)
+
+		for key, value in self.age_remaining.items():
+			n_left = value['number']
+			if n_left == 0:
+				continue
+			ages = rng.integers(value['min'], value['max']+1, n_left)
+			# 60+ go to retirement homes with 1 - fr_60 probability
+			to_rh = (ages >= 60) & (rng.uniform(0, 1, n_left) > self.fr_60)
+			houses = rng.integers(0, max(num_houses, 1), n_left)
+			homes = rng.integers(0, max(num_rh, 1), n_left)
+			if ((num_houses == 0) and np.any(~to_rh)) or ((num_rh == 0) and np.any(to_rh)):
+				raise ValueError('No 4+ households or retirement homes for remaining agents')
+			value['number'] = 0
+
+			for agent_age, rh, ind4p, indRH in zip(ages.tolist(), to_rh.tolist(), houses.tolist(), homes.tolist()):
+				temp = dict(self.default_parameters)
+				if rh:
+					houseID = self.rh_agents[indRH]['houseID']
+					temp['RetirementHome'] = True
+				else:
+					houseID = houses_4p[ind4p]['houseID']
+					houses_4p[ind4p]['size'] += 1
+				temp['ID'] = self.ID
+				self.ID += 1
+				temp['yrs'] = agent_age 
+				temp['lon'] = households[int(houseID)-1]['lon']
+				temp['lat'] = households[int(houseID)-1]['lat']
+				temp['houseID'] = houseID
+				self.agents.append(temp)	
+
+	def school_capacities(self, schools):
+		''' Remaining number of students of each school, 
+				grouped by school type '''
 
-		# Preprocess for easier usage
 		all_schools = {'daycare':[], 'primary':[], 'middle':[], 
 						'high':[], 'college':[]}
 		
 		for school in schools:
 			all_schools[school['school type']].append({'ID':school['ID'], 'num students' : school['num students']})
+		return all_schools
+
+	def distribute_schools(self, schools, capacities=None):
+		''' Assigns school IDs (daycare - college) to agents '''
+
+		#
+		# capacities - school_capacities output, updated as agents are
+		#	assigned; computed from schools if None
+		#
+
+		rng = self.rng.stream('schools')
+
+		# Preprocess for easier usage
+		if capacities is None:
+			capacities = self.school_capacities(schools)
+		all_schools = capacities
 
 		school_ages = {'daycare': [0,1,2,3,4], 'primary' : [5,6,7,8,9,10],
 						'middle': [11,12,13], 'high' : [14,15,16,17],
@@ -555,11 +871,13 @@ class Agents(object):
 			# If all are zero and not daycare or college  - assign randomly
 			if (found_school == False) and (school_type != 'daycare') and (school_type != 'college'):
 				agent['student'] = True
-				agent['schoolID'] = spec_schools[np.random.randint(0,len(spec_schools))]['ID']
+				agent['schoolID'] = spec_schools[rng.integers(0,len(spec_schools))]['ID']
 			else:
 				continue
 	
-	def distribute_transit_and_workplaces(self, households, workplaces, transit, max_working_age, n_employed, occ_map):
+	def distribute_transit_and_workplaces(self, households, workplaces, transit, max_working_age, n_employed, occ_map, 
+											assignment='sequential', n_proc=None, distance_cache=None, planar=False,
+											dist_tol=5.0, store=None):
 		''' Assigns workplace IDs to n_employed agents within working age '''
 
 		#
@@ -568,11 +886,24 @@ class Agents(object):
 		# transit - Transit class object
 		# max_working_age - max age to work 
 		# n_employed - number of employed agents
+		# assignment - 'sequential' to select workplaces one agent 
+		#	at a time, 'batch' to assign all at once (abm_assignment)
+		# n_proc - number of processes for 'batch', all cores if None
+		# distance_cache - directory with stored household - workplace
+		#	distance matrices (abm_distances), not used if None
+		# planar - for 'batch', search candidate workplaces with
+		#	projected coordinates (abm_utils.project_coordinates)
+		# dist_tol - if the household-work distance is below this 
+		#	tolerance (km) that workplace is added to potential 
+		#	workplace group
+		# store - AgentStore (abm_columns) with all agents, for out-of-core
+		#	generation; the agents are read and written in its columns
 		#
 
-		# If the household-work distance is below this tolerance
-		# that workplace is added to potential workplace group 
-		dist_tol = 5.0
+		if store is not None:
+			self.agents = acol.StoredAgents(store)
+
+		rng = self.rng.stream('workplaces')
 
 		transit_times_with_home, times = transit.sample_travel_times(n_employed)
 		transit_modes_with_home = transit.sample_travel_modes(n_employed)
@@ -584,6 +915,13 @@ class Agents(object):
 		transit_times, transit_modes, count_working = self.assign_work_from_home(transit_times_with_home, \
 						transit_modes_with_home, transit, max_working_age)
 
+		# Agents whose workplaces are assigned at once
+		workers = []
+		# Workplace distances shared by households in the same building
+		distances = adist.WorkplaceDistances(workplaces)
+		if distance_cache is not None:
+			distances.use_matrix(households, distance_cache)
+
 		# From the remaining, assign all other workplaces
 		for agent in self.agents:
 		
@@ -609,37 +947,25 @@ class Agents(object):
 				# Make sure mode is not 'walk' if the time isn't
 				# Reassign randomly 
 				if agent['work travel mode'] == 'walk':
-					mode = random.sample(other_types, 1)[0]
+					mode = other_types[rng.integers(0, len(other_types))]
 			
-			cur_work = self.select_workplace(transit, workplaces, households, agent, dist_tol)
+			if assignment == 'batch':
+				workers.append(agent)
+				continue
 
-			# Assign closest workplace
-			agent['works'] = True
-			agent['workID'] = cur_work['ID']
-			
-			# Correct for separately modeled workplaces
-			if cur_work['type'] == 'F':
-				agent['worksSchool'] = True
-				agent['specialWorkID'] = cur_work['specialID']
-
-			if cur_work['type'] == 'AA': 
-				agent['worksRH'] = True
-				agent['specialWorkID'] = cur_work['specialID']
-			
-			if cur_work['type'] == 'H':
-				agent['works'] = False
-				agent['worksHospital'] = True
-				agent['specialWorkID'] = cur_work['specialID']
-				agent['hospitalID'] = cur_work['specialID']
-			
-			# Assign workplace type to agent for future use (occupation assignment)
-			agent['work_type'] = cur_work['occupation']
+			cur_work = self.select_workplace(transit, workplaces, households, agent, dist_tol, distances)
+			self.set_workplace(agent, cur_work)
 			
 			count_working += 1
 
 			if int(count_working % 5000) == 0:
 				print('Assigned workplace to ' + str(count_working) + ' agents.')
 
+		if workers:
+			self.select_workplaces_batch(transit, workplaces, households, workers, dist_tol, n_proc, distances, planar)
+			count_working += len(workers)
+			print('Assigned workplace to ' + str(count_working) + ' agents.')
+
 		# Notify if assigned less than designated
 		if count_working < n_employed:
 			warnings.warn('Assigned employement to ' + str(count_warning) +
@@ -654,6 +980,9 @@ class Agents(object):
 		
 		# Match agents' workplaces to occupations 
 		self.match_workplace_to_occupation(occ_map)
+
+		if store is not None:
+			self.agents = []
 		
 	def match_workplace_to_occupation(self, occ_map):
 		""" Match agents' workplace types to occupation types """
@@ -674,7 +1003,8 @@ class Agents(object):
 			start_pos += census_share
 		census_list = [x for x in census_list if x != None]	
 		# Shuffle the list for even distribution
-		random.shuffle(census_list) 
+		rng = self.rng.stream('occupations')
+		rng.shuffle(census_list) 
 
 		# First distribute all in-town workers
 		# { occupation type : number of agents }
@@ -716,7 +1046,7 @@ class Agents(object):
 			starting_pos += relative_share
 		rotation_list = [x for x in rotation_list if x != None]	
 		# Shuffle the list for even distribution
-		random.shuffle(rotation_list) 
+		rng.shuffle(rotation_list) 
 	
 		# Distribute out-of-town (uncategorized) agents
 		curr_occ_type = 0
@@ -764,12 +1094,13 @@ class Agents(object):
 		transit_modes = []
 
 		other_types = ['car', 'carpool', 'public', 'walk', 'other']
+		rng = self.rng.stream('workplaces')
 
 		for time, mode in zip(transit_times_with_home, transit_modes_with_home):
 			if time <= transit.wfh_treshold:
 				found = False
 				while not found:
-					agent = self.agents[random.randint(0, len(self.agents)-1)]
+					agent = self.agents[rng.integers(0, len(self.agents))]
 					if (agent['yrs'] >= 16) and (agent['yrs'] <= max_working_age):
 						if (agent['RetirementHome'] == False) and (agent['isPatient'] == False):
 							found = True
@@ -782,63 +1113,116 @@ class Agents(object):
 			else:
 				# Overwrite with another type, randomly
 				if mode == 'wfh':
-					mode = random.sample(other_types, 1)[0]
+					mode = other_types[rng.integers(0, len(other_types))]
 				transit_times.append(time)
 				transit_modes.append(mode)
 
 		return transit_times, transit_modes, count_working
 
 
-	def select_workplace(self, transit, workplaces, households, agent, dist_tol):
+	def set_workplace(self, agent, cur_work):
+		''' Store the selected workplace in the agent '''
+
+		# Assign closest workplace
+		agent['works'] = True
+		agent['workID'] = cur_work['ID']
+		
+		# Correct for separately modeled workplaces
+		if cur_work['type'] == 'F':
+			agent['worksSchool'] = True
+			agent['specialWorkID'] = cur_work['specialID']
+
+		if cur_work['type'] == 'AA': 
+			agent['worksRH'] = True
+			agent['specialWorkID'] = cur_work['specialID']
+		
+		if cur_work['type'] == 'H':
+			agent['works'] = False
+			agent['worksHospital'] = True
+			agent['specialWorkID'] = cur_work['specialID']
+			agent['hospitalID'] = cur_work['specialID']
+		
+		# Assign workplace type to agent for future use (occupation assignment)
+		agent['work_type'] = cur_work['occupation']
+
+	def select_workplaces_batch(self, transit, workplaces, households, workers, dist_tol, n_proc=None, 
+									distances=None, planar=False):
+		''' Find workplaces of all workers at once based on work 
+				travel distances and workplace capacities '''
+
+		#
+		# workers - agents with work travel time and mode
+		# n_proc - number of processes, all cores if None
+		# distances - WorkplaceDistances object, its stored
+		#	distance matrix is used if there is one
+		# planar - if True, search candidates with projected coordinates
+		# Other arguments as in select_workplace
+		#
+
+		rng = self.rng.stream('workplaces')
+		lat = [households[agent['houseID']-1]['lat'] for agent in workers]
+		lon = [households[agent['houseID']-1]['lon'] for agent in workers]
+		work_dist = [transit.mode_speeds[agent['work travel mode']]*agent['work travel time'] for agent in workers]
+
+		matrix_file, home_rows = None, None
+		if (distances is not None) and (distances.matrix_file is not None):
+			matrix_file = distances.matrix_file
+			home_rows = distances.building_rows(lat, lon)
+
+		assigned, _ = asg.assign_workplaces(lat, lon, work_dist, workplaces, dist_tol, rng, n_proc=n_proc,
+												matrix_file=matrix_file, home_rows=home_rows, planar=planar)
+		for agent, ind in zip(workers, assigned.tolist()):
+			self.set_workplace(agent, workplaces[ind])
+
+	def select_workplace(self, transit, workplaces, households, agent, dist_tol, distances=None):
 		''' Find workplace of the agent based on work travel distance '''
+
+		#
+		# distances - WorkplaceDistances object shared by all 
+		#	agents, computed for this agent only if None
+		#
 		
+		rng = self.rng.stream('workplaces')
 		# Compute distance to work
 		work_dist = transit.mode_speeds[agent['work travel mode']]*agent['work travel time']
-		# Find the closest workplace to home
-		min_diff = 10000000.0
-		curID = 0
 		agent_house = households[agent['houseID']-1]
+		if distances is None:
+			distances = adist.WorkplaceDistances(workplaces)
+		diff = np.abs(work_dist - distances.get(agent_house))
 		
 		# Select potential workplaces within dist_tol
-		tol_workplaces = []
-		for work in workplaces:
-			cur_dist = aut.compute_distance(agent_house, work)
-			cur_diff = abs(work_dist - cur_dist)
-			if cur_diff <= dist_tol:
-				cur_work = deepcopy(work)
-				cur_work['dist'] = cur_diff
-				tol_workplaces.append(cur_work)
-			# If more apart than based on the threshold
-			if cur_diff < min_diff:
-				min_diff = cur_diff
-				closest_work = deepcopy(work)	
-
-		# If nothing within the tolerance
-		if not tol_workplaces:
-			cur_work = closest_work
+		tol_workplaces = np.flatnonzero(diff <= dist_tol)
+
+		# If nothing within the tolerance - closest workplace
+		if len(tol_workplaces) == 0:
+			cur_work = deepcopy(workplaces[int(np.argmin(diff))])
 			if cur_work['type'] != 'outside':
 				# Update the actual workplace count
 				workplaces[cur_work['ID']-1]['N_emp'] += 1
 		else:			
 			# Sort by distance
-			tol_workplaces.sort(key=lambda x: x['dist'])
+			tol_workplaces = tol_workplaces[np.argsort(diff[tol_workplaces], kind='stable')]
 			# If outside is closest, just assign
-			if tol_workplaces[0]['type'] == 'outside':
-				cur_work = tol_workplaces[0]
+			if distances.outside[tol_workplaces[0]]:
+				cur_ind = tol_workplaces[0]
 			else:
 				# If in NR - first extract all NR that haven't yet reached capacity
-				tol_workplaces_temp = [x for x in tol_workplaces if (x['type'] != 'outside') and (x['N_emp']<x['N_max'])]
-				if len(tol_workplaces_temp) == 0:
+				tol_workplaces = tol_workplaces[~distances.outside[tol_workplaces]].tolist()
+				n_emp = np.array([workplaces[j]['N_emp'] for j in tol_workplaces], dtype=np.float64)
+				n_max = np.array([workplaces[j]['N_max'] for j in tol_workplaces], dtype=np.float64)
+				free = n_emp < n_max
+				if not np.any(free):
 					warnings.warn('No workplaces to consider after capacity cuts. Using all NR workplaces instead.')
-					tol_workplaces = [x for x in tol_workplaces if (x['type'] != 'outside')]
-				else:
-					tol_workplaces = tol_workplaces_temp
+					free[:] = True
 				# Then sort by remaining capacity, from least filled
-				tol_workplaces.sort(key = lambda x: max(0, float(x['N_emp'])/float(x['N_max'])))
+				fill = np.maximum(0, n_emp[free]/n_max[free])
+				tol_workplaces = np.array(tol_workplaces)[free][np.argsort(fill, kind='stable')]
 				# Randomly select out of first 20 or max if less than 20
-				cur_work = tol_workplaces[random.randint(0, min(20, len(tol_workplaces)-1))]
+				cur_ind = tol_workplaces[rng.integers(0, min(20, len(tol_workplaces)-1)+1)]
 				# Update the actual workplace count
-				workplaces[cur_work['ID']-1]['N_emp'] += 1
+				workplaces[cur_ind]['N_emp'] += 1
+			cur_work = deepcopy(workplaces[cur_ind])
+			cur_work['dist'] = diff[cur_ind]
 
 		return cur_work
 
@@ -994,15 +1378,139 @@ class Agents(object):
 		return n_cp 
 
 
-	def set_infected(self, n_infected_0):
+	def set_infected(self, n_infected_0, store=None):
 		''' Randomly chooses n_infected_0 agents to be initially
 				infected '''
 
+		# store - AgentStore with all agents, for out-of-core generation
+
 		# Indices of agents that are infected
-		infected_index = random.sample(range(0, len(self.agents)), n_infected_0)
+		rng = self.rng.stream('infected')
+		if store is not None:
+			store.columns['infected'][rng.choice(store.n, n_infected_0, replace=False)] = True
+			return
+		infected_index = rng.choice(len(self.agents), n_infected_0, replace=False)
 		for idx in infected_index:
 			self.agents[idx]['infected'] = True	
 
+	def build_membership_indexes(self, n_places=None, store=None):
+		''' Compressed sparse row (CSR) indexes from places to agents,
+				returns a dict of place type : (offsets, agent IDs) '''
+
+		#
+		# Agents in place with ID i are IDs[offsets[i-1]:offsets[i]],
+		#	in increasing order; place types and their members:
+		#	households - household residents
+		#	retirement_homes - retirement home residents
+		#	workplaces - agents working outside of home, including
+		#		special (merged) workplaces and hospitals
+		#	schools - students
+		#	hospitals - patients and hospital employees
+		#	carpools, public - agents in each carpool or public transit route
+		# n_places - dict of place type : number of places, optional, needed
+		#	only to include places without agents at the end of the ID range
+		# store - AgentStore with all agents, used instead of the agent list
+		#
+
+		if n_places is None:
+			n_places = {}
+
+		# Agent properties as arrays
+		if store is not None:
+			n = store.n
+			agent_IDs = np.asarray(store.columns['ID'][:n])
+			columns = {key: np.asarray(value[:n]) for key, value in store.columns.items()}
+		else:
+			n = len(self.agents)
+			agent_IDs = np.fromiter((agent['ID'] for agent in self.agents), dtype=np.int64, count=n)
+			columns = {}
+			for key in ['houseID', 'workID', 'schoolID', 'hospitalID', 'carpoolID', 'publicID']:
+				columns[key] = np.fromiter((agent[key] for agent in self.agents), dtype=np.int64, count=n)
+			for key in ['student', 'works', 'worksHospital', 'RetirementHome', 'isPatient', 'works from home']:
+				columns[key] = np.fromiter((agent[key] for agent in self.agents), dtype=bool, count=n)
+
+		# Place type : (place IDs, agents that can be members)
+		in_rh = columns['RetirementHome']
+		works_out = (columns['works'] | columns['worksHospital']) & ~columns['works from home']
+		places = {'households': (columns['houseID'], ~in_rh & ~columns['isPatient']),
+					'retirement_homes': (columns['houseID'], in_rh),
+					'workplaces': (columns['workID'], works_out),
+					'schools': (columns['schoolID'], columns['student']),
+					'hospitals': (columns['hospitalID'], columns['isPatient'] | columns['worksHospital']),
+					'carpools': (columns['carpoolID'], np.ones(n, dtype=bool)),
+					'public': (columns['publicID'], np.ones(n, dtype=bool))}
+
+		indexes = {}
+		for place, (IDs, mask) in places.items():
+			mask = mask & (IDs > 0)
+			keys = IDs[mask]
+			n_place = max(n_places.get(place, 0), int(keys.max()) if len(keys) else 0)
+			# Stable sort keeps agents of each place in ID order
+			order = np.argsort(keys, kind='stable')
+			offsets = np.zeros(n_place+1, dtype=np.int64)
+			offsets[1:] = np.cumsum(np.bincount(keys, minlength=n_place+1)[1:])
+			indexes[place] = (offsets, agent_IDs[mask][order])
+
+		return indexes
+
+	def save_membership_indexes(self, fname, n_places=None, store=None):
+		''' Build and save place to agent indexes to fname (.npz) '''
+
+		arrays = {}
+		for place, (offsets, IDs) in self.build_membership_indexes(n_places, store).items():
+			arrays[place + '_offsets'] = offsets
+			arrays[place + '_agents'] = IDs
+		np.savez(fname, **arrays)
+
+	def load_agents(self, fname):
+		''' Load agents from a file written with __repr__, 
+				e.g. to redo only the work and transit stages '''
+
+		# Agent IDs follow the order in the file. Properties that 
+		# are not in the file have default values.
+		self.agents = []
+		with open(fname, 'r') as fin:
+			for line in fin:
+				line = line.strip().split()
+				if not line:
+					continue
+				temp = dict(self.default_parameters)
+				temp['ID'] = len(self.agents) + 1
+				for key, ind in [('student', 0), ('works', 1), ('isPatient', 6), ('RetirementHome', 8), 
+									('worksRH', 9), ('worksSchool', 10), ('worksHospital', 12), 
+									('infected', 14), ('works from home', 15)]:
+					temp[key] = (line[ind] == '1')
+				for key, ind in [('yrs', 2), ('houseID', 5), ('schoolID', 7), ('workID', 11), ('hospitalID', 13),
+									('specialWorkID', 18), ('carpoolID', 19), ('publicID', 20)]:
+					temp[key] = int(line[ind])
+				temp['lon'] = float(line[3])
+				temp['lat'] = float(line[4])
+				temp['work travel time'] = float(line[16])
+				temp['work travel mode'] = None if line[17] == 'None' else line[17]
+				temp['occupation'] = line[21]
+				self.agents.append(temp)
+
+		self.ID = len(self.agents) + 1
+		self.first_ID = 1
+		self.rh_agents = [agent for agent in self.agents if agent['RetirementHome']]
+		# All agents are already distributed
+		for value in self.age_remaining.values():
+			value['number'] = 0
+
+	def reset_work(self):
+		''' Remove work, transit, and occupation data and initial 
+				infections, keep households, ages, and schools '''
+
+		keys = ['works', 'workID', 'worksRH', 'worksSchool', 'worksHospital', 'specialWorkID', 
+					'works from home', 'work travel time', 'work travel mode', 'carpoolID', 
+					'publicID', 'occupation', 'work_type', 'infected']
+		for agent in self.agents:
+			# Hospital employees, patients keep their hospital
+			if agent['worksHospital'] and (not agent['isPatient']):
+				agent['hospitalID'] = self.default_parameters['hospitalID']
+			for key in keys:
+				agent[key] = self.default_parameters[key]
+
 	def __repr__(self):
 		''' String output for stdout or files '''
 
@@ -1022,3 +1530,14 @@ class Agents(object):
 	
 		return ('\n').join(temp)
 
+def load_membership_indexes(fname):
+	''' Load place to agent indexes saved with Agents.save_membership_indexes,
+			returns a dict of place type : (offsets, agent IDs) '''
+
+	indexes = {}
+	with np.load(fname, allow_pickle=False) as data:
+		for key in data.files:
+			if key.endswith('_offsets'):
+				place = key[:-len('_offsets')]
+				indexes[place] = (data[key], data[place + '_agents'])
+	return indexes
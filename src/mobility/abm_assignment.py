@@ -0,0 +1,337 @@
+# ------------------------------------------------------------------
+#
+#	Module for assigning workplaces to all workers at once
+#
+# ------------------------------------------------------------------
+
+#
+# Workers and workplaces are treated as a capacitated transport
+# problem. An edge connects a worker and a workplace if the difference
+# between the worker's travel distance (mode speed times travel time)
+# and the household-workplace distance is within dist_tol, the
+# difference is the cost of the edge. In-town workplaces take at most
+# N_max - N_emp workers, outside workplaces any number.
+#
+# Edges are computed for tiles of workers' homes, in parallel, 
+# against the same read-only workplace arrays. Edges of all tiles
+# are then taken from the lowest cost as long as the worker has
+# no workplace and the workplace has room (greedy solution of the
+# transport problem) - this also resolves tiles competing for the
+# same workplaces. The result does not depend on the number of 
+# processes or the tiles. Only n_cand best in-town edges of each 
+# worker are kept at a time, workers left without a workplace get 
+# the next ones until no workplace within dist_tol has room. The rest
+# is assigned as in Agents.select_workplace - to the workplace
+# with the closest distance if none is within dist_tol, or to
+# one of the least filled in-town workplaces otherwise.
+#
+
+import os, warnings
+import multiprocessing as mp
+import numpy as np
+import abm_utils as aut
+import abm_spatial as spatial
+
+# Workplace arrays and edge settings shared by 
+# all tiles in one process, set by the pool initializer
+_shared = {}
+
+def workplace_arrays(workplaces, planar=False):
+	''' Coordinates, outside flags, current number of employees,
+			and maximum number of employees as numpy arrays '''
+
+	#
+	# workplaces - list of workplaces, IDs start from 1 and 
+	#	follow list order
+	# planar - if True, also coordinates in km projected around
+	#	the middle of the workplaces (abm_utils.project_coordinates)
+	#
+
+	work = {}
+	work['lat'] = np.array([x['lat'] for x in workplaces], dtype=np.float64)
+	work['lon'] = np.array([x['lon'] for x in workplaces], dtype=np.float64)
+	work['outside'] = np.array([x['type'] == 'outside' for x in workplaces], dtype=bool)
+	# Outside workplaces have no limits 
+	work['N_emp'] = np.array([0 if x['type'] == 'outside' else x['N_emp'] for x in workplaces], dtype=np.int64)
+	work['N_max'] = np.array([0 if x['type'] == 'outside' else x['N_max'] for x in workplaces], dtype=np.int64)
+	if planar and len(workplaces) > 0:
+		work['origin'] = ((work['lat'].min() + work['lat'].max())/2, (work['lon'].min() + work['lon'].max())/2)
+		work['x'], work['y'] = aut.project_coordinates(work['lat'], work['lon'], *work['origin'])
+	return work
+
+def candidate_edges(lat, lon, work_dist, work, dist_tol, n_cand, full=None, matrix=None, home_rows=None):
+	''' Edges of the transport problem for a group of workers '''
+
+	#
+	# lat, lon - coordinates of workers' households
+	# work_dist - travel distances of the workers
+	# work - workplace arrays from workplace_arrays
+	# dist_tol - maximum cost of an edge
+	# n_cand - maximum number of in-town edges of a worker
+	# full - boolean array, True for workplaces that have no room
+	# matrix, home_rows - building - workplace distance matrix 
+	#	(abm_distances) and matrix rows of workers' homes,
+	#	distances are computed if None or a home is not in the matrix
+	#
+	# With planar workplace arrays, distances are computed with 
+	# projected coordinates and the costs of edges that are kept 
+	# are verified with exact distances
+	#
+	# Returns worker indices (within the group), workplace indices, 
+	#	and costs of the edges, and for each worker - True if edges were
+	#	left out because of n_cand, index of the workplace with the closest
+	#	distance, and True if any in-town workplace is within dist_tol
+	#
+
+	n = len(lat)
+	rows = np.arange(n)
+	# Households in the same building share distances
+	planar = False
+	if (matrix is not None) and np.all(home_rows >= 0):
+		homes, home_ind = np.unique(home_rows, return_inverse=True)
+		dist = matrix[homes].astype(np.float64)
+	else:
+		homes, home_ind = np.unique(np.stack((lat, lon), axis=1), axis=0, return_inverse=True)
+		if 'x' in work:
+			planar = True
+			x, y = aut.project_coordinates(homes[:,0], homes[:,1], *work['origin'])
+			dist = np.sqrt((x[:,None] - work['x'])**2 + (y[:,None] - work['y'])**2)
+		else:
+			dist = aut.compute_distances(homes[:,0:1], homes[:,1:2], work['lat'], work['lon'])
+	diff = np.abs(work_dist[:,None] - dist[home_ind.ravel()])
+	closest = np.argmin(diff, axis=1)
+	any_in = np.any((diff <= dist_tol) & ~work['outside'], axis=1)
+
+	# Best outside workplace within tolerance - only in-town
+	# workplaces with smaller cost are worth considering
+	limit = np.full(n, float(dist_tol))
+	has_out = np.zeros(n, dtype=bool)
+	out_idx = np.flatnonzero(work['outside'])
+	if len(out_idx) > 0:
+		best_out = out_idx[np.argmin(diff[:,out_idx], axis=1)]
+		out_cost = diff[rows, best_out]
+		has_out = out_cost <= dist_tol
+		limit[has_out] = np.nextafter(out_cost[has_out], 0)
+	
+	cost = diff
+	cost[:, work['outside']] = np.inf
+	if full is not None:
+		cost[:, full] = np.inf
+	cost[cost > limit[:,None]] = np.inf
+	n_eligible = np.count_nonzero(np.isfinite(cost), axis=1)
+
+	# At most n_cand in-town edges per worker
+	if cost.shape[1] > n_cand:
+		cols = np.argpartition(cost, n_cand-1, axis=1)[:,:n_cand]
+	else:
+		cols = np.broadcast_to(np.arange(cost.shape[1]), cost.shape)
+	costs = np.take_along_axis(cost, cols, axis=1)
+	keep = np.isfinite(costs)
+	edge_rows = np.broadcast_to(rows[:,None], cols.shape)[keep]
+	edge_cols = cols[keep]
+	edge_costs = costs[keep]
+
+	if planar:
+		# Exact costs of the kept edges 
+		edge_costs = np.abs(work_dist[edge_rows] - aut.compute_distances(lat[edge_rows], lon[edge_rows], 
+								work['lat'][edge_cols], work['lon'][edge_cols]))
+		if len(out_idx) > 0:
+			out_cost = np.abs(work_dist - aut.compute_distances(lat, lon, work['lat'][best_out], work['lon'][best_out]))
+			has_out = out_cost <= dist_tol
+			limit = np.full(n, float(dist_tol))
+			limit[has_out] = np.nextafter(out_cost[has_out], 0)
+		keep = edge_costs <= limit[edge_rows]
+		edge_rows, edge_cols, edge_costs = edge_rows[keep], edge_cols[keep], edge_costs[keep]
+	
+	# Outside edges 
+	if np.any(has_out):
+		edge_rows = np.concatenate((edge_rows, rows[has_out]))
+		edge_cols = np.concatenate((edge_cols, best_out[has_out]))
+		edge_costs = np.concatenate((edge_costs, out_cost[has_out]))
+
+	return edge_rows, edge_cols, edge_costs, n_eligible > n_cand, closest, any_in
+
+def greedy_assignment(rows, cols, costs, assigned, capacity, block_size=1000000):
+	''' Assign workers along edges from the lowest cost, 
+			modifies assigned and capacity '''
+
+	#
+	# rows, cols, costs - worker indices, workplace indices, and costs of edges 
+	# assigned - workplace index of each worker, -1 if none yet
+	# capacity - number of workers each workplace can still take 
+	# block_size - number of edges converted to lists at a time
+	#
+	
+	# Ties go to the lower worker and then workplace index
+	order = np.lexsort((cols, rows, costs))
+	assigned_list = assigned.tolist()
+	capacity_list = capacity.tolist()
+	for start in range(0, len(order), block_size):
+		block = order[start:start+block_size]
+		for i, j in zip(rows[block].tolist(), cols[block].tolist()):
+			if assigned_list[i] < 0 and capacity_list[j] > 0:
+				assigned_list[i] = j
+				capacity_list[j] -= 1
+	assigned[:] = assigned_list
+	capacity[:] = capacity_list
+
+def tiles(lat, lon, tile_size, chunk_size):
+	''' Worker indices grouped by home location tiles, 
+			neighboring tiles are joined up to chunk_size 
+			workers and larger tiles are split '''
+
+	grid = spatial.GridIndex(lat, lon, tile_size)
+	groups = []
+	cur_group = []
+	cur_size = 0
+	for cell in np.flatnonzero(np.diff(grid.cell_start)).tolist():
+		members = grid.order[grid.cell_start[cell]:grid.cell_start[cell+1]]
+		for start in range(0, len(members), chunk_size):
+			piece = members[start:start+chunk_size]
+			if cur_size + len(piece) > chunk_size:
+				groups.append(np.concatenate(cur_group))
+				cur_group, cur_size = [], 0
+			cur_group.append(piece)
+			cur_size += len(piece)
+	if cur_group:
+		groups.append(np.concatenate(cur_group))
+	return groups
+
+def assign_workplaces(lat, lon, work_dist, workplaces, dist_tol, rng, n_cand=20, 
+						chunk_size=1000, tile_size=2.0, n_proc=1, matrix_file=None, home_rows=None, planar=False):
+	''' Workplace indices for all workers, 
+			updates N_emp of in-town workplaces ''' 
+
+	#
+	# lat, lon - coordinates of workers' households
+	# work_dist - travel distances of the workers
+	# workplaces - list of workplaces, IDs start from 1 and 
+	#	follow list order
+	# dist_tol - maximum difference between the travel and
+	#	household-workplace distance
+	# rng - random number generator, for workers with no room 
+	#	in workplaces within dist_tol
+	# n_cand - number of in-town workplaces considered
+	#	for each worker at a time
+	# chunk_size - maximum number of workers whose distances 
+	#	are computed at a time
+	# tile_size - minimum width of home location tiles in km
+	# n_proc - number of processes, all cores if None
+	# matrix_file, home_rows - file with building - workplace distances
+	#	(abm_distances) and matrix rows of workers' homes, optional
+	# planar - if True, search candidate workplaces with projected
+	#	coordinates (abm_utils.project_coordinates), the error 
+	#	only affects which workplaces are candidates
+	#
+	# Returns workplace index of each worker and number of workers
+	#	assigned above capacity
+	#
+
+	lat = np.asarray(lat, dtype=np.float64)
+	lon = np.asarray(lon, dtype=np.float64)
+	work_dist = np.asarray(work_dist, dtype=np.float64)
+	work = workplace_arrays(workplaces, planar)
+
+	n = len(lat)
+	assigned = np.full(n, -1, dtype=np.int64)
+	capacity = np.where(work['outside'], n, np.maximum(work['N_max'] - work['N_emp'], 0))
+	closest = np.zeros(n, dtype=np.int64)
+	any_in = np.zeros(n, dtype=bool)
+	more = np.zeros(n, dtype=bool)
+
+	shared = {'work': work, 'dist_tol': dist_tol, 'n_cand': n_cand, 'matrix_file': matrix_file}
+	if home_rows is None:
+		home_rows = np.full(n, -1, dtype=np.int64)
+	if n_proc is None:
+		n_proc = os.cpu_count()
+	n_proc = max(1, min(n_proc, (n + chunk_size - 1)//chunk_size))
+	if n_proc == 1:
+		_init_worker(shared)
+		pool = None
+	else:
+		pool = mp.Pool(n_proc, initializer=_init_worker, initargs=(shared,))
+	
+	try:
+		todo = np.arange(n)
+		first = True
+		while len(todo) > 0:
+			full = capacity <= 0
+			groups = [todo[x] for x in tiles(lat[todo], lon[todo], tile_size, chunk_size)]
+			tasks = [(lat[group], lon[group], work_dist[group], full, home_rows[group]) for group in groups]
+			if pool is None:
+				results = [_tile_edges(task) for task in tasks]
+			else:
+				results = pool.map(_tile_edges, tasks)
+
+			# Reconcile tiles - all edges compete for 
+			# the remaining room together
+			for group, edges in zip(groups, results):
+				more[group] = edges[3]
+				if first:
+					closest[group] = edges[4]
+					any_in[group] = edges[5]
+			rows = np.concatenate([group[edges[0]] for group, edges in zip(groups, results)])
+			cols = np.concatenate([edges[1] for edges in results])
+			costs = np.concatenate([edges[2] for edges in results])
+			greedy_assignment(rows, cols, costs, assigned, capacity)
+
+			# All considered workplaces of the workers left 
+			# are full now, give them the next ones
+			todo = todo[(assigned[todo] < 0) & more[todo]]
+			first = False
+	finally:
+		if pool is not None:
+			pool.close()
+			pool.join()
+
+	# Same as in Agents.select_workplace
+	n_over = 0
+	matrix = None
+	if matrix_file is not None:
+		matrix = np.load(matrix_file, mmap_mode='r', allow_pickle=False)
+	n_emp = work['N_emp'] + np.bincount(assigned[assigned >= 0], minlength=len(workplaces))
+	for i in np.flatnonzero(assigned < 0).tolist():
+		if any_in[i]:
+			# In-town workplaces within tolerance, ordered by cost
+			# and then by how much they are filled
+			if (matrix is not None) and (home_rows[i] >= 0):
+				diff = np.abs(work_dist[i] - matrix[home_rows[i]].astype(np.float64))
+			else:
+				diff = np.abs(work_dist[i] - aut.compute_distances(lat[i], lon[i], work['lat'], work['lon']))
+			tol_work = np.flatnonzero((diff <= dist_tol) & ~work['outside'])
+			tol_work = tol_work[np.argsort(diff[tol_work], kind='stable')]
+			fill = np.maximum(0, n_emp[tol_work]/work['N_max'][tol_work])
+			tol_work = tol_work[np.argsort(fill, kind='stable')]
+			assigned[i] = tol_work[rng.integers(0, min(20, len(tol_work)-1)+1)]
+			n_over += 1
+		else:
+			assigned[i] = closest[i]
+		if not work['outside'][assigned[i]]:
+			n_emp[assigned[i]] += 1
+
+	if n_over > 0:
+		warnings.warn('No workplaces to consider after capacity cuts for ' + str(n_over) + 
+						' workers. Using all NR workplaces instead.')
+
+	# Update the actual workplace counts 
+	counts = np.bincount(assigned, minlength=len(workplaces))
+	for j in np.flatnonzero((counts > 0) & ~work['outside']).tolist():
+		workplaces[j]['N_emp'] += int(counts[j])
+
+	return assigned, n_over
+
+def _init_worker(shared):
+	''' Store workplace arrays and settings of this 
+			process, memory map the distance matrix '''
+
+	_shared.update(shared)
+	_shared['matrix'] = None
+	if shared['matrix_file'] is not None:
+		_shared['matrix'] = np.load(shared['matrix_file'], mmap_mode='r', allow_pickle=False)
+
+def _tile_edges(task):
+	''' Edges of the workers in one tile, see candidate_edges '''
+
+	lat, lon, work_dist, full, home_rows = task
+	return candidate_edges(lat, lon, work_dist, _shared['work'], _shared['dist_tol'], _shared['n_cand'], 
+								full, _shared['matrix'], home_rows)
@@ -0,0 +1,124 @@
+# ------------------------------------------------------------------
+#
+#	Module for precomputed household to leisure location
+#	 candidate lists
+#
+# ------------------------------------------------------------------
+
+#
+# Candidates are stored in compressed sparse row (CSR) format -
+# candidates of household with ID i are IDs[offsets[i-1]:offsets[i]]
+# with distances (km) distances[offsets[i-1]:offsets[i]], closest
+# first. Each array is saved as a separate .npy file so that
+# the simulation can memory map them.
+#
+
+import os
+import multiprocessing as mp
+import numpy as np
+
+# Leisure locations and query settings shared
+# by all chunks in one process, set by the pool initializer
+_shared = {}
+
+class CandidateTable(object):
+	''' Class for candidate leisure locations of every household '''
+
+	# Array name : file name suffix
+	suffixes = {'offsets': '_offsets.npy', 'IDs': '_IDs.npy', 'distances': '_distances.npy'}
+
+	def __init__(self, offsets, IDs, distances):
+		''' Store the CSR arrays '''
+
+		self.offsets = offsets
+		self.IDs = IDs
+		self.distances = distances
+		# Number of households
+		self.n = len(offsets) - 1
+
+	@classmethod
+	def build(cls, leisure, households, k=None, radius=None, n_proc=None, chunk_size=5000):
+		''' Compute candidates of all households in parallel chunks '''
+
+		#
+		# leisure - LeisureLocations object
+		# households - list of households (dicts with 'lat' and 'lon')
+		#	ordered by ID, IDs start from 1
+		# k, radius - k nearest leisure locations, locations within radius km,
+		#	or k nearest within radius, see LeisureLocations.candidate_table
+		# n_proc - number of processes, all cores if None
+		# chunk_size - number of households computed at a time
+		#
+
+		lat = np.array([house['lat'] for house in households], dtype=np.float64)
+		lon = np.array([house['lon'] for house in households], dtype=np.float64)
+		tasks = [(lat[i:i+chunk_size], lon[i:i+chunk_size]) for i in range(0, len(lat), chunk_size)]
+
+		# Index is built once and sent to each process
+		leisure.get_index()
+		shared = {'leisure': leisure, 'k': k, 'radius': radius}
+
+		if n_proc is None:
+			n_proc = os.cpu_count()
+		n_proc = max(1, min(n_proc, len(tasks)))
+
+		if n_proc == 1:
+			_init_worker(shared)
+			chunks = [_chunk_candidates(task) for task in tasks]
+		else:
+			with mp.Pool(n_proc, initializer=_init_worker, initargs=(shared,)) as pool:
+				chunks = pool.map(_chunk_candidates, tasks)
+
+		# Merge chunks in household order
+		offsets = np.zeros(len(lat)+1, dtype=np.int64)
+		if chunks:
+			offsets[1:] = np.cumsum(np.concatenate([chunk[0] for chunk in chunks]))
+			IDs = np.concatenate([chunk[1] for chunk in chunks])
+			distances = np.concatenate([chunk[2] for chunk in chunks])
+		else:
+			IDs = np.empty(0, dtype=np.int32)
+			distances = np.empty(0, dtype=np.float32)
+
+		return cls(offsets, IDs, distances)
+
+	@classmethod
+	def load(cls, fname, mmap=True):
+		''' Load the table saved with fname prefix,
+				memory mapped unless mmap is False '''
+
+		mode = 'r' if mmap else None
+		arrays = {}
+		for key, suffix in cls.suffixes.items():
+			arrays[key] = np.load(fname + suffix, mmap_mode=mode, allow_pickle=False)
+		return cls(arrays['offsets'], arrays['IDs'], arrays['distances'])
+
+	def save(self, fname):
+		''' Save as .npy files with fname prefix, e.g.
+				NR_leisure_candidates_offsets.npy '''
+
+		np.save(fname + self.suffixes['offsets'], self.offsets)
+		np.save(fname + self.suffixes['IDs'], self.IDs)
+		np.save(fname + self.suffixes['distances'], self.distances)
+
+	def candidates(self, houseID):
+		''' IDs and distances of the candidate leisure
+				locations of household with houseID '''
+
+		start, end = self.offsets[houseID-1], self.offsets[houseID]
+		return self.IDs[start:end], self.distances[start:end]
+
+	def __repr__(self):
+		''' Summary of the table '''
+		return (str(self.n) + ' households, ' + str(len(self.IDs)) + ' candidate leisure locations')
+
+def _init_worker(shared):
+	''' Store leisure locations and settings of this process '''
+	_shared.update(shared)
+
+def _chunk_candidates(task):
+	''' Candidates of one chunk of households, returns number
+			of candidates of each household, IDs, and distances '''
+
+	lat, lon = task
+	offsets, IDs, distances = _shared['leisure'].candidate_table(lat, lon, _shared['k'], _shared['radius'])
+	return np.diff(offsets), IDs, distances
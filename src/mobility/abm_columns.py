@@ -0,0 +1,174 @@
+# ------------------------------------------------------------------
+#
+#	Module for agent properties stored on disk as columns
+#
+# ------------------------------------------------------------------
+
+#
+# Each agent property is one .npy file in the store directory,
+# preallocated for the whole population and memory mapped. Agents
+# generated in blocks (Agents.distribute_households_out_of_core)
+# are appended as they are created, so only the current block is
+# kept as a list of dicts. Later stages that go over all agents
+# (workplaces, transit, occupations) read and write the columns
+# through StoredAgents. The text output has the same format as
+# Agents.__repr__ and is written in chunks.
+#
+
+import os
+import numpy as np
+
+class AgentStore(object):
+	''' Class for agent properties stored as memory mapped columns '''
+
+	# Agent property : type of its column
+	dtypes = {'ID': np.int64, 'student': bool, 'works': bool, 'yrs': np.int64,
+				'lon': np.float64, 'lat': np.float64, 'houseID': np.int64,
+				'isPatient': bool, 'schoolID': np.int64, 'workID': np.int64,
+				'worksHospital': bool, 'hospitalID': np.int64, 'infected': bool,
+				'RetirementHome': bool, 'worksRH': bool, 'worksSchool': bool,
+				'isFamily': bool, 'works from home': bool, 'work travel time': np.float64,
+				'work travel mode': 'U8', 'specialWorkID': np.int64, 'carpoolID': np.int64,
+				'publicID': np.int64, 'occupation': 'U64', 'work_type': 'U64'}
+
+	# Properties in the order of the agents text file
+	text_columns = ['student', 'works', 'yrs', 'lon', 'lat', 'houseID', 'isPatient',
+						'schoolID', 'RetirementHome', 'worksRH', 'worksSchool', 'workID',
+						'worksHospital', 'hospitalID', 'infected', 'works from home',
+						'work travel time', 'work travel mode', 'specialWorkID',
+						'carpoolID', 'publicID', 'occupation']
+
+	def __init__(self, path, n_agents):
+		''' Create empty columns for n_agents in directory path '''
+
+		os.makedirs(path, exist_ok=True)
+		self.path = path
+		self.n_agents = n_agents
+		# Number of agents stored so far
+		self.n = 0
+		self.columns = {}
+		for key, dtype in self.dtypes.items():
+			self.columns[key] = np.lib.format.open_memmap(column_file(path, key), mode='w+',
+																dtype=dtype, shape=(n_agents,))
+
+	@classmethod
+	def load(cls, path, mmap=True):
+		''' Load columns stored in directory path,
+				memory mapped unless mmap is False '''
+
+		store = cls.__new__(cls)
+		store.path = path
+		store.columns = {}
+		mode = 'r' if mmap else None
+		for key in cls.dtypes.keys():
+			store.columns[key] = np.load(column_file(path, key), mmap_mode=mode, allow_pickle=False)
+		store.n_agents = len(store.columns['ID'])
+		store.n = store.n_agents
+		return store
+
+	def append(self, agents):
+		''' Store a block of agents (dicts) after the ones already stored '''
+
+		start, end = self.n, self.n + len(agents)
+		if end > self.n_agents:
+			raise ValueError('Store has space for ' + str(self.n_agents) + ' agents, got ' + str(end))
+		for key, column in self.columns.items():
+			column[start:end] = [agent[key] for agent in agents]
+		self.n = end
+
+	def agents(self, start=0, end=None):
+		''' Stored agents from start to end (indices) as dicts '''
+
+		end = self.n if end is None else min(end, self.n)
+		values = {key: column[start:end].tolist() for key, column in self.columns.items()}
+		block = []
+		for ia in range(end - start):
+			agent = {key: value[ia] for key, value in values.items()}
+			if agent['work travel mode'] == 'None':
+				agent['work travel mode'] = None
+			block.append(agent)
+		return block
+
+	def flush(self):
+		''' Write stored blocks to disk '''
+
+		for column in self.columns.values():
+			if isinstance(column, np.memmap):
+				column.flush()
+
+	def close(self):
+		''' Flush and check that the whole population was stored '''
+
+		self.flush()
+		if self.n != self.n_agents:
+			raise RuntimeError('Stored ' + str(self.n) + ' agents, expected ' + str(self.n_agents))
+
+	def write(self, fname, chunk_size=100000):
+		''' Write agents to a text file in the Agents.__repr__ format '''
+
+		with open(fname, 'w') as fout:
+			for start in range(0, self.n, chunk_size):
+				end = min(start + chunk_size, self.n)
+				values = []
+				for key in self.text_columns:
+					value = self.columns[key][start:end]
+					if value.dtype == bool:
+						value = value.astype(np.int64)
+					values.append([str(x) for x in value.tolist()])
+				if start > 0:
+					fout.write('\n')
+				fout.write(('\n').join([(' ').join(line) for line in zip(*values)]))
+
+def column_file(path, key):
+	''' File of the agent property key in directory path '''
+	return os.path.join(path, key.replace(' ', '_') + '.npy')
+
+class StoredAgents(object):
+	''' Class for the agents of an AgentStore used like the list of 
+			agents (dicts) of Agents; values are read from and written
+			to the store columns, nothing is kept in memory '''
+
+	def __init__(self, store):
+		''' Agents of AgentStore store '''
+		self.store = store
+
+	def __len__(self):
+		''' Number of stored agents '''
+		return self.store.n
+
+	def __getitem__(self, ind):
+		''' Agent with index ind '''
+
+		if not (-self.store.n <= ind < self.store.n):
+			raise IndexError('Agent index out of range')
+		return StoredAgent(self.store.columns, ind % self.store.n)
+
+	def __iter__(self):
+		''' All agents in ID order '''
+		for ind in range(self.store.n):
+			yield StoredAgent(self.store.columns, ind)
+
+class StoredAgent(object):
+	''' Class for one agent of an AgentStore, used like an agent dict '''
+
+	__slots__ = ('columns', 'ind')
+
+	def __init__(self, columns, ind):
+		''' Agent with index ind in columns '''
+		self.columns = columns
+		self.ind = ind
+
+	def __getitem__(self, key):
+		''' Property key of the agent '''
+
+		value = self.columns[key][self.ind].item()
+		if (key == 'work travel mode') and (value == 'None'):
+			return None
+		return value
+
+	def __setitem__(self, key, value):
+		''' Set property key of the agent '''
+
+		if value is None:
+			value = 'None'
+		self.columns[key][self.ind] = value
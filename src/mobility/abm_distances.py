@@ -0,0 +1,119 @@
+# ------------------------------------------------------------------
+#
+#	Module for household to workplace distances
+#
+# ------------------------------------------------------------------
+
+#
+# Households in multi-unit buildings share coordinates. Distances
+# from a building to all workplaces are computed once and reused by
+# every household (and agent) in that building. The most recently
+# used buildings are kept, agents of one building are usually
+# processed close together.
+#
+# Optionally, distances between all buildings and workplaces are 
+# stored on disk as a float32 .npy matrix and memory mapped. The file
+# name contains hashes of building and workplace coordinates, so 
+# later generations with the same places reuse it and different 
+# places never do. Rows are buildings sorted by coordinates.
+#
+
+import os, hashlib
+from collections import OrderedDict
+import numpy as np
+import abm_utils as aut
+
+class WorkplaceDistances(object):
+	''' Class for distances from household buildings to all workplaces '''
+
+	def __init__(self, workplaces, max_buildings=5000):
+		''' Store workplace coordinates and types '''
+
+		#
+		# workplaces - list of workplaces, IDs start from 1 and 
+		#	follow list order
+		# max_buildings - maximum number of buildings whose
+		#	distances are kept at a time
+		#
+
+		self.lat = np.array([x['lat'] for x in workplaces], dtype=np.float64)
+		self.lon = np.array([x['lon'] for x in workplaces], dtype=np.float64)
+		self.outside = np.array([x['type'] == 'outside' for x in workplaces], dtype=bool)
+		self.max_buildings = max_buildings
+		# Building coordinates : distances to all workplaces
+		self.buildings = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+		# Memory mapped distance matrix, its file,
+		# and building coordinates : matrix row
+		self.matrix = None
+		self.matrix_file = None
+		self.rows = {}
+
+	def use_matrix(self, households, cache_dir, chunk_size=1000):
+		''' Load the distance matrix between buildings of households 
+				and workplaces from cache_dir, or compute and save it first '''
+
+		#
+		# households - list of households with 'lat' and 'lon'
+		# cache_dir - directory with the matrix files
+		# chunk_size - number of buildings computed at a time
+		#
+
+		homes = np.unique(np.array([[x['lat'], x['lon']] for x in households], dtype=np.float64).reshape(-1,2), axis=0)
+		work = np.stack((self.lat, self.lon), axis=1)
+		fname = os.path.join(cache_dir, 'work_distances_' + coordinate_hash(homes) 
+								+ '_' + coordinate_hash(work) + '.npy')
+		
+		if not os.path.exists(fname):
+			os.makedirs(cache_dir, exist_ok=True)
+			# Written under a temporary name so that other
+			# runs never load an incomplete file
+			temp_name = fname + '.' + str(os.getpid()) + '.tmp'
+			matrix = np.lib.format.open_memmap(temp_name, mode='w+', dtype=np.float32, shape=(len(homes), len(work)))
+			for start in range(0, len(homes), chunk_size):
+				part = homes[start:start+chunk_size]
+				matrix[start:start+chunk_size] = aut.compute_distances(part[:,0:1], part[:,1:2], self.lat, self.lon)
+			matrix.flush()
+			del matrix
+			os.replace(temp_name, fname)
+
+		self.matrix = np.load(fname, mmap_mode='r', allow_pickle=False)
+		self.matrix_file = fname
+		self.rows = {(lat, lon): i for i, (lat, lon) in enumerate(homes.tolist())}
+
+	def get(self, house):
+		''' Distances in km from the building of house 
+				to all workplaces, in workplace order '''
+
+		key = (house['lat'], house['lon'])
+		if key in self.rows:
+			self.hits += 1
+			return self.matrix[self.rows[key]].astype(np.float64)
+
+		if key in self.buildings:
+			self.hits += 1
+			self.buildings.move_to_end(key)
+			return self.buildings[key]
+
+		self.misses += 1
+		dist = aut.compute_distances(house['lat'], house['lon'], self.lat, self.lon)
+		self.buildings[key] = dist
+		if len(self.buildings) > self.max_buildings:
+			self.buildings.popitem(last=False)
+		return dist
+
+	def building_rows(self, lat, lon):
+		''' Matrix rows of buildings with coordinates lat, lon, 
+				-1 for buildings not in the matrix '''
+		return np.array([self.rows.get(key, -1) for key in zip(lat, lon)], dtype=np.int64)
+
+	def __repr__(self):
+		''' Cache statistics '''
+		return (str(len(self.buildings)) + ' buildings stored, ' + str(self.hits) + ' hits, ' 
+					+ str(self.misses) + ' misses')
+
+def coordinate_hash(coords):
+	''' SHA-1 hex digest of an array of coordinates '''
+	return hashlib.sha1(np.ascontiguousarray(coords, dtype=np.float64).tobytes()).hexdigest()
@@ -0,0 +1,124 @@
+# ------------------------------------------------------------------
+#
+#	Module for parallel generation of ensembles of ABM populations
+#
+# ------------------------------------------------------------------
+
+import os
+import multiprocessing as mp
+import numpy as np
+from copy import deepcopy
+import abm_random as ar
+
+# Inputs shared by all replicates generated in one process,
+# set once by the pool initializer
+_shared = {}
+
+class Ensemble(object):
+	''' Class for generating independent stochastic realizations
+			(replicates) of the same town in parallel '''
+
+	def __init__(self, places, agents, transit, params, out_dir, seed=None):
+		''' Store the inputs that are shared by all replicates '''
+
+		#
+		# places - dict with generated place objects, keys: 'households',
+		#	'retirement_homes', 'hospitals', 'schools', 'workplaces', 'leisure';
+		#	workplaces need to be already merged with special workplaces
+		# agents - Agents object with loaded census data and no agents yet
+		# transit - Transit object with loaded travel data
+		# params - dict with 'fr_vacancy', 'max_working_age', 'n_employed'
+		# out_dir - root output directory, replicate i is
+		#	saved in out_dir/replicate_i
+		# seed - root seed of the ensemble, None for a random one
+		#
+
+		self.out_dir = out_dir
+		self.shared = {'places': places, 'agents': agents,
+						'transit': transit, 'params': params}
+		# Root of all replicate seeds
+		self.seed_sequence = np.random.SeedSequence(seed)
+		# Output file names, same as in town_generation
+		self.file_names = {'households': 'NR_households.txt',
+							'retirement_homes': 'NR_retirement_homes.txt',
+							'hospitals': 'NR_hospitals.txt',
+							'schools': 'NR_schools.txt',
+							'workplaces': 'NR_workplaces.txt',
+							'leisure': 'NR_leisure.txt',
+							'agents': 'NR_agents.txt', 'carpools': 'NR_carpool.txt',
+							'public': 'NR_public.txt'}
+		self.shared['file_names'] = self.file_names
+
+	def replicate_seeds(self, n_replicates):
+		''' Independent, reproducible seed sequences, one per replicate;
+				replicate i always gets the same seed for the same root seed '''
+		return self.seed_sequence.spawn(n_replicates)
+
+	def run(self, n_replicates, n_proc=None):
+		''' Generate n_replicates populations on a pool of n_proc
+				processes, returns a list of output directories '''
+
+		# n_proc - number of processes, all cores if None
+
+		if n_proc is None:
+			n_proc = os.cpu_count()
+		n_proc = max(1, min(n_proc, n_replicates))
+
+		tasks = []
+		for ind, seq in enumerate(self.replicate_seeds(n_replicates)):
+			tasks.append((ind, seq, os.path.join(self.out_dir, 'replicate_' + str(ind))))
+
+		if n_proc == 1:
+			_init_worker(self.shared)
+			return [_generate_replicate(task) for task in tasks]
+
+		# Inputs are sent once per process, not once per replicate
+		with mp.Pool(n_proc, initializer=_init_worker, initargs=(self.shared,)) as pool:
+			out_dirs = pool.map(_generate_replicate, tasks, chunksize=1)
+
+		return out_dirs
+
+def _init_worker(shared):
+	''' Store inputs shared by all replicates of this process '''
+	_shared.update(shared)
+
+def _generate_replicate(task):
+	''' Generate and save one replicate, returns its output directory '''
+
+	ind, seed_seq, out_dir = task
+
+	places = _shared['places']
+	params = _shared['params']
+	fnames = _shared['file_names']
+
+	# Inputs that get modified during generation
+	agents = deepcopy(_shared['agents'])
+	transit = deepcopy(_shared['transit'])
+	workplaces = deepcopy(places['workplaces'])
+
+	# Independent, reproducible streams of this replicate
+	rng = ar.RandomContext(seed_seq)
+	agents.rng = rng
+	transit.rng = rng
+
+	households = places['households'].households
+	agents.distribute_retirement_homes(places['retirement_homes'].retirement_homes)
+	agents.distribute_hospital_patients(places['hospitals'].hospitals)
+	agents.distribute_households(households, params['fr_vacancy'])
+	agents.distribute_schools(places['schools'].schools)
+	agents.distribute_transit_and_workplaces(households, workplaces.workplaces, transit,
+				params['max_working_age'], params['n_employed'], workplaces.occ_map)
+
+	# Each replicate is a complete community
+	os.makedirs(out_dir, exist_ok=True)
+	for key in ['households', 'retirement_homes', 'hospitals', 'schools', 'leisure']:
+		with open(os.path.join(out_dir, fnames[key]), 'w') as fout:
+			fout.write(repr(places[key]))
+	with open(os.path.join(out_dir, fnames['workplaces']), 'w') as fout:
+		fout.write(repr(workplaces))
+	transit.print_public_transit(os.path.join(out_dir, fnames['public']))
+	transit.print_carpools(os.path.join(out_dir, fnames['carpools']))
+	with open(os.path.join(out_dir, fnames['agents']), 'w') as fout:
+		fout.write(repr(agents))
+
+	return out_dir
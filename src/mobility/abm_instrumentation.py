@@ -0,0 +1,154 @@
+# ------------------------------------------------------------------
+#
+#	Module for timing and memory instrumentation of
+#	 population generation
+#
+# ------------------------------------------------------------------
+
+import time, json, resource, tracemalloc, functools, copy
+from contextlib import contextmanager
+
+class Instrumentation(object):
+	''' Class for collecting wall time, CPU time, memory use and
+			item counts of generation stages and hot functions '''
+
+	def __init__(self, trace_memory=False):
+		''' Initialize empty records '''
+
+		#
+		# trace_memory - if True, also record peak Python heap
+		#	allocation of each stage using tracemalloc; this is
+		#	accurate but slows the generation down considerably
+		#
+
+		self.trace_memory = trace_memory
+		# List of per stage records, in order of execution
+		self.stages = []
+		# Function name : accumulated record
+		self.functions = {}
+
+		if self.trace_memory and not tracemalloc.is_tracing():
+			tracemalloc.start()
+
+	@contextmanager
+	def stage(self, name, count=None):
+		''' Time and measure the code block executed under this
+				context, e.g. with instr.stage('households'): ...
+				count is the number of items the stage processed,
+				it can also be set in the block via the yielded record '''
+
+		record = {'name': name, 'count': count}
+
+		if self.trace_memory:
+			tracemalloc.reset_peak()
+		wall_0 = time.perf_counter()
+		cpu_0 = time.process_time()
+
+		try:
+			yield record
+		finally:
+			record['wall_time'] = time.perf_counter() - wall_0
+			record['cpu_time'] = time.process_time() - cpu_0
+			record['peak_rss_MB'] = self.peak_rss()
+			if self.trace_memory:
+				record['peak_traced_MB'] = tracemalloc.get_traced_memory()[1]/1024.0**2
+			if record['count'] and record['wall_time'] > 0.0:
+				record['throughput'] = record['count']/record['wall_time']
+			self.stages.append(record)
+
+	def attach(self, obj, names):
+		''' Replace methods names of object obj with timed versions;
+				only this instance is affected, the class is not '''
+
+		for name in names:
+			self.functions.setdefault(name, {'calls': 0, 'wall_time': 0.0, 'cpu_time': 0.0})
+			setattr(obj, name, TimedMethod(self, obj, name))
+
+	def detach(self, obj, names):
+		''' Restore original methods names of object obj '''
+		for name in names:
+			if name in obj.__dict__:
+				delattr(obj, name)
+
+	def timed(self, func, name):
+		''' Return func wrapped so that its calls, wall and CPU
+				times are accumulated under name '''
+
+		self.functions.setdefault(name, {'calls': 0, 'wall_time': 0.0, 'cpu_time': 0.0})
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			return self.call(func, name, args, kwargs)
+
+		return wrapper
+
+	def call(self, func, name, args, kwargs):
+		''' Run func and accumulate its wall and CPU time under name '''
+
+		record = self.functions[name]
+		wall_0 = time.perf_counter()
+		cpu_0 = time.process_time()
+		try:
+			return func(*args, **kwargs)
+		finally:
+			record['wall_time'] += time.perf_counter() - wall_0
+			record['cpu_time'] += time.process_time() - cpu_0
+			record['calls'] += 1
+
+	def peak_rss(self):
+		''' Peak resident set size of this process so far, in MB '''
+		# ru_maxrss is in kB on Linux
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0
+
+	def report(self):
+		''' Return all the records as a dictionary '''
+
+		functions = {}
+		for name, record in self.functions.items():
+			functions[name] = dict(record)
+			if record['calls'] > 0:
+				functions[name]['time_per_call'] = record['wall_time']/record['calls']
+
+		return {'stages': self.stages, 'functions': functions,
+					'total_wall_time': sum([x['wall_time'] for x in self.stages]),
+					'peak_rss_MB': self.peak_rss()}
+
+	def save(self, fname):
+		''' Save the report as JSON to file fname '''
+		with open(fname, 'w') as fout:
+			json.dump(self.report(), fout, indent=4)
+
+	def __repr__(self):
+		''' Human readable summary of the stages and functions '''
+
+		info = []
+		for record in self.stages:
+			info.append('{0:<40}{1:>12.3f} s wall{2:>12.3f} s CPU{3:>12.1f} MB peak RSS\n'.format(
+						record['name'], record['wall_time'], record['cpu_time'], record['peak_rss_MB']))
+		for name, record in self.functions.items():
+			info.append('{0:<40}{1:>12.3f} s wall{2:>12d} calls\n'.format(
+						name, record['wall_time'], record['calls']))
+		return ''.join(info)
+
+class TimedMethod(object):
+	''' Class for a timed method of one object '''
+
+	def __init__(self, instr, obj, name):
+		''' Store the instrumentation, the object, and the method name '''
+
+		# As in abm_profiling.ProfiledMethod, the method is looked
+		# up when called so that copies of the object run it on
+		# themselves; deep copies still record into instr
+		self.instr = instr
+		self.obj = obj
+		self.name = name
+
+	def __call__(self, *args, **kwargs):
+		''' Call the method of the object and time it '''
+
+		func = getattr(type(self.obj), self.name).__get__(self.obj)
+		return self.instr.call(func, self.name, args, kwargs)
+
+	def __deepcopy__(self, memo):
+		''' Copy of the method for a copy of the object '''
+		return TimedMethod(self.instr, copy.deepcopy(self.obj, memo), self.name)
@@ -0,0 +1,132 @@
+# ------------------------------------------------------------------
+#
+#	Module for columnar (binary) storage of processed
+#	 SafeGraph POI tables (*Trimmed.csv files)
+#
+# ------------------------------------------------------------------
+
+#
+# A table is a dict of numpy arrays, one per column. Coordinates
+# are float64, zip codes int64, and text columns are dictionary
+# encoded - column + '_codes' holds int32 indices into
+# column + '_values', the unique strings in order of first appearance.
+# Tables are saved as .npz files and loaded without pickling.
+#
+
+import csv, os
+import numpy as np
+
+# Kind of table : (text columns, float columns, integer columns)
+table_columns = {'leisure': (['name', 'type'], ['lat', 'lon'], []),
+				'work_in': (['type'], ['lat', 'lon'], []),
+				'work_out': (['type'], ['lat', 'lon'], ['zip'])}
+
+def read_table(fname, kind):
+	''' Read a table of given kind either from the
+			columnar file (.npz) or from the text file '''
+
+	if fname.endswith('.npz'):
+		return load_table(fname, kind)
+	else:
+		return read_text(fname, kind)
+
+def read_text(fname, kind):
+	''' Parse a text POI table of given kind, returns
+			a columnar table '''
+
+	#
+	# kind - 'leisure' for *_LeisureTrimmed.csv (comma separated, name,
+	#			type, latitude, longitude), 'work_in' for in-town
+	#			*_WorkTrimmed.csv (type, latitude, longitude), 'work_out'
+	#			for out-of-town workplaces (latitude, longitude, zip
+	#			code, type); all files have a header
+	#
+
+	if not (kind in table_columns):
+		raise ValueError('Unsupported POI table kind ' + kind)
+
+	text_cols, float_cols, int_cols = table_columns[kind]
+	columns = {}
+	for key in text_cols + float_cols + int_cols:
+		columns[key] = []
+
+	with open(fname, 'r', newline='') as fin:
+		if kind == 'leisure':
+			# Quoted fields may contain commas
+			lines = csv.reader(fin)
+		else:
+			lines = (line.split() for line in fin)
+		# Skip the header
+		next(lines)
+		for line in lines:
+			if not line:
+				continue
+			if kind == 'leisure':
+				# Everything between the first and the last
+				# two fields is the type
+				columns['name'].append(line[0].strip())
+				columns['type'].append((',').join(line[1:-2]).strip('"'))
+				columns['lat'].append(float(line[-2]))
+				columns['lon'].append(float(line[-1]))
+			elif kind == 'work_in':
+				columns['type'].append(line[0])
+				columns['lat'].append(float(line[1]))
+				columns['lon'].append(float(line[2]))
+			else:
+				columns['lat'].append(float(line[0]))
+				columns['lon'].append(float(line[1]))
+				columns['zip'].append(int(line[2]))
+				columns['type'].append(line[3] if len(line) > 3 else '')
+
+	table = {}
+	for key in text_cols:
+		table[key + '_values'], table[key + '_codes'] = encode(columns[key])
+	for key in float_cols:
+		table[key] = np.array(columns[key], dtype=np.float64)
+	for key in int_cols:
+		table[key] = np.array(columns[key], dtype=np.int64)
+	return table
+
+def encode(values):
+	''' Dictionary encode a list of strings, returns unique
+			strings and int32 code of each value '''
+
+	index = {}
+	codes = np.fromiter((index.setdefault(x, len(index)) for x in values), dtype=np.int32, count=len(values))
+	return np.array(list(index), dtype=str), codes
+
+def decode(table, key):
+	''' Return text column key as a list of strings '''
+	return table[key + '_values'][table[key + '_codes']].tolist()
+
+def save_table(fname, table, kind):
+	''' Save a columnar table of given kind to fname (.npz) '''
+	np.savez(fname, kind=np.array(kind), **table)
+
+def load_table(fname, kind=None):
+	''' Load a columnar table from fname (.npz),
+			optionally checking its kind '''
+
+	with np.load(fname, allow_pickle=False) as data:
+		if (kind is not None) and (str(data['kind']) != kind):
+			raise ValueError('File ' + fname + ' has a ' + str(data['kind']) + ' table, expected ' + kind)
+		return {key: data[key] for key in data.files if key != 'kind'}
+
+def export_table(fname, kind, fname_out=None):
+	''' Convert a text POI table to a columnar file, by default
+			with the same name and .npz extension; returns
+			the name of the new file '''
+
+	if fname_out is None:
+		fname_out = os.path.splitext(fname)[0] + '.npz'
+	save_table(fname_out, read_text(fname, kind), kind)
+	return fname_out
+
+def cached_table(fname, kind):
+	''' Returns the name of the columnar version of a text POI table,
+			creating it if it does not exist or is older than the text file '''
+
+	fname_out = os.path.splitext(fname)[0] + '.npz'
+	if (not os.path.exists(fname_out)) or (os.path.getmtime(fname_out) < os.path.getmtime(fname)):
+		export_table(fname, kind, fname_out)
+	return fname_out
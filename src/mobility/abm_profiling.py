@@ -0,0 +1,202 @@
+# ------------------------------------------------------------------
+#
+#	Module for opt-in profiling of population generation stages
+#
+# ------------------------------------------------------------------
+
+import os, sys, time, threading, functools
+import cProfile
+from collections import Counter
+
+class ProfilingHooks(object):
+	''' Class for attaching profilers and callbacks to the
+			distribution methods of an Agents object '''
+
+	# Methods that can be profiled
+	stages = ['distribute_households', 'distribute_schools',
+				'distribute_transit_and_workplaces', 'group_carpools',
+				'group_public_transit', 'match_workplace_to_occupation']
+
+	def __init__(self, mode='cprofile', out_dir='profiles', methods=None, interval=0.005):
+		''' Set up the profiling '''
+
+		#
+		# mode - 'cprofile' for deterministic profiling, 'sampling' for
+		#	a statistical profiler with low overhead, None for
+		#	callbacks only
+		# out_dir - directory for the per-stage profile files
+		# methods - names of the methods to profile, all stages if None
+		# interval - sampling interval in seconds
+		#
+
+		if not (mode in ['cprofile', 'sampling', None]):
+			raise ValueError('Unknown profiling mode ' + str(mode))
+
+		self.mode = mode
+		self.out_dir = out_dir
+		self.methods = methods if methods is not None else list(self.stages)
+		self.interval = interval
+
+		# Method name : list of functions called before/after that
+		# method as f(name, args, kwargs) and f(name, result, elapsed)
+		self.before = {}
+		self.after = {}
+
+		# Number of calls of each method, for file names
+		self.calls = Counter()
+		# True while a profiler is running; stages nested in a
+		# profiled stage are a part of its profile
+		self.active = False
+
+	@classmethod
+	def from_environment(cls):
+		''' Create hooks from environment variables, None if profiling
+				is not requested. ABM_PROFILE is the mode (cprofile or
+				sampling), ABM_PROFILE_DIR the output directory and
+				ABM_PROFILE_METHODS a comma separated list of methods '''
+
+		mode = os.environ.get('ABM_PROFILE')
+		if not mode:
+			return None
+
+		out_dir = os.environ.get('ABM_PROFILE_DIR', 'profiles')
+		methods = os.environ.get('ABM_PROFILE_METHODS')
+		if methods:
+			methods = [x.strip() for x in methods.split(',')]
+		return cls(mode, out_dir, methods)
+
+	def add_callback(self, name, before=None, after=None):
+		''' Register callbacks for method name '''
+
+		if before is not None:
+			self.before.setdefault(name, []).append(before)
+		if after is not None:
+			self.after.setdefault(name, []).append(after)
+
+	def attach(self, obj):
+		''' Replace the profiled methods of object obj;
+				the class and its other instances are unchanged '''
+
+		for name in self.methods:
+			setattr(obj, name, ProfiledMethod(self, obj, name))
+
+	def wrap(self, func, name):
+		''' Return func with callbacks and profiling '''
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			return self.call(func, name, args, kwargs)
+
+		return wrapper
+
+	def call(self, func, name, args, kwargs):
+		''' Run func with callbacks and profiling '''
+
+		for callback in self.before.get(name, []):
+			callback(name, args, kwargs)
+
+		self.calls[name] += 1
+		t_0 = time.perf_counter()
+		if (self.mode is None) or self.active:
+			result = func(*args, **kwargs)
+		else:
+			result = self.profile(func, name, args, kwargs)
+		elapsed = time.perf_counter() - t_0
+
+		for callback in self.after.get(name, []):
+			callback(name, result, elapsed)
+		return result
+
+	def profile(self, func, name, args, kwargs):
+		''' Run func under the profiler and save the profile '''
+
+		os.makedirs(self.out_dir, exist_ok=True)
+		fname = os.path.join(self.out_dir, name + '_' + str(self.calls[name]))
+
+		self.active = True
+		try:
+			if self.mode == 'cprofile':
+				profiler = cProfile.Profile()
+				result = profiler.runcall(func, *args, **kwargs)
+				profiler.dump_stats(fname + '.prof')
+			else:
+				sampler = SamplingProfiler(self.interval)
+				sampler.start()
+				try:
+					result = func(*args, **kwargs)
+				finally:
+					sampler.stop()
+				sampler.save(fname + '.txt')
+		finally:
+			self.active = False
+
+		return result
+
+class ProfiledMethod(object):
+	''' Class for a profiled method of one object '''
+
+	def __init__(self, hooks, obj, name):
+		''' Store the hooks, the object, and the method name '''
+
+		# The method is looked up when called, so that copies of 
+		# the object (deepcopy, pickle) that copy this attribute 
+		# run the method on the copy and not on obj
+		self.hooks = hooks
+		self.obj = obj
+		self.name = name
+
+	def __call__(self, *args, **kwargs):
+		''' Call the method of the object with callbacks and profiling '''
+
+		func = getattr(type(self.obj), self.name).__get__(self.obj)
+		return self.hooks.call(func, self.name, args, kwargs)
+
+class SamplingProfiler(object):
+	''' Class for periodically sampling the call stack of a thread '''
+
+	def __init__(self, interval=0.005):
+		''' Prepare sampling of the calling thread '''
+
+		# interval - time between samples in seconds
+
+		self.interval = interval
+		self.thread_id = threading.get_ident()
+		# Call stack : number of times it was sampled
+		self.samples = Counter()
+		self.running = threading.Event()
+		self.thread = None
+
+	def start(self):
+		''' Start sampling in a background thread '''
+
+		self.running.set()
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		''' Stop sampling '''
+
+		self.running.clear()
+		self.thread.join()
+
+	def run(self):
+		''' Sample the stack until stopped '''
+
+		while self.running.is_set():
+			frame = sys._current_frames().get(self.thread_id)
+			stack = []
+			while frame is not None:
+				code = frame.f_code
+				stack.append(os.path.basename(code.co_filename) + ':' + code.co_name + ':' + str(frame.f_lineno))
+				frame = frame.f_back
+			if stack:
+				self.samples[(';').join(reversed(stack))] += 1
+			time.sleep(self.interval)
+
+	def save(self, fname):
+		''' Save in the collapsed stack format, one stack and
+				its number of samples per line (flame graph input) '''
+
+		with open(fname, 'w') as fout:
+			for stack, count in self.samples.most_common():
+				fout.write(stack + ' ' + str(count) + '\n')
@@ -6,6 +6,9 @@
 
 import math
 import random
+import abm_poi_tables as apt
+import abm_spatial as spatial
+import numpy as np
 
 class Workplaces(object):
 	''' Class for generation of workplaces '''
@@ -63,35 +66,33 @@ class Workplaces(object):
 		''' Read and store workplace data for 
 				all workplaces in the town '''
 		
-		with open(fname_data, 'r') as fin:
-			# Skip the header
-			next(fin)
-			ID = 0
-			for line in fin:
-				temp = {}
-				line = line.strip().split()
+		# Text (*_WorkTrimmed.csv) or columnar (.npz) table
+		table = apt.read_table(fname_data, 'work_in')
+		ID = 0
+		for wtype, lat, lon in zip(apt.decode(table, 'type'), table['lat'].tolist(), table['lon'].tolist()):
+			temp = {}
 
-				# Exclude hospitals, retirement homes, 
-				# and schools
-				if (line[0] == 'H') or ('AA' in line[0]) or (line[0] == 'F'):
-					continue
+			# Exclude hospitals, retirement homes, 
+			# and schools
+			if (wtype == 'H') or ('AA' in wtype) or (wtype == 'F'):
+				continue
 
-				ID += 1
-				# Common information
-				temp['ID'] = ID
-				# Non zero only for schools, retirement homes, and hospitals
-				temp['specialID'] = 0
-				temp['occupation'] = self.occ_map[line[0]]
-				temp['type'] = line[0]
-				temp['lon'] = float(line[2])
-				temp['lat'] = float(line[1])
-				# Current number of employees
-				temp['N_emp'] = 0
-				# Min and max number of employees for that type
-				temp['N_min'] = self.workplace_map[temp['type']][1]
-				temp['N_max'] = self.workplace_map[temp['type']][2]
+			ID += 1
+			# Common information
+			temp['ID'] = ID
+			# Non zero only for schools, retirement homes, and hospitals
+			temp['specialID'] = 0
+			temp['occupation'] = self.occ_map[wtype]
+			temp['type'] = wtype
+			temp['lon'] = lon
+			temp['lat'] = lat
+			# Current number of employees
+			temp['N_emp'] = 0
+			# Min and max number of employees for that type
+			temp['N_min'] = self.workplace_map[temp['type']][1]
+			temp['N_max'] = self.workplace_map[temp['type']][2]
 
-				self.workplaces.append(temp)
+			self.workplaces.append(temp)
 		self.ntot = ID
 		print('Loaded ' + str(ID) + ' workplaces from GIS')
 		
@@ -160,18 +161,17 @@ class Workplaces(object):
 		ID = self.ntot
 
 		# Read and group by zipcodes 
+		# (text or columnar table)
+		table = apt.read_table(fname, 'work_out')
 		all_out = {}
-		with open(fname, 'r') as fin:
-			next(fin)
-			for line in fin:
-				line = line.strip().split()
-				zipcode = str(int(line[2]))
-				if zipcode in all_out:
-					all_out[zipcode][0].append(float(line[0]))
-					all_out[zipcode][1].append(float(line[1]))
-					all_out[zipcode][2] += 1
-				else:
-					all_out[zipcode] = [[float(line[0])],[float(line[1])], 1]
+		for lat, lon, zipcode in zip(table['lat'].tolist(), table['lon'].tolist(), table['zip'].tolist()):
+			zipcode = str(zipcode)
+			if zipcode in all_out:
+				all_out[zipcode][0].append(lat)
+				all_out[zipcode][1].append(lon)
+				all_out[zipcode][2] += 1
+			else:
+				all_out[zipcode] = [[lat],[lon], 1]
 		
 		# Add each zipcode as a workplace
 		# Coordinates are averaged GIS
@@ -536,6 +536,8 @@ class LeisureLocations(object):
         # Data
         # Buildings
         self.leisure_locations = []
+        # Spatial index, built on first query
+        self.index = None
 
         # Load the buildings
         self.read_gis_data(fname1, fname2, outOfTown)
@@ -552,29 +554,91 @@ class LeisureLocations(object):
         print('Loaded ' + str(self.ntot) + ' leisure locations') 
 
     def loadInfo(self, fname, outOfTown=False, ID=0):
-        with open(fname, 'r') as fin:
-            # Skip the header
-            next(fin)
-            for line in fin:
-                temp = {}
-                line = line.strip().split(',')
-                ID += 1
-                # Common information
-                temp['ID'] = ID
-                temp['name'] = line[0]
-                temp['type'] = ','.join(line[:-2][1:]).strip('"')
-                temp['lat'] = float(line[-2])
-                temp['lon'] = float(line[-1])
-
-                if outOfTown:
-                    temp["in/out"] = "outside"
-                else:
-                    temp["in/out"] = "intown"
-
-                self.leisure_locations.append(temp)
+        ''' Load leisure locations from a text (*_LeisureTrimmed.csv)
+                or columnar (.npz) table, returns the last ID '''
+
+        table = apt.read_table(fname, 'leisure')
+        for name, ltype, lat, lon in zip(apt.decode(table, 'name'), apt.decode(table, 'type'),
+                                            table['lat'].tolist(), table['lon'].tolist()):
+            temp = {}
+            ID += 1
+            # Common information
+            temp['ID'] = ID
+            temp['name'] = name
+            temp['type'] = ltype
+            temp['lat'] = lat
+            temp['lon'] = lon
+
+            if outOfTown:
+                temp["in/out"] = "outside"
+            else:
+                temp["in/out"] = "intown"
+
+            self.leisure_locations.append(temp)
 
         return ID
 
+    def build_index(self, cell_size=1.0):
+        ''' Build the spatial index of all leisure locations,
+                cell_size is the grid cell size in km '''
+
+        lat = [place['lat'] for place in self.leisure_locations]
+        lon = [place['lon'] for place in self.leisure_locations]
+        self.index = spatial.GridIndex(lat, lon, cell_size)
+
+    def get_index(self):
+        ''' Return the spatial index, build it if needed '''
+
+        if self.index is None:
+            self.build_index()
+        return self.index
+
+    def nearest(self, lat, lon, k):
+        ''' IDs and distances in km of the k nearest leisure locations
+                to each point in lat, lon (arrays of coordinates);
+                both are arrays (number of points, k), closest first '''
+
+        # IDs are consecutive, starting from 1
+        indices, distances = self.get_index().query_knn(lat, lon, k)
+        return indices + 1, distances
+
+    def within_radius(self, lat, lon, radius):
+        ''' IDs and distances in km of all leisure locations within
+                radius km of each point in lat, lon; returns offsets, IDs,
+                and distances - locations of point i are in the range
+                offsets[i]:offsets[i+1], closest first '''
+
+        offsets, indices, distances = self.get_index().query_radius(lat, lon, radius)
+        return offsets, indices + 1, distances
+
+    def candidate_table(self, lat, lon, k=None, radius=None):
+        ''' Compact table of candidate leisure locations for each point,
+                e.g. each household; same format as within_radius with
+                int32 IDs and float32 distances '''
+
+        #
+        # lat, lon - arrays with coordinates of the points
+        # k - number of nearest locations per point
+        # radius - maximum distance in km
+        # If both are given, candidates are the k nearest
+        # locations that are also within radius
+        #
+
+        if k is not None:
+            IDs, distances = self.nearest(lat, lon, k)
+            keep = np.ones(IDs.shape, dtype=bool)
+            if radius is not None:
+                keep = distances <= radius
+            offsets = np.zeros(IDs.shape[0]+1, dtype=np.int64)
+            offsets[1:] = np.cumsum(keep.sum(axis=1))
+            IDs, distances = IDs[keep], distances[keep]
+        elif radius is not None:
+            offsets, IDs, distances = self.within_radius(lat, lon, radius)
+        else:
+            raise ValueError('Candidate table needs k, radius, or both')
+
+        return offsets, IDs.astype(np.int32), distances.astype(np.float32)
+
     def __repr__(self):
         ''' String output for stdout or files '''
 
@@ -0,0 +1,57 @@
+# ------------------------------------------------------------------
+#
+#	Module for seedable random number generation
+#
+# ------------------------------------------------------------------
+
+import zlib
+import numpy as np
+
+class RandomContext(object):
+	''' Class that provides independent random number streams,
+			one for each stage of population generation '''
+
+	def __init__(self, seed=None):
+		''' Create the root of all the streams '''
+
+		#
+		# seed - an int, a numpy SeedSequence, or None for a
+		#	random (non-reproducible) seed
+		#
+
+		if isinstance(seed, np.random.SeedSequence):
+			self.seed_sequence = seed
+		else:
+			self.seed_sequence = np.random.SeedSequence(seed)
+
+		# Stage name : numpy Generator of that stage
+		self.streams = {}
+
+	def stream(self, name):
+		''' Return the generator of stage name. The stream depends
+				only on the root seed and the name, not on what
+				other stages ran or in which order. '''
+
+		if not (name in self.streams):
+			self.streams[name] = np.random.default_rng(self.stage_sequence(name))
+		return self.streams[name]
+
+	def stage_sequence(self, name):
+		''' Seed sequence of stage name, derived from the root '''
+
+		key = zlib.crc32(name.encode('utf-8'))
+		return np.random.SeedSequence(self.seed_sequence.entropy,
+					spawn_key=tuple(self.seed_sequence.spawn_key) + (key,))
+
+	def reset(self, name=None):
+		''' Restart the stream of stage name from its beginning;
+				all streams if name is None '''
+
+		if name is None:
+			self.streams = {}
+		elif name in self.streams:
+			del self.streams[name]
+
+	def spawn(self, n):
+		''' Return n independent contexts, e.g. one per replicate '''
+		return [RandomContext(seq) for seq in self.seed_sequence.spawn(n)]
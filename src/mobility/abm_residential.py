@@ -5,7 +5,8 @@
 # ------------------------------------------------------------------
 
 import math, copy
-import random, warnings
+import warnings
+import abm_random as ar
 
 
 # import abm_utils as aut
@@ -14,7 +15,7 @@ import random, warnings
 class Households(object):
     ''' Class for generation of households '''
 
-    def __init__(self, n_tot, fres, res_map=None, funit=None):
+    def __init__(self, n_tot, fres, res_map=None, funit=None, rng=None):
         ''' Generate individual households from input data '''
         #
         # Household is defined as a single living unit
@@ -24,12 +25,17 @@ class Households(object):
         # fres - name of the file with residential data, first line assumed header
         # res_map - name of the file with data for mapping residential types
         # funit - multiunit stats file for creating multiunit buildings from ArcGIS
+        # rng - RandomContext object, None for a random seed
         #
 
         # Total number of households
         self.ntot = n_tot
         # Number of units per floor
         self.n_u_fl = 0
+        # Random number streams
+        if rng is None:
+            rng = ar.RandomContext()
+        self.rng = rng
 
         # Data
         # Buildings
@@ -59,6 +65,23 @@ class Households(object):
             # Count and create the households
             self.create_households_arcgis()
 
+    @classmethod
+    def load(cls, fname):
+        ''' Load households from a file written with __repr__ '''
+
+        households = cls.__new__(cls)
+        households.households = []
+        households.houses_no_ret = []
+        with open(fname, 'r') as fin:
+            for line in fin:
+                line = line.strip().split()
+                if not line:
+                    continue
+                households.households.append({'ID': int(line[0]), 'lat': float(line[1]), 'lon': float(line[2])})
+        households.ntot = len(households.households)
+        households.rng = None
+        return households
+
     def read_gis_data(self, fname):
         ''' Load GIS data on residential buidlings from a file '''
 
@@ -132,6 +155,7 @@ class Households(object):
     def create_households_arcgis(self):
         ''' Create households (including multi-unit buildings) using ArcGIS approach '''
 
+        rng = self.rng.stream('residential')
         # Test counters
         test_count = 0
         excess = 0
@@ -146,7 +170,7 @@ class Households(object):
 
         # Check list length is greater than or equal to than sample size
         if hh <= len(self.res_buildings):
-            res_sample = random.sample(range(0, len(self.res_buildings)), hh)
+            res_sample = rng.choice(len(self.res_buildings), hh, replace=False).tolist()
             # Add directly to database
             for bID in res_sample:
                 self.add_household(ID, self.res_buildings[bID])
@@ -174,7 +198,7 @@ class Households(object):
                 nbuild = math.floor(hh / units)
                 # Randomly assign
                 if 0 < nbuild <= len(self.res_buildings):
-                    res_sample = random.sample(range(0, len(self.res_buildings)), nbuild)
+                    res_sample = rng.choice(len(self.res_buildings), nbuild, replace=False).tolist()
                     for bID in res_sample:
                         # Duplicate entries for each building based on number of units in the building
                         for unit in range(units):
@@ -191,7 +215,7 @@ class Households(object):
 
                 else:
                     warnings.warn("Number of multi-unit buildings less than requested, adding randomly")
-                    res_sample = random.sample(range(0, len(multi_unit_buildings)), nbuild) 
+                    res_sample = rng.choice(len(multi_unit_buildings), nbuild, replace=False).tolist()
                     for bID in res_sample:
                         # Duplicate entries for each building based on number of units in the building
                         for unit in range(units):
@@ -214,7 +238,7 @@ class Households(object):
         # Get the maximum number of buildings to be sampled
         nbuild = math.floor(hh/units)
         # Get a random sample of indices
-        res_sample = random.sample(range(0, len(self.res_buildings)), nbuild)
+        res_sample = rng.choice(len(self.res_buildings), nbuild, replace=False).tolist()
         # Dump all buildings that are not included in the sample
         self.res_buildings = [x for ind, x in enumerate(self.res_buildings) if ind in res_sample]
 
@@ -236,7 +260,7 @@ class Households(object):
                         break
             else:
                 # No more buildings left, distribute randomly across all multiunit
-                random.shuffle(multi_unit_buildings)
+                rng.shuffle(multi_unit_buildings)
                 for building in multi_unit_buildings:
                     self.add_household(ID, building)
                     # Track number of units for each 20+ building
@@ -0,0 +1,137 @@
+# ------------------------------------------------------------------
+#
+#	Module for generation of household residents in shards
+#	 with their own census distributions
+#
+# ------------------------------------------------------------------
+
+#
+# The town is split into shards (e.g. census tracts or zipcodes),
+# each with its own age, household head age, and household size
+# distributions and its own households. Household residents of
+# each shard are generated independently in a pool of processes,
+# with an independent random context, and appended to the town
+# Agents object with contiguous IDs in shard order. Agents left in
+# the age pool of a shard may go to any retirement home of the town.
+# Stages that connect shards - schools, workplaces and transit - run
+# afterwards on the town Agents object.
+#
+
+import os
+import multiprocessing as mp
+import numpy as np
+import abm_agents as aab
+import abm_random as ar
+
+# Households and settings shared by all shards
+# generated in one process, set by the pool initializer
+_shared = {}
+
+class Shards(object):
+	''' Class for generating household residents shard by shard '''
+
+	def __init__(self, shards, params, seed=None):
+		''' Store shard data and settings common to all shards '''
+
+		#
+		# shards - list of dicts, one per shard, with
+		#	'age', 'head_age', 'household_size' - files with the age,
+		#		household head age, and household size distributions
+		#		of the shard, same format as the town files
+		#	'n_agents' - number of household residents of the shard
+		#	'house_IDs' - IDs of households in the shard
+		# params - dict with Agents arguments common to all shards - 'max_age',
+		#	'fr_vacancy', 'fr_fam', 'fr_couple', 'fr_sp', 'fr_60', 'fname_census',
+		#	and optionally 'composition' ('sequential' or 'batch')
+		# seed - root seed of the shards, None for a random one
+		#
+
+		self.shards = shards
+		self.params = params
+		# Root of all shard seeds
+		self.seed_sequence = np.random.SeedSequence(seed)
+
+	def shard_seeds(self):
+		''' Independent, reproducible seed sequences, one per shard '''
+		return self.seed_sequence.spawn(len(self.shards))
+
+	def generate(self, agents, households, n_proc=None):
+		''' Generate household residents of all shards on n_proc
+				processes and add them to agents '''
+
+		#
+		# agents - Agents object of the town with retirement home residents
+		#	and hospital patients already distributed
+		# households - list of all households, IDs start from 1
+		# n_proc - number of processes, all cores if None
+		#
+
+		self.check_shards(agents, households)
+
+		# Retirement home of each resident, for agents left in the pools
+		rh_agents = [{'houseID': agent['houseID']} for agent in agents.rh_agents]
+		shared = {'households': households, 'rh_agents': rh_agents, 'params': self.params}
+		tasks = list(zip(self.shards, self.shard_seeds()))
+
+		if n_proc is None:
+			n_proc = os.cpu_count()
+		n_proc = max(1, min(n_proc, len(tasks)))
+
+		if n_proc == 1:
+			_init_worker(shared)
+			results = [_generate_shard(task) for task in tasks]
+		else:
+			with mp.Pool(n_proc, initializer=_init_worker, initargs=(shared,)) as pool:
+				results = pool.map(_generate_shard, tasks, chunksize=1)
+
+		# Merge in shard order, IDs continue from the town agents
+		for shard_agents in results:
+			offset = agents.ID - 1
+			for agent in shard_agents:
+				agent['ID'] += offset
+				if agent['RetirementHome']:
+					agents.rh_agents.append(agent)
+			agents.agents += shard_agents
+			agents.ID += len(shard_agents)
+
+		return agents
+
+	def check_shards(self, agents, households):
+		''' Raise ValueError if shards share households, have households
+				that do not exist, or their numbers of agents do not add 
+				up to the town population '''
+
+		in_shard = np.zeros(len(households)+1, dtype=np.int64)
+		for ish, shard in enumerate(self.shards):
+			house_IDs = np.asarray(shard['house_IDs'], dtype=np.int64)
+			if np.any((house_IDs < 1) | (house_IDs > len(households))):
+				raise ValueError('Shard ' + str(ish) + ' has households outside of 1-' + str(len(households)))
+			np.add.at(in_shard, house_IDs, 1)
+			if np.any(in_shard[house_IDs] > 1):
+				raise ValueError('Shard ' + str(ish) + ' shares households with another shard or repeats them')
+
+		# Retirement home residents and hospital patients are already generated
+		n_shards = sum([shard['n_agents'] for shard in self.shards])
+		if n_shards + len(agents.agents) != agents.ntot:
+			raise ValueError('Shards have ' + str(n_shards) + ' agents and the town ' + str(len(agents.agents)) 
+								+ ' retirement home residents and patients, expected ' + str(agents.ntot) + ' in total')
+
+def _init_worker(shared):
+	''' Store households and settings of this process '''
+	_shared.update(shared)
+
+def _generate_shard(task):
+	''' Household residents of one shard, IDs start from 1 '''
+
+	shard, seed_seq = task
+	params = _shared['params']
+
+	agents = aab.Agents(shard['age'], shard['head_age'], shard['household_size'], shard['n_agents'],
+							params['max_age'], len(shard['house_IDs']), params['fr_vacancy'], params['fr_fam'],
+							params['fr_couple'], params['fr_sp'], params['fr_60'], 0, params['fname_census'],
+							rng=ar.RandomContext(seed_seq))
+	agents.rh_agents = _shared['rh_agents']
+	agents.distribute_households(_shared['households'], params['fr_vacancy'], params.get('composition', 'sequential'),
+									shard['house_IDs'])
+
+	return agents.agents
@@ -0,0 +1,188 @@
+# ------------------------------------------------------------------
+#
+#	Module for spatial queries on GIS locations
+#
+# ------------------------------------------------------------------
+
+#
+# Locations are binned into a uniform latitude/longitude grid
+# with cells at least cell_size km wide. Query points are processed
+# in batches of points that fall in the same cell, searching
+# blocks of cells of growing size around it. Distance bounds assume
+# regional extent (tens of km) and are taken with a small margin.
+#
+
+import math
+import numpy as np
+import abm_utils as aut
+
+class GridIndex(object):
+	''' Grid over a set of locations for k-nearest
+			and within-radius queries '''
+
+	# Length of one degree of latitude in km
+	km_per_deg = 6371*math.pi/180
+	# Fraction of the block half-width that is
+	# certain to contain all closer locations
+	margin = 0.99
+
+	def __init__(self, lat, lon, cell_size=1.0):
+		''' Build the grid for locations with coordinates lat, lon '''
+
+		#
+		# lat, lon - arrays (or lists) of coordinates in degrees
+		# cell_size - minimum height and width of a grid cell in km
+		#
+
+		self.lat = np.asarray(lat, dtype=np.float64)
+		self.lon = np.asarray(lon, dtype=np.float64)
+		self.n = len(self.lat)
+		if self.n == 0:
+			raise ValueError('No locations to index')
+		self.cell_size = cell_size
+
+		# Cell width in degrees of longitude for the highest latitude
+		# (plus one degree for nearby query points)
+		max_lat = min(float(np.abs(self.lat).max()) + 1.0, 89.0)
+		self.dlat = cell_size/self.km_per_deg
+		self.dlon = cell_size/(self.km_per_deg*math.cos(math.radians(max_lat)))
+		self.lat0 = float(self.lat.min())
+		self.lon0 = float(self.lon.min())
+		self.n_lat = int((self.lat.max() - self.lat0)/self.dlat) + 1
+		self.n_lon = int((self.lon.max() - self.lon0)/self.dlon) + 1
+
+		# Locations ordered by cell (row-major), locations of cell c
+		# are order[cell_start[c]:cell_start[c+1]]
+		rows, cols = self.cells(self.lat, self.lon)
+		keys = rows*self.n_lon + cols
+		self.order = np.argsort(keys, kind='stable')
+		self.cell_start = np.searchsorted(keys[self.order], np.arange(self.n_lat*self.n_lon+1))
+
+	def cells(self, lat, lon):
+		''' Grid row and column of each coordinate,
+				not limited to the grid '''
+
+		rows = np.floor((np.asarray(lat) - self.lat0)/self.dlat).astype(np.int64)
+		cols = np.floor((np.asarray(lon) - self.lon0)/self.dlon).astype(np.int64)
+		return rows, cols
+
+	def block(self, row, col, r):
+		''' Locations in cells at most r rows and columns away
+				from cell row, col; also returns True if the block
+				covers the whole grid '''
+
+		row_lo, row_hi = max(row-r, 0), min(row+r, self.n_lat-1)
+		col_lo, col_hi = max(col-r, 0), min(col+r, self.n_lon-1)
+		whole = (row-r <= 0) and (row+r >= self.n_lat-1) and (col-r <= 0) and (col+r >= self.n_lon-1)
+		if (row_lo > row_hi) or (col_lo > col_hi):
+			return np.empty(0, dtype=np.int64), whole
+
+		# Each row of the block is a contiguous range of locations
+		first = np.arange(row_lo, row_hi+1)*self.n_lon
+		starts = self.cell_start[first + col_lo].tolist()
+		ends = self.cell_start[first + col_hi + 1].tolist()
+		return np.concatenate([self.order[s:e] for s, e in zip(starts, ends)]), whole
+
+	def groups(self, lat, lon):
+		''' Split query points by cell, yields cell
+				row, column, and indices of the points '''
+
+		rows, cols = self.cells(lat, lon)
+		keys = np.stack((rows, cols), axis=1)
+		uniq, inverse = np.unique(keys, axis=0, return_inverse=True)
+		inverse = inverse.ravel()
+		perm = np.argsort(inverse, kind='stable')
+		bounds = np.cumsum(np.bincount(inverse, minlength=len(uniq)))[:-1]
+		for (row, col), points in zip(uniq.tolist(), np.split(perm, bounds)):
+			yield row, col, points
+
+	def rings_outside(self, row, col):
+		''' Number of cells between cell row, col and the grid '''
+		return max(0, -row, row-(self.n_lat-1), -col, col-(self.n_lon-1))
+
+	def query_knn(self, lat, lon, k):
+		''' k nearest locations to each query point; returns location
+				indices and distances in km, both arrays of shape
+				(number of points, k), closest first '''
+
+		#
+		# lat, lon - coordinates of the query points
+		# k - number of locations per point, at most
+		#		the number of indexed locations
+		#
+
+		if k > self.n:
+			raise ValueError('Requested ' + str(k) + ' nearest out of ' + str(self.n) + ' locations')
+
+		lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+		lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+		indices = np.zeros((len(lat), k), dtype=np.int64)
+		distances = np.zeros((len(lat), k), dtype=np.float64)
+		if k == 0:
+			return indices, distances
+
+		# Block half-width that contains k locations on average
+		r_density = int(math.ceil(0.5*math.sqrt(k*self.n_lat*self.n_lon/self.n)))
+
+		for row, col, points in self.groups(lat, lon):
+			r = max(1, r_density, self.rings_outside(row, col))
+			while len(points) > 0:
+				idx, whole = self.block(row, col, r)
+				if len(idx) >= k:
+					dist = aut.compute_distances(lat[points,None], lon[points,None], self.lat[idx], self.lon[idx])
+					part = np.argpartition(dist, k-1, axis=1)[:,:k]
+					part_dist = np.take_along_axis(dist, part, axis=1)
+					part_idx = idx[part]
+					# Closest first, ties by location index
+					srt = np.lexsort((part_idx, part_dist), axis=1)
+					part_idx = np.take_along_axis(part_idx, srt, axis=1)
+					part_dist = np.take_along_axis(part_dist, srt, axis=1)
+
+					# Result is final if no location outside
+					# the block can be closer than the k-th
+					if whole:
+						done = np.ones(len(points), dtype=bool)
+					else:
+						done = part_dist[:,-1] <= r*self.cell_size*self.margin
+					indices[points[done]] = part_idx[done]
+					distances[points[done]] = part_dist[done]
+					points = points[~done]
+				r += 1
+
+		return indices, distances
+
+	def query_radius(self, lat, lon, radius):
+		''' All locations within radius km of each query point; returns
+				offsets (number of points + 1), location indices, and distances
+				in km - locations of point i are indices[offsets[i]:offsets[i+1]],
+				closest first '''
+
+		lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+		lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+		r = max(1, int(math.ceil(radius/(self.cell_size*self.margin))))
+
+		found_points, found_idx, found_dist = [], [], []
+		for row, col, points in self.groups(lat, lon):
+			idx, whole = self.block(row, col, r)
+			if len(idx) == 0:
+				continue
+			dist = aut.compute_distances(lat[points,None], lon[points,None], self.lat[idx], self.lon[idx])
+			pt, loc = np.nonzero(dist <= radius)
+			found_points.append(points[pt])
+			found_idx.append(idx[loc])
+			found_dist.append(dist[pt, loc])
+
+		if found_points:
+			found_points = np.concatenate(found_points)
+			found_idx = np.concatenate(found_idx)
+			found_dist = np.concatenate(found_dist)
+		else:
+			found_points = np.empty(0, dtype=np.int64)
+			found_idx = np.empty(0, dtype=np.int64)
+			found_dist = np.empty(0, dtype=np.float64)
+
+		# By query point, closest first, ties by location index
+		srt = np.lexsort((found_idx, found_dist, found_points))
+		offsets = np.zeros(len(lat)+1, dtype=np.int64)
+		offsets[1:] = np.cumsum(np.bincount(found_points, minlength=len(lat)))
+		return offsets, found_idx[srt], found_dist[srt]
@@ -5,18 +5,20 @@
 # ------------------------------------------------------------------
 
 import math
-from random import choices, choice
+import numpy as np
+import abm_random as ar
 
 class Transit(object):
 	''' Class for generation of transit times and travel modes '''
 
-	def __init__(self, ftimes, fmodes, fcpool, pt_routes, mode_speed, t_wfh, t_walk, fnp = None):
+	def __init__(self, ftimes, fmodes, fcpool, pt_routes, mode_speed, t_wfh, t_walk, fnp = None, rng = None):
 		''' Load and store travel time and mode information '''
 
 			# ftimes - file with travel times data
 		# fmodes - file with travel modes data 
 		# fcpool - file with carpool statistics 
 				# pt_routes - file with public transit routes 
+		# rng - RandomContext object, None for a random seed
 
 		# Files have a structure time/mode | fraction/percent population 
 				# pt_routes has a structure: ID | Name | zip1, zip2, ... (ID is 
@@ -29,6 +31,11 @@ class Transit(object):
 		self.carpool_stats = {}
 		self.transit_routes = {}
 
+		# Random number streams
+		if rng is None:
+			rng = ar.RandomContext()
+		self.rng = rng
+
 		# Carpool and public transit (GSP) object collections
 		self.carpools = []
 		self.GSP = []
@@ -128,7 +135,7 @@ class Transit(object):
 				times.append(float(temp[0])+(float(temp[1])-float(temp[0]))*0.5)
 			probs.append(value)
 
-		sampled = choices(times, probs, k=int(nsamples))
+		sampled = self.sample(times, probs, nsamples, 'travel_times')
 
 		return sampled, times
 
@@ -141,7 +148,7 @@ class Transit(object):
 			modes.append(key)		
 			probs.append(value)
 
-		sampled = choices(modes, probs, k=int(nsamples))
+		sampled = self.sample(modes, probs, nsamples, 'travel_modes')
 
 		return sampled
 
@@ -155,10 +162,19 @@ class Transit(object):
 			numbers.append(key)		
 			probs.append(value)
 
-		sampled = choices(numbers, probs, k=int(nsamples))
+		sampled = self.sample(numbers, probs, nsamples, 'carpool_numbers')
 
 		return sampled
 
+	def sample(self, values, probs, nsamples, stream):
+		''' Return nsamples of values drawn with weights probs
+				from random number stream with name stream '''
+
+		probs = np.array(probs)
+		ind = self.rng.stream(stream).choice(len(values), size=int(nsamples), p=probs/probs.sum())
+
+		return [values[i] for i in ind]
+
 	def match_time(self, ti):
 		''' Finds the time interval where ti occurs, returns it as a string '''
 
@@ -204,7 +220,7 @@ class Transit(object):
 				NR_choices.append(key)
 		
 		# Select a possible NR route
-		key = choice(NR_choices)
+		key = NR_choices[self.rng.stream('public_transit').integers(0, len(NR_choices))]
 		# Check if already a registered route
 		if self.transit_routes[key][1] > 0:
 			return self.transit_routes[key][1]
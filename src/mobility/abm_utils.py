@@ -5,6 +5,7 @@
 # ------------------------------------------------------------------
 
 import math
+import numpy as np
 
 def compute_distance(loc1, loc2):
 	''' Calculates the distance between loc1 and loc2 in km.
@@ -38,3 +39,66 @@ def compute_distance(loc1, loc2):
 
 	return d1km    
 
+def compute_distances(lat1, lon1, lat2, lon2):
+	''' Vectorized version of compute_distance.
+
+			lat1, lon1, lat2, lon2 - coordinates in degrees, numbers
+				or numpy arrays that broadcast together, e.g. lat1[:,None]
+				and lat2 for all pairs of two sets of locations
+
+			Returns distances in km according to Haversine formula
+
+	'''
+
+	radius = 6371
+
+	lat1 = np.asarray(lat1, dtype=np.float64)*math.pi/180
+	lat2 = np.asarray(lat2, dtype=np.float64)*math.pi/180
+	lon1 = np.asarray(lon1, dtype=np.float64)*math.pi/180
+	lon2 = np.asarray(lon2, dtype=np.float64)*math.pi/180
+
+	a = np.sin((lat2-lat1)/2)**2 + np.cos(lat1)*np.cos(lat2)*np.sin((lon2-lon1)/2)**2
+	return radius*2*np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
+def project_coordinates(lat, lon, lat0, lon0):
+	''' Equirectangular projection of coordinates to km.
+
+			lat, lon - coordinates in degrees, numbers or numpy arrays
+			lat0, lon0 - origin of the projection, usually the
+				middle of the area
+
+			Returns x (east) and y (north) in km. Euclidean distances
+			of projected points differ from compute_distance by at
+			most planar_error_bound times the distance.
+
+	'''
+
+	radius = 6371
+
+	x = radius*math.cos(lat0*math.pi/180)*(np.asarray(lon, dtype=np.float64) - lon0)*math.pi/180
+	y = radius*(np.asarray(lat, dtype=np.float64) - lat0)*math.pi/180
+	return x, y
+
+def planar_error_bound(lat_min, lat_max, lat0, max_dist):
+	''' Maximum relative error of distances between points projected
+			with project_coordinates.
+
+			lat_min, lat_max - latitude range of the points
+			lat0 - latitude of the origin of the projection
+			max_dist - maximum distance between the points in km
+
+			East-west distances are scaled as at lat0 instead of the
+			latitude of the points, which is off by the largest 
+			|cos(lat0)/cos(lat) - 1| in the range; (max_dist/radius)^2
+			covers the curvature of the Earth. For New Rochelle and
+			the surrounding zipcodes (40.82 to 41.38 N, up to ~105 km apart,
+			origin in the middle) the bound is 0.46% - at most 46 m over 
+			10 km. 
+
+	'''
+
+	radius = 6371
+
+	cos0 = math.cos(lat0*math.pi/180)
+	scale = max(abs(cos0/math.cos(lat_min*math.pi/180) - 1.0), abs(cos0/math.cos(lat_max*math.pi/180) - 1.0))
+	return scale + (max_dist/radius)**2
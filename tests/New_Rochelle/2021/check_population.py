@@ -11,8 +11,7 @@ sys.path.insert(0, py_path)
 py_path = '../../../input_verification/'
 sys.path.insert(0, py_path)
 
-import check_agents as ca
-import check_households as ch
+import check_columnar as cv
 import abm_residential as res
 import abm_public as public
 import abm_agents as agents
@@ -163,26 +162,29 @@ agents.distribute_transit_and_workplaces(households.households, workplaces.workp
 # Check the generated population
 # 
 
+# Columnar copy of the agent data
+columns = cv.AgentColumns.from_agents(agents.agents)
+
 # Age distribution
 age_groups = [(0,4),(5,9),(10,14),(15,19),(20,24),(25,34),(35,44),(45,54),(55,59),(60,64),(65,74),(75,84),(85,max_age)]
-ca.print_age_distribution(ad_file, age_groups, agents.agents)
+cv.print_age_distribution(ad_file, age_groups, columns)
 
 # Retirement home sizes - employees and residents
-ca.print_other_sizes(rh_file, agents.agents, 'worksRH', 'RetirementHome', 'houseID')
+cv.print_other_sizes(rh_file, columns, 'worksRH', 'RetirementHome', 'houseID')
 # Schools - employees and schools
-ca.print_other_sizes(sch_file, agents.agents, 'worksSchool', 'student', 'schoolID')
+cv.print_other_sizes(sch_file, columns, 'worksSchool', 'student', 'schoolID')
 
 # Household sizes
-ca.print_household_sizes(hs_file, agents.agents)
-ca.print_household_sizes_w_coords(hs_coords_sizes, agents.agents)
-ca.print_building_sizes_w_coords(building_coords_sizes, agents.agents)
+cv.print_household_sizes(hs_file, columns)
+cv.print_household_sizes_w_coords(hs_coords_sizes, columns)
+cv.print_building_sizes_w_coords(building_coords_sizes, columns)
 
 # Workplace sizes
-ca.print_workplace_sizes(wk_file, agents.agents)
+cv.print_workplace_sizes(wk_file, columns)
 
 # Household characteristics
-ch.print_houses_and_age(hs_age_file, agents.agents)
-ch.print_houses_and_work_status(hs_work_file, fm_work_file, agents.agents)
-ch.print_houses_and_work_ID(hs_work_ID_file, agents.agents)
-ch.print_houses_and_student_status(hs_school_file, agents.agents)
+cv.print_houses_and_age(hs_age_file, columns)
+cv.print_houses_and_work_status(hs_work_file, fm_work_file, columns)
+cv.print_houses_and_work_ID(hs_work_ID_file, columns)
+cv.print_houses_and_student_status(hs_school_file, columns)
 
@@ -83,37 +83,117 @@ def check_work_dist_agent_props(agents, workplaces, max_working_age, travel_mode
 
 	return True
 
-def check_work_dist_validity(agents, workplaces, fname_out, fname_NR, n_hs):
-	''' Verifies - computes various metrics related to correctness of 
-			the workplace distribution. Saves workID | #employees for further
-			inspection in fname. '''
-	
+def aggregate_work_metrics(agents, workplaces, transit, n_hs):
+	''' Single pass over all the agents that collects employment, 
+			travel mode, travel time, carpool, and public transit
+			metrics; the result is used by all the checks below '''
+
+	metrics = {}
 	# Number of employees in each workplace
-	emp_count = [0]*len(workplaces)
+	metrics['emp_count'] = [0]*len(workplaces)
 	# Stores how many employed in a household
-	household_emp = [0]*n_hs
-	# Household IDs of employees in each workplace 
-	work_house_var = {}
+	metrics['household_emp'] = [0]*n_hs
+	# (workplace ID, household ID) : number of employees 
+	metrics['work_house'] = collections.Counter()
+	metrics['n_wfh'] = 0
+	# Mode/travel time : number of working agents
+	metrics['mode_count'] = collections.Counter()
+	metrics['time_count'] = collections.Counter()
+	# Carpool/public transit ID : number of agents
+	metrics['carpools'] = collections.Counter()
+	metrics['public_transit'] = collections.Counter()
+	# First error found in carpools and public transit, if any
+	metrics['carpool_error'] = None
+	metrics['public_error'] = None
+	# Out of town carpools with a different destination than the agent's
+	metrics['carpool_dest_mismatch'] = 0
 
-	n_wfh = 0
 	for agent in agents:
+		mode = agent['work travel mode'] 
+		if (mode == 'carpool') and (metrics['carpool_error'] is None):
+			metrics['carpool_error'] = check_agent_carpool(agent, transit.carpools, workplaces, metrics)
+		if (mode == 'public') and (metrics['public_error'] is None):
+			metrics['public_error'] = check_agent_public_transit(agent, transit, workplaces, metrics)
+
 		if (agent['works'] == False) and (agent['worksHospital'] == False):
 			continue
 
+		metrics['mode_count'][mode] += 1
+		metrics['time_count'][str(agent['work travel time'])] += 1
+
 		house_ID = agent['houseID']
-		household_emp[house_ID-1] += 1
+		metrics['household_emp'][house_ID-1] += 1
 		if (agent['works from home'] == True):
-			n_wfh += 1
+			metrics['n_wfh'] += 1
 			continue
 
 		# Count employees in each workplace
-		emp_count[agent['workID']-1] +=1
-		# Store household IDs of each employee
-		wkey = str(agent['workID'])
-		if wkey in work_house_var:
-			work_house_var[wkey].append(house_ID)
-		else:
-			work_house_var[wkey] = [house_ID]
+		metrics['emp_count'][agent['workID']-1] += 1
+		metrics['work_house'][(agent['workID'], house_ID)] += 1
+
+	return metrics
+
+def check_agent_carpool(agent, carpools, workplaces, metrics):
+	''' Checks carpool of one agent, returns error message or None '''
+
+	# This may fail if too little agents used for 
+	# testing and the only carpooling agent for a given 
+	# destination is assigned the initial ID 0
+	cID = agent['carpoolID']
+	if cID == 0:
+		return 'Carpool ID is 0'
+
+	metrics['carpools'][cID] += 1
+
+	if carpools[cID-1].ID != cID:
+		return 'Wrong carpool ID'
+
+	if workplaces[agent['workID']-1]['type'] == 'outside':
+		if carpools[cID-1].work_type != 'outside':
+			return 'Wrong carpool destination type for out of town locations'
+		if carpools[cID-1].work_destination != workplaces[agent['workID']-1]['zip']:
+			# This can fail if not enough agents and some carpools have only one agent 
+			# (which is then reassigned to a different carpool, with a potentially  
+			#	different carpool destination)
+			metrics['carpool_dest_mismatch'] += 1
+	else:
+		if not math.isclose(carpools[cID-1].travel_time, agent['work travel time']):
+			return 'Wrong carpool travel time for NR locations'
+
+	return None
+
+def check_agent_public_transit(agent, transit, workplaces, metrics):
+	''' Checks public transit of one agent, returns error message or None '''
+
+	public_transit = transit.GSP
+	pID = agent['publicID']
+	if pID == 0:
+		return 'Public ID is 0'
+
+	metrics['public_transit'][pID] += 1
+
+	if public_transit[pID-1].ID != pID:
+		return 'Wrong public transit ID'
+
+	route_name = public_transit[pID-1].name
+	if workplaces[agent['workID']-1]['type'] == 'outside':
+		if public_transit[pID-1].work_type != 'outside':
+			return 'Wrong public transit destination type for out of town locations'
+		cur_zip = str(workplaces[agent['workID']-1]['zip'])
+		if not (cur_zip in transit.transit_routes[route_name][0]):
+			return 'Wrong public transit destination zip for out of town locations'
+	else:
+		if not ('NR' in transit.transit_routes[route_name][0]):
+			return 'Wrong public transit destination zip for NR locations: ' + str(transit.transit_routes[route_name][0])
+
+	return None
+
+def check_work_dist_validity(metrics, workplaces, fname_out, fname_NR, n_hs):
+	''' Verifies - computes various metrics related to correctness of 
+			the workplace distribution. Saves workID | #employees for further
+			inspection in fname. '''
+	
+	emp_count = metrics['emp_count']
 
 	# Save employee count to file and check if any are zeros
 	# Applies only to NR
@@ -131,7 +211,7 @@ def check_work_dist_validity(agents, workplaces, fname_out, fname_NR, n_hs):
 				fout_NR.write((' ').join([str(ind+1), str(val), str(workplaces[ind]['type'])]))
 				fout_NR.write('\n')
 
-	print('Agents working from home: ' + str(n_wfh))
+	print('Agents working from home: ' + str(metrics['n_wfh']))
 	print('Agents working outside New Rochelle: ' + str(n_outside))
 
 	if flag_zero:
@@ -141,65 +221,31 @@ def check_work_dist_validity(agents, workplaces, fname_out, fname_NR, n_hs):
 	# Print household employment statistics
 	# Should approximately match census
 	# Counts households with 0, 1, and 2+ employed members
-	hs_emp_count = [0, 0, 0]
-	for hse in household_emp:
-		if int(hse) == 0:
-			hs_emp_count[0] += 1
-		elif int(hse) == 1:
-			hs_emp_count[1] += 1
-		else:
-			hs_emp_count[2] += 1
+	hs_emp = collections.Counter([min(int(x), 2) for x in metrics['household_emp']])
 
 	print('*'*5+' Household employment ' + '*'*5)
-	print('No employed agents: ' + str(hs_emp_count[0]/n_hs*100) + '%')
-	print('One employed agent: ' + str(hs_emp_count[1]/n_hs*100) + '%')
-	print('Two or more employed agents: ' + str(hs_emp_count[2]/n_hs*100) + '%')
+	print('No employed agents: ' + str(hs_emp[0]/n_hs*100) + '%')
+	print('One employed agent: ' + str(hs_emp[1]/n_hs*100) + '%')
+	print('Two or more employed agents: ' + str(hs_emp[2]/n_hs*100) + '%')
 
 	# Print percent of households where people share workplaces
 	# This will also include the outside of NR
-	n_same = 0
-	for key, value in work_house_var.items():
-		if len(value) != len(set(value)):
-			n_same += 1
-	print('Households with at least two people working in the same place: ' + str(n_same/n_hs*100))
+	shared = set([wID for (wID, hID), num in metrics['work_house'].items() if num > 1])
+	print('Households with at least two people working in the same place: ' + str(len(shared)/n_hs*100))
 
 	return True
 
-def check_mode_dist(agents, tot_working):
-	''' Count and print percentages of agents taking given transportation 
+def check_mode_dist(metrics, tot_working):
+	''' Print percentages of agents taking given transportation 
 			mode to work '''
 
-	mode_count = {}
-	
-	for agent in agents:
-		if (agent['works'] == False) and (agent['worksHospital'] == False):
-			continue
+	for key, value in metrics['mode_count'].items():
+		print(str(key) + ': ' + str(value/tot_working*100) + '%')
 
-		mode = agent['work travel mode'] 
-		if mode in mode_count:
-			mode_count[mode] += 1
-		else:
-			mode_count[mode] = 1
+def check_time_dist(metrics, tot_working):
+	''' Print percentages of agents by travel time to work '''
 
-	for key, value in mode_count.items():
-		print(key + ': ' + str(value/tot_working*100) + '%')
-
-def check_time_dist(agents, tot_working):
-	''' Count and print percentages of agents by travel time to work '''
-
-	time_count = {}
-	
-	for agent in agents:
-		if (agent['works'] == False) and (agent['worksHospital'] == False):
-			continue
-
-		time = str(agent['work travel time']) 
-		if time in time_count:
-			time_count[time] += 1
-		else:
-			time_count[time] = 1
-
-	for key, value in time_count.items():
+	for key, value in metrics['time_count'].items():
 		print(key + ': ' + str(value/tot_working*100) + '%')
 
 def print_info(data, ind):
@@ -209,123 +255,47 @@ def print_info(data, ind):
 	for key, value in data[ind].items():
 		print(key, value)
 
-def check_carpools(agents, transit, workplaces):
+def check_carpools(metrics):
 	''' Verification of carpool distribution '''
 
-	carpools = transit.carpools
-	all_carpools = {}
-	for agent in agents:
-		if not (agent['work travel mode'] == 'carpool'):
-			continue
-
-		# This may fail if too little agents used for 
-		# testing and the only carpooling agent for a given 
-		# destination is assigned the initial ID 0
-		cID = str(agent['carpoolID'])
-		if int(cID) == 0:
-			print('Carpool ID is 0')
-			return False
-
-		if cID in all_carpools:
-			all_carpools[cID] += 1
-		else:
-			all_carpools[cID] = 1
-
-		if carpools[int(cID)-1].ID != int(cID):
-			print('Wrong carpool ID')
-			return False
+	if metrics['carpool_error'] is not None:
+		print(metrics['carpool_error'])
+		return False
 
-		if workplaces[agent['workID']-1]['type'] == 'outside':
-			if carpools[int(cID)-1].work_type != 'outside':
-				print('Wrong carpool destination type for out of town locations')
-				return False
-			if carpools[int(cID)-1].work_destination != workplaces[agent['workID']-1]['zip']:
-				# This can fail if not enough agents and some carpools have only one agent 
-				# (which is then reassigned to a different carpool, with a potentially  
-				#	different carpool destination)
-				print('Wrong carpool destination label for out of town locations')
-				#return False
-		else:
-			if not math.isclose(carpools[int(cID)-1].travel_time, agent['work travel time']):
-				print('Wrong carpool travel time for NR locations')
-				return False
+	if metrics['carpool_dest_mismatch'] > 0:
+		print('Wrong carpool destination label for out of town locations: ' + str(metrics['carpool_dest_mismatch']) + ' agents')
 
 	# All carpools
-	cpool_pnumbers = {} 
-	max_cpool = -100
-	for key, value in all_carpools.items():
-		if value < 2:
-			print('Carpool with less than two people')
-			return False
-		num_people = str(value)
-		if num_people in cpool_pnumbers:
-			cpool_pnumbers[num_people] += 1
-		else:
-			cpool_pnumbers[num_people] = 1
+	all_carpools = metrics['carpools']
+	if any([value < 2 for value in all_carpools.values()]):
+		print('Carpool with less than two people')
+		return False
+	cpool_pnumbers = collections.Counter(all_carpools.values())
 
 	print('Number of passengers in carpools, %')
 	for key, value in cpool_pnumbers.items():
-		print(key, str(value/len(all_carpools)*100))
+		print(str(key), str(value/len(all_carpools)*100))
 
 	return True
 
-def check_public_transit(agents, transit, workplaces):
+def check_public_transit(metrics, transit):
 	''' Verification of public transit distribution '''
 
-	public_transit = transit.GSP
-	all_public_transit = {}
-	for agent in agents:
-		if not (agent['work travel mode'] == 'public'):
-			continue
-
-		pID = str(agent['publicID'])
-		if int(pID) == 0:
-			print('Public ID is 0')
-			return False
-
-		if pID in all_public_transit:
-			all_public_transit[pID] += 1
-		else:
-			all_public_transit[pID] = 1
-
-		if public_transit[int(pID)-1].ID != int(pID):
-			print('Wrong public transit ID')
-			return False
-
-		if workplaces[agent['workID']-1]['type'] == 'outside':
-			if public_transit[int(pID)-1].work_type != 'outside':
-				print('Wrong public transit destination type for out of town locations')
-				return False
-			cur_zip = str(workplaces[agent['workID']-1]['zip'])
-			route_name = public_transit[int(pID)-1].name
-			if not (cur_zip in transit.transit_routes[route_name][0]):
-				print('Wrong public transit destination zip for out of town locations')
-				return False
-		else:
-			cur_zip = 'NR' 
-			route_name = public_transit[int(pID)-1].name
-			if not (cur_zip in transit.transit_routes[route_name][0]):
-				print('Wrong public transit destination zip for NR locations')
-				print(transit.transit_routes[route_name][0])
-				return False
+	if metrics['public_error'] is not None:
+		print(metrics['public_error'])
+		return False
 
 	# All public transit 
-	pt_pnumbers = {} 
-	max_pt = -100
-	for key, value in all_public_transit.items():
-		num_people = str(value)
-		if num_people in pt_pnumbers:
-			pt_pnumbers[num_people] += 1
-		else:
-			pt_pnumbers[num_people] = 1
+	all_public_transit = metrics['public_transit']
+	pt_pnumbers = collections.Counter(all_public_transit.values())
 
 	print('Number of passengers in public transit, %')
 	for key, value in pt_pnumbers.items():
-		print(key, str(value/len(all_public_transit)*100))
+		print(str(key), str(value/len(all_public_transit)*100))
 
 	print('Number of passengers by route')
 	for pID, num in all_public_transit.items():
-		print(public_transit[int(pID)-1].name, ': ', str(num))
+		print(transit.GSP[pID-1].name, ': ', str(num))
 
 	return True
 
@@ -471,9 +441,12 @@ ut.test_pass(check_work_dist_agent_props(agents.agents, workplaces.workplaces, m
 fout_outside = 'work_dist_out_count.txt'
 fout_NR = 'work_dist_NR_count.txt'
 
-ut.test_pass(check_work_dist_validity(agents.agents, workplaces.workplaces, fout_outside, fout_NR, len(households.households)), 'Workplace distribution - validity')
+# One pass over agents for all the remaining checks
+metrics = aggregate_work_metrics(agents.agents, workplaces.workplaces, transit, len(households.households))
+
+ut.test_pass(check_work_dist_validity(metrics, workplaces.workplaces, fout_outside, fout_NR, len(households.households)), 'Workplace distribution - validity')
 #print_info(workplaces.workplaces, 1056)
-check_mode_dist(agents.agents, n_employed)
-check_time_dist(agents.agents, n_employed)
-ut.test_pass(check_carpools(agents.agents, transit, workplaces.workplaces), 'Grouping agents into carpools')
-ut.test_pass(check_public_transit(agents.agents, transit, workplaces.workplaces), 'Grouping agents into public transit')
+check_mode_dist(metrics, n_employed)
+check_time_dist(metrics, n_employed)
+ut.test_pass(check_carpools(metrics), 'Grouping agents into carpools')
+ut.test_pass(check_public_transit(metrics, transit), 'Grouping agents into public transit')
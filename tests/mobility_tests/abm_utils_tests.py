@@ -11,10 +11,12 @@ sys.path.insert(0, py_path)
 py_path = '../../src/mobility/'
 sys.path.insert(0, py_path)
 
+import numpy as np
 import utils as ut
 from colors import *
 
 import abm_utils as aut
+import abm_poi_tables as apt
 
 #
 # Supporting functions
@@ -31,6 +33,29 @@ def distance_test(loc1, loc2, exp_val):
 	else:
 		return True
 
+def planar_test(lat, lon, n_pairs):
+	''' Tests projected distances against Haversine for random pairs 
+			of locations, relative error within the bound '''
+
+	rng = np.random.default_rng(45)
+	lat0 = (lat.min() + lat.max())/2
+	lon0 = (lon.min() + lon.max())/2
+	x, y = aut.project_coordinates(lat, lon, lat0, lon0)
+
+	ind_1 = rng.integers(0, len(lat), n_pairs)
+	ind_2 = rng.integers(0, len(lat), n_pairs)
+	exp_dist = aut.compute_distances(lat[ind_1], lon[ind_1], lat[ind_2], lon[ind_2])
+	dist = np.sqrt((x[ind_1] - x[ind_2])**2 + (y[ind_1] - y[ind_2])**2)
+
+	bound = aut.planar_error_bound(lat.min(), lat.max(), lat0, exp_dist.max())
+	if bound > 0.005:
+		print('Error bound larger than documented ' + str(bound))
+		return False
+	if np.any(np.abs(dist - exp_dist) > bound*exp_dist + 1e-9):
+		print('Projected distances outside the error bound')
+		return False
+	return True
+
 #
 # Tests 
 #
@@ -61,3 +86,16 @@ exp_val = 10734.8931427602
 
 ut.test_pass(distance_test(place_1, place_2, exp_val), 'Long distance computation')
 
+# --- Planar distances
+
+# All New Rochelle and outside workplaces, with the
+# corners of the area that they cover
+dpath = '../../town_data/NewRochelle/database/'
+work_in = apt.read_table(dpath + '2021_core_poi_NewRochelleIn_WorkTrimmed.csv', 'work_in')
+work_out = apt.read_table(dpath + '2021_core_poi_NewRochelleOut_WorkTrimmed.csv', 'work_out')
+lat = np.concatenate((work_in['lat'], work_out['lat']))
+lon = np.concatenate((work_in['lon'], work_out['lon']))
+lat = np.concatenate((lat, [lat.min(), lat.min(), lat.max(), lat.max()]))
+lon = np.concatenate((lon, [lon.min(), lon.max(), lon.min(), lon.max()]))
+
+ut.test_pass(planar_test(lat, lon, 200000), 'Planar distance approximation')
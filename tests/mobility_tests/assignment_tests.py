@@ -0,0 +1,219 @@
+# ------------------------------------------------------------------
+#
+#   Tests for batch workplace assignment
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import warnings
+import numpy as np
+import utils as ut
+from colors import *
+
+import abm_utils as aut
+import abm_assignment as asg
+
+#
+# Supporting functions
+#
+
+def random_workplaces(n_in, n_out, n_max, rng):
+    ''' n_in in-town workplaces with at most n_max 
+            employees and n_out outside workplaces '''
+
+    workplaces = []
+    for i in range(n_in + n_out):
+        work = {'ID': i+1, 'specialID': 0, 'lat': rng.uniform(40.88, 40.98), 'lon': rng.uniform(-73.83, -73.75)}
+        if i < n_in:
+            work.update({'type': 'none', 'occupation': 'A', 'N_emp': 0, 'N_max': int(rng.integers(1, n_max+1))})
+        else:
+            # Farther away
+            work['lat'] += 0.2
+            work.update({'type': 'outside', 'occupation': 'outside'})
+        workplaces.append(work)
+    return workplaces
+
+def random_workers(n, rng):
+    ''' Home coordinates and travel distances of n workers '''
+    return rng.uniform(40.88, 40.98, n), rng.uniform(-73.83, -73.75, n), rng.uniform(0.0, 30.0, n)
+
+def all_costs(lat, lon, work_dist, workplaces):
+    ''' Worker - workplace costs computed one at a time '''
+
+    costs = np.zeros((len(lat), len(workplaces)))
+    for i in range(len(lat)):
+        for j, work in enumerate(workplaces):
+            costs[i,j] = abs(work_dist[i] - aut.compute_distance({'lat': lat[i], 'lon': lon[i]}, work))
+    return costs
+
+def reference_greedy(costs, workplaces, dist_tol):
+    ''' Greedy assignment over all edges within tolerance, 
+            in-town edges only if better than the best outside '''
+
+    outside = np.array([x['type'] == 'outside' for x in workplaces])
+    edges = []
+    for i in range(costs.shape[0]):
+        best_out = min([costs[i,j] for j in np.flatnonzero(outside)] + [np.inf])
+        for j in range(costs.shape[1]):
+            if costs[i,j] > dist_tol:
+                continue
+            if outside[j] and costs[i,j] == best_out:
+                edges.append((costs[i,j], i, j))
+            elif (not outside[j]) and costs[i,j] < best_out:
+                edges.append((costs[i,j], i, j))
+    edges.sort()
+
+    capacity = [costs.shape[0] if outside[j] else x['N_max'] for j, x in enumerate(workplaces)]
+    assigned = [-1]*costs.shape[0]
+    for cost, i, j in edges:
+        if assigned[i] < 0 and capacity[j] > 0:
+            assigned[i] = j
+            capacity[j] -= 1
+    return assigned
+
+def check_rules(assigned, costs, workplaces, dist_tol, n_over):
+    ''' Assignment follows capacity and tolerance rules '''
+
+    outside = np.array([x['type'] == 'outside' for x in workplaces])
+    counts = np.bincount(assigned, minlength=len(workplaces))
+    for j, work in enumerate(workplaces):
+        if not outside[j]:
+            if work['N_emp'] != counts[j]:
+                print('Wrong number of employees of workplace ' + str(j))
+                return False
+            if n_over == 0 and work['N_emp'] > work['N_max']:
+                print('Capacity exceeded in workplace ' + str(j))
+                return False
+
+    for i, j in enumerate(assigned):
+        within = costs[i] <= dist_tol
+        if not np.any(within):
+            if j != np.argmin(costs[i]):
+                print('Worker ' + str(i) + ' not assigned to the closest workplace')
+                return False
+        elif costs[i,j] > dist_tol:
+            print('Worker ' + str(i) + ' assigned outside the tolerance')
+            return False
+        best = np.argmin(np.where(within, costs[i], np.inf))
+        if outside[best] and j != best:
+            print('Worker ' + str(i) + ' not assigned to the best outside workplace')
+            return False
+    return True
+
+def check_greedy(rng):
+    ''' Same as reference when all workplaces are considered at once '''
+
+    dist_tol = 2.0
+    workplaces = random_workplaces(60, 5, 4, rng)
+    lat, lon, work_dist = random_workers(300, rng)
+    costs = all_costs(lat, lon, work_dist, workplaces)
+    exp = reference_greedy(costs, workplaces, dist_tol)
+    # Workers with no room are not part of the reference
+    exp_fixed = [i for i in range(len(exp)) if exp[i] >= 0]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        assigned, n_over = asg.assign_workplaces(lat, lon, work_dist, workplaces, dist_tol, rng, n_cand=100, chunk_size=37)
+    if assigned[exp_fixed].tolist() != [exp[i] for i in exp_fixed]:
+        print('Different assignment than the reference')
+        return False
+    return check_rules(assigned, costs, workplaces, dist_tol, n_over)
+
+def check_rounds(rng):
+    ''' Few candidates at a time still fill all room within tolerance '''
+
+    dist_tol = 20.0
+    workplaces = random_workplaces(100, 0, 5, rng)
+    n_room = sum([x['N_max'] for x in workplaces])
+    lat, lon, work_dist = random_workers(n_room, rng)
+    # All within tolerance
+    work_dist[:] = 2.0
+    costs = all_costs(lat, lon, work_dist, workplaces)
+
+    assigned, n_over = asg.assign_workplaces(lat, lon, work_dist, workplaces, dist_tol, rng, n_cand=3, chunk_size=50)
+    if n_over != 0:
+        print('Workers assigned above capacity with room left')
+        return False
+    return check_rules(assigned, costs, workplaces, dist_tol, n_over)
+
+def check_fallbacks(rng):
+    ''' No room and nothing within tolerance '''
+
+    dist_tol = 1.0
+    workplaces = random_workplaces(30, 3, 2, rng)
+    lat, lon, work_dist = random_workers(200, rng)
+    # Far from everything
+    work_dist[:20] = 100.0
+    costs = all_costs(lat, lon, work_dist, workplaces)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        assigned, n_over = asg.assign_workplaces(lat, lon, work_dist, workplaces, dist_tol, rng, n_cand=5)
+    if n_over == 0:
+        print('Expected workers above capacity')
+        return False
+    return check_rules(assigned, costs, workplaces, dist_tol, n_over)
+
+def check_parallel(rng):
+    ''' Same assignment for any tiles and number of processes '''
+
+    dist_tol = 3.0
+    workplaces = random_workplaces(200, 10, 3, rng)
+    lat, lon, work_dist = random_workers(1000, rng)
+    
+    results = []
+    for n_proc, tile_size, chunk_size in [(1, 50.0, 1000), (1, 0.5, 1000), (2, 2.0, 64), (3, 0.3, 17)]:
+        temp = [dict(x) for x in workplaces]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            assigned, n_over = asg.assign_workplaces(lat, lon, work_dist, temp, dist_tol, np.random.default_rng(1), 
+                                    n_cand=4, chunk_size=chunk_size, tile_size=tile_size, n_proc=n_proc)
+        results.append((assigned.tolist(), n_over, [x.get('N_emp', 0) for x in temp]))
+    
+    if any([x != results[0] for x in results[1:]]):
+        print('Assignment depends on tiles or processes')
+        return False
+    return True
+
+def check_planar(rng):
+    ''' Candidates from projected coordinates, exact costs of edges '''
+
+    dist_tol = 2.0
+    workplaces = random_workplaces(80, 5, 4, rng)
+    lat, lon, work_dist = random_workers(300, rng)
+    costs = all_costs(lat, lon, work_dist, workplaces)
+
+    results = []
+    for planar in [False, True]:
+        temp = [dict(x) for x in workplaces]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            assigned, n_over = asg.assign_workplaces(lat, lon, work_dist, temp, dist_tol, np.random.default_rng(2), 
+                                    n_cand=10, planar=planar)
+        if not check_rules(assigned, costs, temp, dist_tol, n_over):
+            return False
+        results.append(assigned)
+
+    if np.count_nonzero(results[0] != results[1]) > 0.02*len(lat):
+        print('Planar and exact assignments too different')
+        return False
+    return True
+
+#
+# Tests
+#
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(41)
+
+    ut.test_pass(check_greedy(rng), 'Batch assignment same as reference')
+    ut.test_pass(check_rounds(rng), 'Batch assignment with few candidates')
+    ut.test_pass(check_fallbacks(rng), 'Batch assignment fallbacks')
+    ut.test_pass(check_parallel(rng), 'Parallel assignment in tiles')
+    ut.test_pass(check_planar(rng), 'Assignment with planar distances')
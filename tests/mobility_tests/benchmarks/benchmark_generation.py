@@ -0,0 +1,170 @@
+# ------------------------------------------------------------------
+#
+#   Benchmark of population generation on synthetic towns
+#
+#   Usage: python benchmark_generation.py [n_agents_1 n_agents_2 ...]
+#       default scales are 10k and 100k agents, 1M and 5M can be
+#       requested explicitly; each scale runs in its own process
+#       so that peak memory is per scale
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import os, json, subprocess
+import utils as ut
+from colors import *
+
+import abm_residential as res
+import abm_public as public
+import abm_transit as travel
+import abm_agents as agents
+import abm_random as ar
+import abm_instrumentation as inst
+
+from synthetic_town import SyntheticTown
+
+#
+# Settings
+#
+
+# New Rochelle data used as templates
+dpath = '../../../town_data/NewRochelle/database/'
+cpath = '../../../town_data/NewRochelle/census_data/'
+year = '2021'
+
+# Synthetic inputs and reports
+data_dir = 'bench_data'
+results_dir = 'bench_results'
+
+# Number of agents
+default_scales = [10000, 100000]
+
+seed = 2021
+
+# Same parameters as in New Rochelle generation
+mode_speed = {'car': 30, 'carpool': 30, 'public': 20,
+                    'walk': 2, 'other': 3, 'wfh': 0}
+t_wfh = 5.0
+t_walk = 12.0
+max_age = 100
+fr_fam = 0.6727
+fr_couple = 0.49
+fr_sp = 0.25
+fr_60 = 0.423
+n_infected = 1
+max_working_age = 70
+# 'sequential' or 'batch' household composition
+household_composition = 'sequential'
+# 'sequential' or 'batch' workplace selection
+workplace_assignment = 'sequential'
+
+# Hot functions timed individually
+hot_functions = ['select_workplace', 'select_workplaces_batch', 'complete_households',
+                    'complete_households_batch', 'group_carpools', 'group_public_transit',
+                    'match_workplace_to_occupation']
+
+#
+# Functions
+#
+
+def run_scale(n_agents):
+    ''' Generate inputs and a population with n_agents,
+            save the timing and memory report '''
+
+    ddir = os.path.join(data_dir, 'n_' + str(n_agents))
+    town = SyntheticTown(n_agents, dpath, cpath, year, seed)
+    instr = inst.Instrumentation()
+
+    with instr.stage('synthetic inputs'):
+        params = town.write(ddir)
+
+    def fpath(key):
+        return os.path.join(ddir, town.templates.get(key, key))
+
+    rng = ar.RandomContext(seed)
+
+    with instr.stage('households') as record:
+        households = res.Households(params['n_tot'], fpath('residential'), fpath('residential_types.txt'), rng=rng)
+        record['count'] = len(households.households)
+    with instr.stage('retirement homes') as record:
+        retirement_homes = public.RetirementHomes(fpath('public'), fpath('public_types_mobility.txt'))
+        record['count'] = len(retirement_homes.retirement_homes)
+    with instr.stage('hospitals') as record:
+        hospitals = public.Hospitals(fpath('public'), fpath('public_types_mobility.txt'))
+        record['count'] = len(hospitals.hospitals)
+    with instr.stage('schools') as record:
+        schools = public.Schools(fpath('public'), fpath('public_types_mobility.txt'))
+        record['count'] = len(schools.schools)
+    with instr.stage('workplaces') as record:
+        workplaces = public.Workplaces(fpath('work_in'), fpath('work_out'), fpath('public_types_mobility.txt'),
+                        fpath('match_occupation.txt'), None, fpath('occupation_capacity.txt'))
+        workplaces.merge_with_special_workplaces(schools.schools, retirement_homes.retirement_homes, hospitals.hospitals)
+        record['count'] = len(workplaces.workplaces)
+    with instr.stage('leisure locations') as record:
+        leisure = public.LeisureLocations(fpath('leisure_in'), fpath('leisure_out'), True)
+        record['count'] = leisure.ntot
+
+    transit = travel.Transit(fpath('travel_time_to_work.txt'), fpath('transit_mode.txt'), fpath('carpool_stats.txt'),
+                    fpath('public_transit_routes.txt'), mode_speed, t_wfh, t_walk, rng=rng)
+
+    population = agents.Agents(fpath('age_distribution.txt'), fpath('age_household_head.txt'), fpath('household_size.txt'),
+                    params['n_agents'], max_age, params['n_tot'], params['fr_vacant'], fr_fam, fr_couple, fr_sp, fr_60,
+                    n_infected, fpath('occupation_stats.txt'), rng=rng)
+    instr.attach(population, hot_functions)
+
+    with instr.stage('retirement home residents') as record:
+        population.distribute_retirement_homes(retirement_homes.retirement_homes)
+        record['count'] = len(population.agents)
+    with instr.stage('hospital patients'):
+        population.distribute_hospital_patients(hospitals.hospitals)
+    with instr.stage('household residents') as record:
+        population.distribute_households(households.households, params['fr_vacant'], household_composition)
+        record['count'] = len(population.agents)
+    with instr.stage('schools', len(population.agents)):
+        population.distribute_schools(schools.schools)
+    with instr.stage('transit and workplaces', len(population.agents)):
+        population.distribute_transit_and_workplaces(households.households, workplaces.workplaces, transit,
+                        max_working_age, params['n_employed'], workplaces.occ_map, workplace_assignment)
+
+    report = instr.report()
+    report['scale'] = params
+    report['agents_per_second'] = len(population.agents)/report['total_wall_time']
+
+    os.makedirs(results_dir, exist_ok=True)
+    with open(os.path.join(results_dir, 'report_' + str(n_agents) + '.json'), 'w') as fout:
+        json.dump(report, fout, indent=4)
+
+    return report
+
+def summary(n_agents):
+    ''' Print the main numbers of a saved report '''
+
+    with open(os.path.join(results_dir, 'report_' + str(n_agents) + '.json'), 'r') as fin:
+        report = json.load(fin)
+
+    ut.msg(str(n_agents) + ' agents: ' + '{0:.1f} s, {1:.0f} agents/s, {2:.1f} MB peak RSS'.format(
+                report['total_wall_time'], report['agents_per_second'], report['peak_rss_MB']), CYAN)
+    for record in report['stages']:
+        print('  {0:<30}{1:>10.2f} s'.format(record['name'], record['wall_time']))
+    for name, record in report['functions'].items():
+        print('  {0:<30}{1:>10.2f} s {2:>10d} calls'.format(name, record['wall_time'], record['calls']))
+
+#
+# Benchmark
+#
+
+if __name__ == '__main__':
+    if (len(sys.argv) == 3) and (sys.argv[1] == 'single'):
+        # One scale, called by the driver below
+        run_scale(int(sys.argv[2]))
+    else:
+        scales = [int(x) for x in sys.argv[1:]] if len(sys.argv) > 1 else default_scales
+        for n_agents in scales:
+            subprocess.run([sys.executable, __file__, 'single', str(n_agents)], check=True)
+            summary(n_agents)
@@ -0,0 +1,223 @@
+# ------------------------------------------------------------------
+#
+#   Generator of synthetic town inputs for benchmarking
+#
+# ------------------------------------------------------------------
+
+import os, math, shutil
+import numpy as np
+
+class SyntheticTown(object):
+    ''' Class for creating input files of a synthetic town of
+            arbitrary size, in the same formats as the New Rochelle
+            database and census data '''
+
+    def __init__(self, n_agents, dpath, cpath, year='2021', seed=None):
+        ''' Load the New Rochelle files used as templates '''
+
+        #
+        # n_agents - number of agents in the synthetic town
+        # dpath - path to New Rochelle database directory
+        # cpath - path to New Rochelle census data directory
+        # year - year of the SafeGraph files to use as templates
+        # seed - seed for reproducible inputs, None for random
+        #
+
+        # New Rochelle numbers of agents and households (incl. vacant)
+        self.n_agents_ref = 79205
+        self.n_tot_ref = 29645
+        self.fr_vacant = 0.053
+
+        self.n_agents = n_agents
+        # All place counts are scaled by this factor
+        self.scale = n_agents/self.n_agents_ref
+        self.rng = np.random.default_rng(seed)
+
+        self.dpath = dpath
+        self.cpath = cpath
+
+        # Template files
+        self.templates = {'residential': 'residential.txt',
+                            'public': 'public.txt',
+                            'work_in': year + '_core_poi_NewRochelleIn_WorkTrimmed.csv',
+                            'work_out': year + '_core_poi_NewRochelleOut_WorkTrimmed.csv',
+                            'leisure_in': year + '_core_poi_NewRochelleIn_LeisureTrimmed.csv',
+                            'leisure_out': year + '_core_poi_NewRochelleOut_LeisureTrimmed.csv'}
+        # Files that do not depend on the size of the town
+        self.copied_database = ['residential_types.txt', 'public_types_mobility.txt',
+                                    'match_occupation.txt', 'occupation_capacity.txt',
+                                    'public_transit_routes.txt']
+        self.copied_census = ['age_distribution.txt', 'age_household_head.txt',
+                                'household_size.txt', 'travel_time_to_work.txt',
+                                'transit_mode.txt', 'carpool_stats.txt']
+
+        # Bounding box of New Rochelle, keeps the density of places
+        # constant - area grows with the number of agents
+        self.lat_lim, self.lon_lim = self.town_box(os.path.join(dpath, self.templates['residential']))
+        self.center = [0.5*sum(self.lat_lim), 0.5*sum(self.lon_lim)]
+        self.box_scale = math.sqrt(self.scale)
+
+    def town_box(self, fname):
+        ''' Return latitude and longitude limits of buildings in fname '''
+
+        lat = []
+        lon = []
+        for line in self.read_rows(fname)[1]:
+            lat.append(float(line[1]))
+            lon.append(float(line[2]))
+        return [min(lat), max(lat)], [min(lon), max(lon)]
+
+    def read_rows(self, fname, delim='\t'):
+        ''' Return header and all rows of fname split by delim '''
+
+        with open(fname, 'r') as fin:
+            header = next(fin)
+            rows = [line.rstrip('\n').split(delim) for line in fin if line.strip()]
+        return header, rows
+
+    def sample_rows(self, rows, n):
+        ''' Return n rows: whole copies of rows and a random
+                selection without replacement of the remainder '''
+
+        n_copies = n//len(rows)
+        ind = list(range(len(rows)))*n_copies
+        ind += self.rng.choice(len(rows), n - n_copies*len(rows), replace=False).tolist()
+        return [list(rows[i]) for i in ind]
+
+    def in_town(self, n):
+        ''' Return n random coordinates inside the scaled town '''
+
+        lat = self.center[0] + (self.rng.uniform(self.lat_lim[0], self.lat_lim[1], n) - self.center[0])*self.box_scale
+        lon = self.center[1] + (self.rng.uniform(self.lon_lim[0], self.lon_lim[1], n) - self.center[1])*self.box_scale
+        return lat, lon
+
+    def out_of_town(self, lat, lon):
+        ''' Move an outside location so that it has the same relative
+                position with respect to the scaled town '''
+
+        return self.center[0] + (lat - self.center[0])*self.box_scale, self.center[1] + (lon - self.center[1])*self.box_scale
+
+    def write(self, out_dir):
+        ''' Create all input files in out_dir, returns a dictionary
+                with the numeric inputs of the population generation '''
+
+        os.makedirs(out_dir, exist_ok=True)
+
+        for fname in self.copied_database:
+            shutil.copy(os.path.join(self.dpath, fname), out_dir)
+        for fname in self.copied_census:
+            shutil.copy(os.path.join(self.cpath, fname), out_dir)
+
+        self.write_residential(out_dir)
+        self.write_public(out_dir)
+        self.write_workplaces(out_dir)
+        self.write_leisure(out_dir)
+        n_employed = self.write_occupation_stats(out_dir)
+
+        return {'n_agents': self.n_agents, 'n_tot': round(self.n_tot_ref*self.scale),
+                    'fr_vacant': self.fr_vacant, 'n_employed': n_employed}
+
+    def write_residential(self, out_dir):
+        ''' Residential buildings with the same mix of types and floors '''
+
+        fname = self.templates['residential']
+        header, rows = self.read_rows(os.path.join(self.dpath, fname))
+        rows = self.sample_rows(rows, max(1, round(len(rows)*self.scale)))
+        lat, lon = self.in_town(len(rows))
+
+        with open(os.path.join(out_dir, fname), 'w') as fout:
+            fout.write(header)
+            for line, la, lo in zip(rows, lat, lon):
+                line[1] = str(la)
+                line[2] = str(lo)
+                fout.write(('\t').join(line) + '\n')
+
+    def write_public(self, out_dir):
+        ''' Schools, retirement homes, and hospitals '''
+
+        fname = self.templates['public']
+        header, rows = self.read_rows(os.path.join(self.dpath, fname))
+
+        new_rows = []
+        for ptype in ['F', 'AA', 'H']:
+            type_rows = [x for x in rows if x[0] == ptype]
+            sampled = self.sample_rows(type_rows, max(1, round(len(type_rows)*self.scale)))
+            if ptype == 'F':
+                # All school levels need to be present
+                levels = set([x[5] for x in sampled])
+                for row in type_rows:
+                    if not (row[5] in levels):
+                        sampled.append(list(row))
+                        levels.add(row[5])
+            # Employees, students, residents, and patients scale exactly
+            # with the number of agents, independent of how many places
+            # were sampled
+            for col in [3, 4]:
+                total = sum([int(x[col]) for x in type_rows])*self.scale
+                cur_total = sum([int(x[col]) for x in sampled])
+                for row in sampled:
+                    row[col] = str(round(int(row[col])*total/cur_total)) if cur_total > 0 else row[col]
+            new_rows += sampled
+
+        lat, lon = self.in_town(len(new_rows))
+        with open(os.path.join(out_dir, fname), 'w') as fout:
+            fout.write(header)
+            for line, la, lo in zip(new_rows, lat, lon):
+                line[1] = str(la)
+                line[2] = str(lo)
+                fout.write(('\t').join(line) + '\n')
+
+    def write_workplaces(self, out_dir):
+        ''' SafeGraph workplaces in and out of town '''
+
+        # In town - category | lat | lon
+        fname = self.templates['work_in']
+        header, rows = self.read_rows(os.path.join(self.dpath, fname))
+        rows = self.sample_rows(rows, max(1, round(len(rows)*self.scale)))
+        lat, lon = self.in_town(len(rows))
+        with open(os.path.join(out_dir, fname), 'w') as fout:
+            fout.write(header)
+            for line, la, lo in zip(rows, lat, lon):
+                fout.write(('\t').join([line[0], str(la), str(lo)]) + '\n')
+
+        # Out of town - lat | lon | zipcode | category; same zipcodes
+        # as New Rochelle, so the transit routes still apply
+        fname = self.templates['work_out']
+        header, rows = self.read_rows(os.path.join(self.dpath, fname))
+        rows = self.sample_rows(rows, max(1, round(len(rows)*self.scale)))
+        with open(os.path.join(out_dir, fname), 'w') as fout:
+            fout.write(header)
+            for line in rows:
+                la, lo = self.out_of_town(float(line[0]), float(line[1]))
+                fout.write(('\t').join([str(la), str(lo), line[2], line[3]]) + '\n')
+
+    def write_leisure(self, out_dir):
+        ''' Leisure locations in and out of town '''
+
+        for key in ['leisure_in', 'leisure_out']:
+            fname = self.templates[key]
+            header, rows = self.read_rows(os.path.join(self.dpath, fname), ',')
+            rows = self.sample_rows(rows, max(1, round(len(rows)*self.scale)))
+            if key == 'leisure_in':
+                lat, lon = self.in_town(len(rows))
+            else:
+                lat, lon = self.out_of_town(np.array([float(x[-2]) for x in rows]),
+                                                np.array([float(x[-1]) for x in rows]))
+            with open(os.path.join(out_dir, fname), 'w') as fout:
+                fout.write(header)
+                for ind, (line, la, lo) in enumerate(zip(rows, lat, lon)):
+                    fout.write((',').join([line[0].strip(), 'Place ' + str(ind+1), str(la), str(lo)]) + '\n')
+
+    def write_occupation_stats(self, out_dir):
+        ''' Occupation counts scaled to the size of the town,
+                returns total number of employed '''
+
+        fname = 'occupation_stats.txt'
+        n_employed = 0
+        with open(os.path.join(self.dpath, fname), 'r') as fin, open(os.path.join(out_dir, fname), 'w') as fout:
+            for line in fin:
+                line = line.strip().split()
+                line[1] = str(round(int(line[1])*self.scale))
+                n_employed += int(line[1])
+                fout.write(('\t').join(line) + '\n')
+        return n_employed
@@ -0,0 +1,89 @@
+# ------------------------------------------------------------------
+#
+#   Tests for household leisure candidate tables
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import os
+import numpy as np
+import utils as ut
+from colors import *
+
+import abm_public as apb
+import abm_candidates as cand
+
+#
+# Supporting functions
+#
+
+def random_households(n, seed):
+    ''' n households with random coordinates, IDs from 1 '''
+
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(40.85, 41.05, n)
+    lon = rng.uniform(-73.9, -73.7, n)
+    return [{'ID': i+1, 'lat': lat[i], 'lon': lon[i]} for i in range(n)]
+
+def check_build(leisure, households):
+    ''' Same table in one and several processes and
+            chunks, same as the in-memory query '''
+
+    lat = np.array([x['lat'] for x in households])
+    lon = np.array([x['lon'] for x in households])
+    for k, radius in [(3, None), (None, 2.0), (4, 3.0)]:
+        exp = leisure.candidate_table(lat, lon, k, radius)
+        for n_proc, chunk_size in [(1, 1000), (1, 7), (2, 13)]:
+            table = cand.CandidateTable.build(leisure, households, k, radius, n_proc, chunk_size)
+            for value, exp_value in zip([table.offsets, table.IDs, table.distances], exp):
+                if not np.array_equal(value, exp_value):
+                    print('Different table for ' + str(n_proc) + ' processes and chunk size ' + str(chunk_size))
+                    return False
+    return True
+
+def check_files(leisure, households, fname):
+    ''' Saved and memory mapped tables are the same '''
+
+    table = cand.CandidateTable.build(leisure, households, 3, 2.5, 1)
+    table.save(fname)
+    loaded = cand.CandidateTable.load(fname)
+    if not isinstance(loaded.IDs, np.memmap):
+        print('Table not memory mapped')
+        return False
+
+    for house in households:
+        IDs, dist = table.candidates(house['ID'])
+        IDs_l, dist_l = loaded.candidates(house['ID'])
+        if not (np.array_equal(IDs, IDs_l) and np.array_equal(dist, dist_l)):
+            print('Different candidates of household ' + str(house['ID']))
+            return False
+        if len(IDs) > 3 or np.any(dist > 2.5) or np.any(np.diff(dist) < 0):
+            print('Wrong candidates of household ' + str(house['ID']))
+            return False
+    del loaded
+    return True
+
+#
+# Tests
+#
+
+fleisureIn = 'test_data/core_poi_NRIn_LeisureTrimmed.csv'
+fleisureOut = 'test_data/core_poi_NROut_LeisureTrimmed.csv'
+fname = 'test_data/leisure_candidates'
+
+if __name__ == '__main__':
+    leisure = apb.LeisureLocations(fleisureIn, fleisureOut, True)
+    households = random_households(100, 39)
+
+    ut.test_pass(check_build(leisure, households), 'Candidates built in parallel chunks')
+    ut.test_pass(check_files(leisure, households, fname), 'Saving and loading candidates')
+
+    for suffix in cand.CandidateTable.suffixes.values():
+        if os.path.exists(fname + suffix):
+            os.remove(fname + suffix)
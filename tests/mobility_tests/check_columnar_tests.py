@@ -0,0 +1,135 @@
+# ------------------------------------------------------------------
+#
+#   Tests for columnar population validation
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../input_verification/'
+sys.path.insert(0, py_path)
+
+import os, filecmp
+import numpy as np
+import utils as ut
+from colors import *
+
+import check_agents as ca
+import check_households as ch
+import check_columnar as cv
+
+#
+# Supporting functions
+#
+
+def random_agents(n, seed):
+    ''' Create n agents with random properties '''
+
+    rng = np.random.default_rng(seed)
+    n_house = max(1, n//3)
+    # A building has several households
+    bld_lon = rng.uniform(-73.83, -73.74, n_house//2+1).round(6)
+    bld_lat = rng.uniform(40.88, 40.99, n_house//2+1).round(6)
+
+    agents = []
+    for i in range(n):
+        agent = {}
+        agent['RetirementHome'] = bool(rng.uniform() < 0.02)
+        agent['houseID'] = int(rng.integers(1, 11)) if agent['RetirementHome'] else int(rng.integers(1, n_house+1))
+        agent['lon'] = float(bld_lon[agent['houseID']//2])
+        agent['lat'] = float(bld_lat[agent['houseID']//2])
+        agent['yrs'] = int(rng.integers(0, 101))
+        agent['isFamily'] = bool(rng.uniform() < 0.6)
+        agent['student'] = bool(agent['yrs'] < 22)
+        agent['schoolID'] = int(rng.integers(1, 40)) if agent['student'] else 0
+        agent['isPatient'] = False
+        agent['worksHospital'] = bool((not agent['student']) and (rng.uniform() < 0.05))
+        agent['hospitalID'] = 1 if agent['worksHospital'] else 0
+        agent['works'] = bool((not agent['student']) and (not agent['worksHospital']) and (rng.uniform() < 0.6))
+        agent['workID'] = int(rng.integers(1, 500)) if agent['works'] else 0
+        agent['worksRH'] = bool(agent['works'] and (rng.uniform() < 0.03))
+        agent['worksSchool'] = bool(agent['works'] and (not agent['worksRH']) and (rng.uniform() < 0.05))
+        agents.append(agent)
+    return agents
+
+def compare_outputs(agents, out_dir):
+    ''' Run all the checks with both implementations
+            and compare the output files '''
+
+    columns = cv.AgentColumns.from_agents(agents)
+    age_groups = [(0,4),(5,9),(10,14),(15,19),(20,24),(25,34),(35,44),(45,54),(55,59),(60,64),(65,74),(75,84),(85,100)]
+
+    # Output name : (original call, columnar call)
+    checks = {'age': (lambda f: ca.print_age_distribution(f, age_groups, agents),
+                        lambda f: cv.print_age_distribution(f, age_groups, columns)),
+              'rh': (lambda f: ca.print_other_sizes(f, agents, 'worksRH', 'RetirementHome', 'houseID'),
+                        lambda f: cv.print_other_sizes(f, columns, 'worksRH', 'RetirementHome', 'houseID')),
+              'sch': (lambda f: ca.print_other_sizes(f, agents, 'worksSchool', 'student', 'schoolID'),
+                        lambda f: cv.print_other_sizes(f, columns, 'worksSchool', 'student', 'schoolID')),
+              'hs': (lambda f: ca.print_household_sizes(f, agents),
+                        lambda f: cv.print_household_sizes(f, columns)),
+              'hs_coords': (lambda f: ca.print_household_sizes_w_coords(f, agents),
+                        lambda f: cv.print_household_sizes_w_coords(f, columns)),
+              'bld_coords': (lambda f: ca.print_building_sizes_w_coords(f, agents),
+                        lambda f: cv.print_building_sizes_w_coords(f, columns)),
+              'work': (lambda f: ca.print_workplace_sizes(f, agents),
+                        lambda f: cv.print_workplace_sizes(f, columns)),
+              'school': (lambda f: ca.print_school_sizes(f, agents),
+                        lambda f: cv.print_school_sizes(f, columns)),
+              'hs_age': (lambda f: ch.print_houses_and_age(f, agents),
+                        lambda f: cv.print_houses_and_age(f, columns)),
+              'hs_work': (lambda f: ch.print_houses_and_work_status(f, f + '_fam', agents),
+                        lambda f: cv.print_houses_and_work_status(f, f + '_fam', columns)),
+              'hs_work_ID': (lambda f: ch.print_houses_and_work_ID(f, agents),
+                        lambda f: cv.print_houses_and_work_ID(f, columns)),
+              'hs_school': (lambda f: ch.print_houses_and_student_status(f, agents),
+                        lambda f: cv.print_houses_and_student_status(f, columns))}
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, (orig, columnar) in checks.items():
+        f1 = os.path.join(out_dir, name + '_orig.txt')
+        f2 = os.path.join(out_dir, name + '_columnar.txt')
+        orig(f1)
+        columnar(f2)
+        if not filecmp.cmp(f1, f2, shallow=False):
+            print('Different output in ' + name)
+            return False
+        if name == 'hs_work' and not filecmp.cmp(f1 + '_fam', f2 + '_fam', shallow=False):
+            print('Different output in family work status')
+            return False
+    return True
+
+def check_from_file(agents, fname):
+    ''' Columns loaded from a population file are the same '''
+
+    with open(fname, 'w') as fout:
+        for agent in agents:
+            line = [int(agent['student']), int(agent['works']), agent['yrs'], agent['lon'], agent['lat'],
+                        agent['houseID'], int(agent['isPatient']), agent['schoolID'], int(agent['RetirementHome']),
+                        int(agent['worksRH']), int(agent['worksSchool']), agent['workID'], int(agent['worksHospital']),
+                        agent['hospitalID'], 0, 0, 0.0, None, 0, 0, 0, 'none']
+            fout.write((' ').join([str(x) for x in line]) + '\n')
+
+    from_list = cv.AgentColumns.from_agents(agents)
+    from_file = cv.AgentColumns.from_file(fname)
+    for key in cv.AgentColumns.file_columns:
+        if not np.array_equal(from_list[key], from_file[key]):
+            print('Different column ' + key)
+            return False
+    return True
+
+#
+# Tests
+#
+
+out_dir = 'test_data/columnar'
+
+agents = random_agents(20000, 2021)
+ut.test_pass(compare_outputs(agents, out_dir), 'Same outputs as original checks')
+ut.test_pass(check_from_file(agents, os.path.join(out_dir, 'agents.txt')), 'Loading columns from file')
+
+for fname in os.listdir(out_dir):
+    os.remove(os.path.join(out_dir, fname))
+os.rmdir(out_dir)
@@ -0,0 +1,144 @@
+# ------------------------------------------------------------------
+#
+#   Tests for streaming validation of saved populations
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../input_verification/'
+sys.path.insert(0, py_path)
+
+import os, shutil
+import utils as ut
+from colors import *
+
+import check_files as cf
+
+#
+# Supporting functions
+#
+
+def agent_line(yrs, houseID, student=0, schoolID=0, works=0, workID=0, rh=0, patient=0,
+                    hospital=0, hospitalID=0, wfh=0, mode='None', carpoolID=0, publicID=0):
+    ''' One line of NR_agents.txt '''
+
+    line = [student, works, yrs, -73.78, 40.91, houseID, patient, schoolID, rh, 0, 0,
+                workID, hospital, hospitalID, 0, wfh, 10.0, mode, 0, carpoolID, publicID, 'none']
+    return (' ').join([str(x) for x in line])
+
+def write_population(path, agents):
+    ''' Small population with agent lines agents '''
+
+    os.makedirs(path, exist_ok=True)
+    places = {'NR_households.txt': ['1 40.9 -73.7', '2 40.9 -73.7', '3 40.9 -73.7'],
+                'NR_retirement_homes.txt': ['1 40.9 -73.7'],
+                'NR_hospitals.txt': ['1 40.9 -73.7'],
+                'NR_schools.txt': ['1 40.9 -73.7 primary', '2 40.9 -73.7 high'],
+                'NR_workplaces.txt': ['1 40.9 -73.7 A 0', '2 40.9 -73.7 B 0', '3 41.0 -73.9 outside 0'],
+                'NR_carpool.txt': ['1 A 10.0 0'],
+                'NR_public.txt': ['1 outside 30.0 10001'],
+                'NR_agents.txt': agents}
+    for fname, lines in places.items():
+        with open(os.path.join(path, fname), 'w') as fout:
+            fout.write(('\n').join(lines))
+
+def valid_agents():
+    ''' Agents that pass all the checks '''
+
+    return [agent_line(80, 1, rh=1),
+            agent_line(70, 0, patient=1, hospitalID=1),
+            agent_line(40, 1, works=1, workID=1, mode='carpool', carpoolID=1),
+            agent_line(38, 1, works=1, workID=2, mode='carpool', carpoolID=1),
+            agent_line(10, 1, student=1, schoolID=1),
+            agent_line(30, 2, works=1, workID=2, wfh=1, mode='wfh'),
+            agent_line(50, 3, hospital=1, hospitalID=1, workID=2),
+            agent_line(45, 3, works=1, workID=3, mode='public', publicID=1)]
+
+def check_valid(path):
+    ''' Valid population passes, independent of chunk size '''
+
+    write_population(path, valid_agents())
+    for chunk_size in [1, 3, 100]:
+        population = cf.PopulationFiles(path, chunk_size)
+        if not population.validate():
+            print('Valid population failed with chunk size ' + str(chunk_size))
+            print(population)
+            return False
+        if population.counts['agents'] != 8 or population.counts['employed'] != 5:
+            print('Wrong agent or employment counts')
+            return False
+        if population.counts['households'][1:].tolist() != [3, 1, 2]:
+            print('Wrong household sizes')
+            return False
+    return True
+
+def check_invalid(path):
+    ''' Each broken reference is found in the right line '''
+
+    agents = valid_agents()
+    # Check name : (line number, broken agent)
+    broken = {'houseID': (1, agent_line(80, 2, rh=1)),
+                'schoolID': (5, agent_line(10, 1, student=1, schoolID=3)),
+                'workID': (3, agent_line(40, 1, works=1, workID=4, mode='carpool', carpoolID=1)),
+                'work from home ID': (6, agent_line(30, 2, works=1, workID=1, wfh=1, mode='wfh')),
+                'carpoolID': (4, agent_line(38, 1, works=1, workID=2, mode='carpool', carpoolID=2)),
+                'publicID': (8, agent_line(45, 3, works=1, workID=3, mode='public', publicID=5)),
+                'hospitalID': (2, agent_line(70, 0, patient=1, hospitalID=2))}
+
+    for name, (line_num, line) in broken.items():
+        temp = list(agents)
+        temp[line_num-1] = line
+        write_population(path, temp)
+        population = cf.PopulationFiles(path, 3)
+        if population.validate():
+            print('Broken ' + name + ' not detected')
+            return False
+        if population.violations[name] != [1, [line_num]]:
+            print('Wrong violations for ' + name + ': ' + str(population.violations[name]))
+            return False
+    return True
+
+def check_capacity(path):
+    ''' Carpools with too many agents are detected '''
+
+    agents = valid_agents()
+    for i in range(4):
+        agents.append(agent_line(40, 3, works=1, workID=1, mode='carpool', carpoolID=1))
+    write_population(path, agents)
+    population = cf.PopulationFiles(path, 3, max_carpool_size=5)
+    if population.validate():
+        print('Carpool over capacity not detected')
+        return False
+    return population.violations['carpool size'][0] == 1
+
+def check_employment(path):
+    ''' Employed agents compared with the occupation statistics '''
+
+    write_population(path, valid_agents())
+    population = cf.PopulationFiles(path)
+    population.validate()
+    fname = os.path.join(path, 'occupation_stats.txt')
+    for numbers, expected in [((3, 2), True), ((40, 60), False)]:
+        with open(fname, 'w') as fout:
+            fout.write(('\n').join(['Service-occupations\t' + str(numbers[0]) + '\t50.0 A',
+                                    'Sales-occupations\t' + str(numbers[1]) + '\t50.0 B']))
+        if population.compare_employment(fname, 0.05)[0][3] != expected:
+            print('Wrong employment comparison for ' + str(sum(numbers)) + ' in the census')
+            return False
+    return True
+
+#
+# Tests
+#
+
+path = 'test_data/population_files'
+
+ut.test_pass(check_valid(path), 'Valid population')
+ut.test_pass(check_invalid(path), 'Broken references')
+ut.test_pass(check_capacity(path), 'Carpool capacity')
+ut.test_pass(check_employment(path), 'Employment census comparison')
+
+shutil.rmtree(path)
@@ -0,0 +1,256 @@
+# ------------------------------------------------------------------
+#
+#   Tests for agent columns on disk and out-of-core generation
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import os, shutil
+import numpy as np
+from copy import deepcopy
+from collections import Counter
+import utils as ut
+from colors import *
+
+import abm_agents as aab
+import abm_columns as acol
+import abm_transit as travel
+import abm_random as ar
+
+#
+# Supporting functions
+#
+
+def default_parameters():
+    ''' Same defaults as Agents '''
+    return {'ID':0, 'student':False, 'works':False, 'yrs':-1, 'lon':0, 'lat':0, 'houseID':0,
+                'isPatient':False, 'schoolID':0, 'workID':0, 'worksHospital':False,
+                'hospitalID':0, 'infected':False, 'RetirementHome': False, 'worksRH': False,
+                'worksSchool': False, 'isFamily': False, 'works from home': False,
+                'work travel time': 0.0, 'work travel mode': None, 'specialWorkID': 0,
+                'carpoolID': 0, 'publicID': 0, 'occupation': 'none', 'work_type': 'muzikant'}
+
+def empty_agents(age_numbers, seed):
+    ''' Agents object with only the age pool and household
+            statistics, number in each age group given as
+            {(min age, max age): number} '''
+
+    agents = aab.Agents.__new__(aab.Agents)
+    agents.max_age = 100
+    agents.fr_families = 0.6727
+    agents.fr_couple = 0.49
+    agents.fr_single_parent = 0.25
+    agents.fr_60 = 0.423
+    agents.n_infected = 0
+    agents.rng = ar.RandomContext(seed)
+    agents.ID = 1
+    agents.first_ID = 1
+    agents.agents = []
+    agents.rh_agents = []
+    agents.default_parameters = default_parameters()
+    agents.age_remaining = {}
+    for (min_age, max_age), number in age_numbers.items():
+        agents.age_remaining[str(min_age) + '-' + str(max_age)] = {'min': min_age, 'max': max_age, 'number': number}
+    agents.hs_age_dist = {}
+    for min_age, max_age, number in [(18, 34, 300), (35, 44, 300), (45, 54, 300), (55, 64, 250), (65, 100, 250)]:
+        agents.hs_age_dist[str(min_age) + '-' + str(max_age)] = {'min': min_age, 'max': max_age, 'number': number}
+    agents.hs_size_dist = {'1': 0.285, '2': 0.313, '3': 0.163, '4': 0.239}
+    return agents
+
+def random_agents(n, seed):
+    ''' Agents object with n agents with random properties '''
+
+    rng = np.random.default_rng(seed)
+    agents = empty_agents({}, seed)
+    for i in range(n):
+        agent = dict(default_parameters(), ID=i+1, yrs=int(rng.integers(0, 101)), lon=float(rng.uniform(-74, -73)),
+                        lat=float(rng.uniform(40, 41)), houseID=int(rng.integers(1, 100)))
+        if rng.uniform() < 0.5:
+            agent.update({'works': True, 'workID': int(rng.integers(1, 50)), 'work travel time': float(rng.integers(1, 60)),
+                            'work travel mode': 'carpool', 'carpoolID': int(rng.integers(1, 10)), 'occupation': 'B'})
+        else:
+            agent.update({'student': True, 'schoolID': int(rng.integers(1, 5)), 'isFamily': True})
+        agents.agents.append(agent)
+    return agents
+
+def check_store(path, fname):
+    ''' Agents stored in blocks are loaded and written
+            as they were in memory '''
+
+    agents = random_agents(500, 48)
+    store = acol.AgentStore(path, 500)
+    for start, end in [(0, 7), (7, 300), (300, 500)]:
+        store.append(agents.agents[start:end])
+    store.close()
+
+    loaded = acol.AgentStore.load(path)
+    if not isinstance(loaded.columns['yrs'], np.memmap):
+        print('Columns not memory mapped')
+        return False
+    if loaded.agents() != agents.agents:
+        print('Different agents after loading')
+        return False
+
+    loaded.write(fname, 123)
+    with open(fname, 'r') as fin:
+        text = fin.read()
+    if text != repr(agents):
+        print('Different agents file')
+        return False
+
+    # Too many agents
+    try:
+        store.append(agents.agents[:1])
+    except ValueError:
+        return True
+    print('Stored more agents than the store has space for')
+    return False
+
+def town(seed):
+    ''' Agents with only the age pool and retirement home residents,
+            households, and schools '''
+
+    age_numbers = {(x, x+4): 300 for x in range(0, 85, 5)}
+    age_numbers[(85, 100)] = 300
+    agents = empty_agents(age_numbers, seed)
+    households = [{'ID': i+1, 'lat': 40.9 + i*1e-4, 'lon': -73.8} for i in range(1500)]
+    schools = [{'ID': 1, 'school type': 'daycare', 'num students': 50}, {'ID': 2, 'school type': 'primary', 'num students': 400},
+                {'ID': 3, 'school type': 'middle', 'num students': 100}, {'ID': 4, 'school type': 'high', 'num students': 300},
+                {'ID': 5, 'school type': 'college', 'num students': 60}]
+    # Retirement home residents
+    for i in range(20):
+        agents.update_ages(80)
+        agents.agents.append(dict(default_parameters(), ID=agents.ID, yrs=80, houseID=1, RetirementHome=True))
+        agents.ID += 1
+    agents.rh_agents = list(agents.agents)
+    return agents, age_numbers, households, schools
+
+def random_workplaces(n_in, n_out, rng):
+    ''' n_in in-town workplaces, one of them a school and one 
+            a hospital, and n_out outside workplaces '''
+
+    workplaces = []
+    for i in range(n_in + n_out):
+        work = {'ID': i+1, 'specialID': 0, 'lat': rng.uniform(40.88, 40.98), 'lon': rng.uniform(-73.83, -73.75)}
+        if i < n_in:
+            work.update({'type': 'none', 'occupation': 'A', 'N_emp': 0, 'N_max': int(rng.integers(10, 100))})
+        else:
+            work['lat'] += 0.1
+            work.update({'type': 'outside', 'occupation': 'outside', 'zip': [10801, 10001][i % 2]})
+        workplaces.append(work)
+    workplaces[0].update({'type': 'F', 'specialID': 2})
+    workplaces[1].update({'type': 'H', 'specialID': 1})
+    return workplaces
+
+def check_out_of_core(path, seed):
+    ''' Households generated in blocks use the whole age pool,
+            fill the occupied households, and respect school
+            capacities; none are kept in memory '''
+
+    agents, age_numbers, households, schools = town(seed)
+    n_agents = 300*18
+    store = acol.AgentStore(path, n_agents)
+    agents.distribute_households_out_of_core(households, 0.05, schools, store, 170)
+    store.close()
+
+    if agents.agents or any([value['number'] != 0 for value in agents.age_remaining.values()]):
+        print('Agents left in memory or in the age pool')
+        return False
+    if store.columns['ID'].tolist() != list(range(1, n_agents+1)):
+        print('Agent IDs not contiguous')
+        return False
+
+    # Same numbers in each age group as in the pool
+    ages = store.columns['yrs']
+    for (min_age, max_age), number in age_numbers.items():
+        if np.count_nonzero((ages >= min_age) & (ages <= max_age)) != number:
+            print('Wrong number of agents aged ' + str(min_age) + '-' + str(max_age))
+            return False
+
+    # One head per occupied household
+    in_house = ~store.columns['RetirementHome']
+    members = Counter(store.columns['houseID'][in_house].tolist())
+    if len(members) != 1400 or max(members.keys()) > 1500:
+        print('Wrong number of occupied households')
+        return False
+    for ID, lat in zip(store.columns['houseID'][in_house].tolist(), store.columns['lat'][in_house].tolist()):
+        if households[ID-1]['lat'] != lat:
+            print('Agent not at its household')
+            return False
+
+    # Limited daycare and college students
+    students = Counter(store.columns['schoolID'][store.columns['student']].tolist())
+    if students[1] > 50 or students[5] > 60 or students[2] == 0:
+        print('Wrong number of students')
+        return False
+
+    # Membership from the stored columns
+    indexes = agents.build_membership_indexes({'households': 1500}, store)
+    if (indexes['households'][0][-1] != np.count_nonzero(in_house)) or (len(indexes['households'][0]) != 1501):
+        print('Wrong household membership')
+        return False
+    return True
+
+def check_work_out_of_core(path, seed):
+    ''' Workplaces, transit, and occupations of stored agents
+            are the same as of the agents in memory '''
+
+    agents, age_numbers, households, schools = town(seed)
+    store = acol.AgentStore(path, 300*18)
+    agents.distribute_households_out_of_core(households, 0.05, schools, store, 500)
+    store.close()
+
+    in_memory = empty_agents({}, seed)
+    in_memory.agents = store.agents()
+
+    cpath = '../../town_data/NewRochelle/census_data/'
+    fpt_routes = '../../town_data/NewRochelle/database/public_transit_routes.txt'
+    mode_speed = {'car': 30, 'carpool': 30, 'public': 20, 'walk': 2, 'other': 3, 'wfh': 0}
+    workplaces = random_workplaces(200, 10, np.random.default_rng(seed))
+    results = []
+    for population, kwargs in [(agents, {'store': store}), (in_memory, {})]:
+        population.rng = ar.RandomContext(seed)
+        population.census_stats = {}
+        population.load_census_stats('test_data/occupation_stats.txt')
+        transit = travel.Transit(cpath + 'travel_time_to_work.txt', cpath + 'transit_mode.txt', cpath + 'carpool_stats.txt',
+                                    fpt_routes, dict(mode_speed), 5.0, 12.0, rng=ar.RandomContext(seed))
+        population.distribute_transit_and_workplaces(households, deepcopy(workplaces), transit, 70, 2000, {'A': 'A'},
+                                                        'batch', 1, **kwargs)
+        results.append([[vars(x) for x in transit.carpools], [vars(x) for x in transit.GSP]])
+
+    if agents.agents:
+        print('Agents left in memory')
+        return False
+    if store.agents() != in_memory.agents:
+        print('Different agents in the store and in memory')
+        return False
+    if results[0] != results[1]:
+        print('Different carpools or public transit')
+        return False
+    if (len(results[0][0]) == 0) or (len(results[0][1]) == 0) or (np.count_nonzero(store.columns['works']) < 1000):
+        print('Workplaces or transit not assigned')
+        return False
+    if not np.any(store.columns['worksHospital'] & (store.columns['hospitalID'] == 1)):
+        print('Hospital employees not stored')
+        return False
+    return True
+
+#
+# Tests
+#
+
+path = 'test_data/agent_columns'
+fname = 'test_data/agent_columns.txt'
+
+ut.test_pass(check_store(path, fname), 'Storing agent columns')
+ut.test_pass(check_out_of_core(path, 48), 'Out-of-core household generation')
+ut.test_pass(check_work_out_of_core(path, 48), 'Out-of-core workplaces and transit')
+
+shutil.rmtree(path)
+os.remove(fname)
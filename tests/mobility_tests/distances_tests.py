@@ -0,0 +1,116 @@
+# ------------------------------------------------------------------
+#
+#   Tests for household to workplace distances
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import os, shutil
+import numpy as np
+import utils as ut
+from colors import *
+
+import abm_utils as aut
+import abm_distances as adist
+
+#
+# Supporting functions
+#
+
+def random_places(n, rng, outside=False):
+    ''' n places with random coordinates '''
+
+    places = []
+    for i in range(n):
+        place = {'ID': i+1, 'lat': rng.uniform(40.88, 40.98), 'lon': rng.uniform(-73.83, -73.75)}
+        place['type'] = 'outside' if (outside and i%5 == 0) else 'none'
+        places.append(place)
+    return places
+
+def check_distances(rng):
+    ''' Same distances as one at a time, shared in a building '''
+
+    workplaces = random_places(300, rng, True)
+    buildings = random_places(20, rng)
+    distances = adist.WorkplaceDistances(workplaces, max_buildings=5)
+
+    # Several units per building, buildings visited twice
+    for building in buildings + buildings:
+        for unit in range(3):
+            house = {'lat': building['lat'], 'lon': building['lon'], 'ID': unit}
+            dist = distances.get(house)
+            exp = [aut.compute_distance(house, work) for work in workplaces]
+            if not np.allclose(dist, exp, rtol=1e-12, atol=0.0):
+                print('Wrong distances to workplaces')
+                return False
+
+    if distances.misses != 40 or distances.hits != 80 or len(distances.buildings) != 5:
+        print('Wrong cache statistics ' + repr(distances))
+        return False
+    if distances.outside.tolist() != [x['type'] == 'outside' for x in workplaces]:
+        print('Wrong outside workplaces')
+        return False
+    return True
+
+def check_matrix(rng, cache_dir):
+    ''' Stored distance matrix is reused only for the same places '''
+
+    workplaces = random_places(100, rng, True)
+    buildings = random_places(30, rng)
+    # Two units per building
+    households = [dict(x) for x in buildings + buildings]
+    
+    distances = adist.WorkplaceDistances(workplaces)
+    distances.use_matrix(households, cache_dir)
+    fname = distances.matrix_file
+    mtime = os.path.getmtime(fname)
+    if distances.matrix.dtype != np.float32 or distances.matrix.shape != (30, 100):
+        print('Wrong distance matrix')
+        return False
+
+    # Same places - loaded, not computed
+    reused = adist.WorkplaceDistances(workplaces)
+    reused.use_matrix(households[::-1], cache_dir)
+    if reused.matrix_file != fname or os.path.getmtime(fname) != mtime or not isinstance(reused.matrix, np.memmap):
+        print('Stored distance matrix not reused')
+        return False
+    for house in households:
+        exp = [aut.compute_distance(house, work) for work in workplaces]
+        if not np.allclose(reused.get(house), exp, rtol=1e-6, atol=0.0):
+            print('Wrong distances from the stored matrix')
+            return False
+    if reused.misses != 0:
+        print('Distances computed instead of loaded')
+        return False
+    rows = reused.building_rows([buildings[3]['lat'], 41.5], [buildings[3]['lon'], -73.0])
+    if rows[1] != -1 or not np.array_equal(reused.matrix[rows[0]], distances.get(buildings[3])):
+        print('Wrong matrix rows of buildings')
+        return False
+
+    # Moved workplace - new matrix
+    workplaces[7]['lat'] += 0.001
+    moved = adist.WorkplaceDistances(workplaces)
+    moved.use_matrix(households, cache_dir)
+    if moved.matrix_file == fname or len(os.listdir(cache_dir)) != 2:
+        print('Stored distance matrix reused for different places')
+        return False
+    del distances, reused, moved
+    return True
+
+#
+# Tests
+#
+
+rng = np.random.default_rng(43)
+cache_dir = 'test_data/distance_cache'
+
+ut.test_pass(check_distances(rng), 'Workplace distances of buildings')
+ut.test_pass(check_matrix(rng, cache_dir), 'Stored distance matrix')
+
+shutil.rmtree(cache_dir, ignore_errors=True)
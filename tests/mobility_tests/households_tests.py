@@ -0,0 +1,163 @@
+# ------------------------------------------------------------------
+#
+#   Tests for batch household composition
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import numpy as np
+from collections import Counter
+import utils as ut
+from colors import *
+
+import abm_agents as aab
+import abm_random as ar
+
+#
+# Supporting functions
+#
+
+def empty_agents(age_numbers, seed):
+    ''' Agents object with only the age pool, 
+            number in each age group given as
+            {(min age, max age): number} '''
+
+    agents = aab.Agents.__new__(aab.Agents)
+    agents.max_age = 100
+    agents.fr_families = 0.6727
+    agents.fr_couple = 0.49
+    agents.fr_single_parent = 0.25
+    agents.fr_60 = 0.423
+    agents.rng = ar.RandomContext(seed)
+    agents.ID = 1
+    agents.first_ID = 1
+    agents.agents = []
+    agents.rh_agents = []
+    agents.default_parameters = {'ID': 0, 'yrs': -1, 'lon': 0, 'lat': 0, 'houseID': 0, 
+                                    'isFamily': False, 'RetirementHome': False}
+    agents.age_remaining = {}
+    for (min_age, max_age), number in age_numbers.items():
+        agents.age_remaining[str(min_age) + '-' + str(max_age)] = {'min': min_age, 'max': max_age, 'number': number}
+    return agents
+
+def age_groups(max_age=100):
+    ''' Census-like age groups '''
+    return [(x, x+4) for x in range(0, 85, 5)] + [(85, max_age)]
+
+def check_member_ages():
+    ''' Ages within ranges until the age groups are 
+            depleted, then any age from the remaining pool '''
+
+    agents = empty_agents({group: 100 for group in age_groups()}, 46)
+    rng = agents.rng.stream('households')
+
+    # Plenty left
+    ages = agents.draw_member_ages(np.full(300, 20), np.full(300, 39), rng)
+    if np.any(ages < 20) or np.any(ages > 39):
+        print('Ages outside of the range')
+        return False
+    left = {key: value['number'] for key, value in agents.age_remaining.items()}
+    if sum(left.values()) != 1800 - 300 or min(left.values()) < 0:
+        print('Wrong number of remaining agents')
+        return False
+
+    # 0-4 group depleted after 100 draws, the rest
+    # comes from any other group
+    ages = agents.draw_member_ages(np.zeros(150, dtype=int), np.full(150, 4), rng)
+    if np.any(ages[:100] > 4) or np.any(ages[100:] <= 4) or agents.age_remaining['0-4']['number'] != 0:
+        print('Depleted age group not replaced')
+        return False
+    if sum([value['number'] for value in agents.age_remaining.values()]) != 1800 - 450:
+        print('Wrong number of remaining agents after replacement')
+        return False
+
+    # Reversed range corrected as in add_agent_iterate_age
+    ages = agents.draw_member_ages([17], [5], rng)
+    if not (6 <= ages[0] <= 17):
+        print('Wrong correction of the age range')
+        return False
+    return True
+
+def check_household_sizes():
+    ''' Exact number of heads of each size, in random order '''
+
+    agents = empty_agents({group: 100 for group in age_groups()}, 47)
+    agents.hs_size_dist = {'1': 0.285, '2': 0.313, '3': 0.163, '4': 0.239}
+    heads = [{'ID': i+1} for i in range(1003)]
+    
+    totals = agents.assign_household_type(heads)
+    exp = {'1': 286, '2': 314, '3': 164, '4': 239}
+    if totals != exp:
+        print('Wrong number of households of each size')
+        return False
+    if agents.head_sizes.tolist() != [x['household size'] for x in heads]:
+        print('Household sizes not stored in order of heads')
+        return False
+    counts = Counter(agents.head_sizes.tolist())
+    if {str(key): value for key, value in counts.items()} != exp:
+        print('Wrong household sizes of heads')
+        return False
+    # Not grouped by size
+    if np.count_nonzero(np.diff(agents.head_sizes)) < 100:
+        print('Household sizes not shuffled')
+        return False
+    return True
+
+def check_households(seed):
+    ''' Household members follow head sizes and the
+            whole age pool is used '''
+
+    rng = np.random.default_rng(seed)
+    agents = empty_agents({group: 300 for group in age_groups()}, seed)
+    households = [{'ID': i+1, 'lat': 40.9, 'lon': -73.8} for i in range(1502)]
+    # Retirement home residents, only their home IDs are needed
+    agents.rh_agents = [{'houseID': 1501}, {'houseID': 1502}]
+    
+    heads = []
+    for house in households[:1500]:
+        age = int(rng.integers(18, 90))
+        agents.age_remaining[agents.find_age_range(age)]['number'] -= 1
+        head = {'ID': agents.ID, 'yrs': age, 'houseID': house['ID'], 'lon': house['lon'], 
+                    'lat': house['lat'], 'household size': int(rng.integers(1, 5))}
+        agents.agents.append(dict(agents.default_parameters, ID=agents.ID, yrs=age, houseID=house['ID']))
+        agents.ID += 1
+        heads.append(head)
+
+    agents.complete_households_batch({}, heads, households, 100)
+
+    if any([value['number'] != 0 for value in agents.age_remaining.values()]):
+        print('Age pool not used')
+        return False
+    if [x['ID'] for x in agents.agents] != list(range(1, len(agents.agents)+1)):
+        print('Agent IDs not contiguous')
+        return False
+    if len(agents.agents) != 300*18:
+        print('Wrong number of agents')
+        return False
+
+    members = Counter([x['houseID'] for x in agents.agents])
+    for head in heads:
+        if head['household size'] < 4 and members[head['houseID']] != head['household size']:
+            print('Wrong number of members in household ' + str(head['houseID']))
+            return False
+        if head['household size'] == 4 and members[head['houseID']] < 4:
+            print('Too few members in household ' + str(head['houseID']))
+            return False
+        if head['household size'] == 1 and agents.agents[head['ID']-1]['isFamily']:
+            print('Single person household marked as family')
+            return False
+    return True
+
+#
+# Tests
+#
+
+ut.test_pass(check_member_ages(), 'Drawing household member ages')
+ut.test_pass(check_household_sizes(), 'Household sizes of heads')
+ut.test_pass(check_households(47), 'Batch household composition')
@@ -0,0 +1,147 @@
+# ------------------------------------------------------------------
+#
+#   Tests for instrumentation module
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import os, json
+from copy import deepcopy
+import utils as ut
+from colors import *
+
+import abm_instrumentation as inst
+
+#
+# Supporting classes and functions
+#
+
+class Dummy(object):
+    ''' Stand-in for a class with hot methods '''
+
+    def inner(self, x):
+        return x*x
+
+    def outer(self, n):
+        return sum([self.inner(i) for i in range(n)])
+
+    def add(self, x):
+        self.total = getattr(self, 'total', 0) + x
+
+def check_stages():
+    ''' Stage records have all the fields and the right order '''
+
+    instr = inst.Instrumentation(trace_memory=True)
+    with instr.stage('first', 10):
+        temp = [0]*100000
+    with instr.stage('second') as record:
+        temp = list(range(1000))
+        record['count'] = len(temp)
+
+    if [x['name'] for x in instr.stages] != ['first', 'second']:
+        print('Wrong stage names or order')
+        return False
+    for record, count in zip(instr.stages, [10, 1000]):
+        if record['count'] != count:
+            print('Wrong stage item count')
+            return False
+        for key in ['wall_time', 'cpu_time', 'peak_rss_MB', 'peak_traced_MB', 'throughput']:
+            if not (key in record):
+                print('Missing ' + key + ' in stage record')
+                return False
+            if record[key] < 0.0:
+                print('Negative ' + key + ' in stage record')
+                return False
+    return True
+
+def check_functions():
+    ''' Attached methods are counted only for the instance
+            and restored on detach '''
+
+    instr = inst.Instrumentation()
+    obj = Dummy()
+    other = Dummy()
+    instr.attach(obj, ['inner', 'outer'])
+
+    if obj.outer(100) != other.outer(100):
+        print('Timed method returns a different result')
+        return False
+    obj.outer(10)
+
+    if instr.functions['outer']['calls'] != 2 or instr.functions['inner']['calls'] != 110:
+        print('Wrong number of recorded calls')
+        return False
+    if instr.functions['outer']['wall_time'] < instr.functions['inner']['wall_time']:
+        print('Nested call takes longer than the caller')
+        return False
+
+    instr.detach(obj, ['inner', 'outer'])
+    obj.outer(10)
+    if instr.functions['outer']['calls'] != 2:
+        print('Method still timed after detaching')
+        return False
+    return True
+
+def check_deepcopy():
+    ''' Timed methods of a deep copy run on the copy '''
+
+    instr = inst.Instrumentation()
+    obj = Dummy()
+    instr.attach(obj, ['add'])
+    copied = deepcopy(obj)
+    copied.add(3)
+
+    if getattr(copied, 'total', 0) != 3:
+        print('Timed method did not modify the copy')
+        return False
+    if hasattr(obj, 'total'):
+        print('Timed method of the copy modified the original')
+        return False
+    if instr.functions['add']['calls'] != 1:
+        print('Method of the copy not timed')
+        return False
+    return True
+
+def check_report(fname):
+    ''' Saved JSON report is the same as the in-memory one '''
+
+    instr = inst.Instrumentation()
+    obj = Dummy()
+    instr.attach(obj, ['outer'])
+    with instr.stage('only', 5):
+        obj.outer(5)
+    instr.save(fname)
+
+    with open(fname, 'r') as fin:
+        report = json.load(fin)
+
+    if report['stages'][0]['name'] != 'only' or report['stages'][0]['count'] != 5:
+        print('Wrong stage in the report')
+        return False
+    if report['functions']['outer']['calls'] != 1:
+        print('Wrong function record in the report')
+        return False
+    if not ('time_per_call' in report['functions']['outer']):
+        print('Missing time per call in the report')
+        return False
+    return True
+
+#
+# Tests
+#
+
+fout = 'test_data/instrumentation_report.json'
+
+ut.test_pass(check_stages(), 'Stage records')
+ut.test_pass(check_functions(), 'Timed methods')
+ut.test_pass(check_deepcopy(), 'Timing copied objects')
+ut.test_pass(check_report(fout), 'JSON report')
+
+if os.path.exists(fout):
+    os.remove(fout)
@@ -0,0 +1,119 @@
+# ------------------------------------------------------------------
+#
+#   Tests for place to agent membership indexes
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import os
+import numpy as np
+import utils as ut
+from colors import *
+
+import abm_agents as aab
+
+#
+# Supporting functions
+#
+
+def random_agents(n, seed):
+    ''' Agents object with n agents with random places '''
+
+    rng = np.random.default_rng(seed)
+    # Only the agent list is needed
+    agents = aab.Agents.__new__(aab.Agents)
+    agents.agents = []
+    for i in range(n):
+        agent = {'ID': i+1, 'student': False, 'works': False, 'worksHospital': False,
+                    'RetirementHome': False, 'isPatient': False, 'works from home': False,
+                    'houseID': 0, 'workID': 0, 'schoolID': 0, 'hospitalID': 0,
+                    'carpoolID': 0, 'publicID': 0}
+        kind = rng.integers(0, 10)
+        if kind == 0:
+            agent['RetirementHome'] = True
+            agent['houseID'] = int(rng.integers(1, 4))
+        elif kind == 1:
+            agent['isPatient'] = True
+            agent['hospitalID'] = 1
+        else:
+            agent['houseID'] = int(rng.integers(1, 200))
+            if kind < 5:
+                agent['student'] = True
+                agent['schoolID'] = int(rng.integers(1, 10))
+            elif kind == 5:
+                agent['works from home'] = True
+                agent['works'] = True
+                agent['workID'] = agent['houseID']
+            elif kind == 6:
+                agent['worksHospital'] = True
+                agent['hospitalID'] = 1
+                agent['workID'] = 120
+            elif kind > 6:
+                agent['works'] = True
+                agent['workID'] = int(rng.integers(1, 120))
+                if kind == 8:
+                    agent['carpoolID'] = int(rng.integers(1, 30))
+                if kind == 9:
+                    agent['publicID'] = int(rng.integers(1, 5))
+        agents.agents.append(agent)
+    return agents
+
+def expected_members(agents):
+    ''' Place members found by looping over all agents '''
+
+    exp = {}
+    for agent in agents.agents:
+        places = []
+        if agent['RetirementHome']:
+            places.append(('retirement_homes', agent['houseID']))
+        elif not agent['isPatient']:
+            places.append(('households', agent['houseID']))
+        if (agent['works'] or agent['worksHospital']) and (not agent['works from home']):
+            places.append(('workplaces', agent['workID']))
+        if agent['student']:
+            places.append(('schools', agent['schoolID']))
+        if agent['isPatient'] or agent['worksHospital']:
+            places.append(('hospitals', agent['hospitalID']))
+        if agent['carpoolID'] > 0:
+            places.append(('carpools', agent['carpoolID']))
+        if agent['publicID'] > 0:
+            places.append(('public', agent['publicID']))
+        for place, ID in places:
+            exp.setdefault(place, {}).setdefault(ID, []).append(agent['ID'])
+    return exp
+
+def check_indexes(indexes, exp, n_places):
+    ''' Indexes have the expected members of each place '''
+
+    for place, members in exp.items():
+        offsets, IDs = indexes[place]
+        if len(offsets) - 1 != max(max(members.keys()), n_places.get(place, 0)):
+            print('Wrong number of places of type ' + place)
+            return False
+        for ID in range(1, len(offsets)):
+            if IDs[offsets[ID-1]:offsets[ID]].tolist() != members.get(ID, []):
+                print('Wrong members of ' + place + ' ' + str(ID))
+                return False
+    return True
+
+#
+# Tests
+#
+
+fname = 'test_data/membership.npz'
+
+agents = random_agents(3000, 40)
+exp = expected_members(agents)
+n_places = {'households': 250, 'schools': 9}
+
+ut.test_pass(check_indexes(agents.build_membership_indexes(n_places), exp, n_places), 'Membership indexes')
+
+agents.save_membership_indexes(fname, n_places)
+ut.test_pass(check_indexes(aab.load_membership_indexes(fname), exp, n_places), 'Saved membership indexes')
+os.remove(fname)
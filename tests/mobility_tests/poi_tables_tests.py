@@ -0,0 +1,109 @@
+# ------------------------------------------------------------------
+#
+#   Tests for columnar POI tables
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import os
+import numpy as np
+import utils as ut
+from colors import *
+
+import abm_poi_tables as apt
+import abm_public as apb
+
+#
+# Supporting functions
+#
+
+def check_leisure(fname_in, fname_out, npz_in, npz_out):
+    ''' Same leisure locations from text and columnar files '''
+
+    from_text = apb.LeisureLocations(fname_in, fname_out, True)
+    apt.export_table(fname_in, 'leisure', npz_in)
+    apt.export_table(fname_out, 'leisure', npz_out)
+    from_npz = apb.LeisureLocations(npz_in, npz_out, True)
+    if from_text.leisure_locations != from_npz.leisure_locations:
+        print('Different leisure locations from the columnar files')
+        return False
+
+    # Quoted type with commas
+    if from_npz.leisure_locations[0]['type'] != 'Sporting Goods, Hobby, and Musical Instrument Stores':
+        print('Quoted type not parsed correctly')
+        return False
+    return True
+
+def check_columns(fname, fname_npz):
+    ''' Typed columns and dictionary encoded text '''
+
+    with open(fname, 'w') as fout:
+        fout.write('latitude longitude zipcode category\n')
+        fout.write('40.940584 -73.742598 10543 K\n40.874021 -73.85523 10469 U\n40.9 -73.8 10543 K\n')
+
+    table = apt.load_table(apt.export_table(fname, 'work_out', fname_npz), 'work_out')
+    if table['lat'].dtype != np.float64 or table['zip'].dtype != np.int64:
+        print('Wrong column types')
+        return False
+    if table['type_values'].tolist() != ['K', 'U'] or table['type_codes'].tolist() != [0, 1, 0]:
+        print('Wrong dictionary encoding')
+        return False
+    if apt.decode(table, 'type') != ['K', 'U', 'K'] or table['lat'][1] != 40.874021:
+        print('Wrong decoded values')
+        return False
+
+    # Wrong kind is detected
+    try:
+        apt.load_table(fname_npz, 'leisure')
+        print('Wrong table kind not detected')
+        return False
+    except ValueError:
+        pass
+    return True
+
+def check_cache(fname, fname_npz):
+    ''' Columnar copy is recreated only when outdated '''
+
+    if os.path.exists(fname_npz):
+        os.remove(fname_npz)
+    if apt.cached_table(fname, 'work_out') != fname_npz:
+        print('Wrong name of the cached table')
+        return False
+    mtime = os.path.getmtime(fname_npz)
+    apt.cached_table(fname, 'work_out')
+    if os.path.getmtime(fname_npz) != mtime:
+        print('Up to date table was recreated')
+        return False
+
+    with open(fname, 'a') as fout:
+        fout.write('40.8 -73.7 10701 K\n')
+    os.utime(fname, (mtime + 10, mtime + 10))
+    if len(apt.load_table(apt.cached_table(fname, 'work_out'))['lat']) != 4:
+        print('Outdated table was not recreated')
+        return False
+    return True
+
+#
+# Tests
+#
+
+fleisureIn = 'test_data/core_poi_NRIn_LeisureTrimmed.csv'
+fleisureOut = 'test_data/core_poi_NROut_LeisureTrimmed.csv'
+npz_in = 'test_data/leisure_in.npz'
+npz_out = 'test_data/leisure_out.npz'
+fwork = 'test_data/work_out.txt'
+npz_work = 'test_data/work_out.npz'
+
+ut.test_pass(check_leisure(fleisureIn, fleisureOut, npz_in, npz_out), 'Leisure locations from columnar files')
+ut.test_pass(check_columns(fwork, npz_work), 'Column types and encoding')
+ut.test_pass(check_cache(fwork, npz_work), 'Columnar cache')
+
+for fname in [npz_in, npz_out, fwork, npz_work]:
+    if os.path.exists(fname):
+        os.remove(fname)
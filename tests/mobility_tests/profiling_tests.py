@@ -0,0 +1,153 @@
+# ------------------------------------------------------------------
+#
+#   Tests for profiling module
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import os, shutil, pstats
+from copy import deepcopy
+import utils as ut
+from colors import *
+
+import abm_profiling as prof
+import abm_agents as aab
+
+#
+# Supporting classes and functions
+#
+
+class Dummy(object):
+    ''' Stand-in for Agents with two nested stages '''
+
+    def group_carpools(self, n):
+        return sum([i*i for i in range(n)])
+
+    def distribute_schools(self, n):
+        return self.group_carpools(n) + 1
+
+def check_environment():
+    ''' No hooks unless requested '''
+
+    os.environ.pop('ABM_PROFILE', None)
+    if prof.ProfilingHooks.from_environment() is not None:
+        print('Hooks created without request')
+        return False
+
+    os.environ['ABM_PROFILE'] = 'sampling'
+    os.environ['ABM_PROFILE_METHODS'] = 'group_carpools, distribute_schools'
+    hooks = prof.ProfilingHooks.from_environment()
+    del os.environ['ABM_PROFILE']
+    del os.environ['ABM_PROFILE_METHODS']
+
+    if (hooks is None) or (hooks.mode != 'sampling'):
+        print('Wrong mode from the environment')
+        return False
+    if hooks.methods != ['group_carpools', 'distribute_schools']:
+        print('Wrong methods from the environment')
+        return False
+    return True
+
+def check_cprofile(out_dir):
+    ''' One profile file per outermost call, callbacks for all '''
+
+    hooks = prof.ProfilingHooks('cprofile', out_dir, ['group_carpools', 'distribute_schools'])
+    called = []
+    hooks.add_callback('group_carpools', before=lambda name, args, kwargs: called.append(name))
+    hooks.add_callback('distribute_schools', after=lambda name, result, elapsed: called.append(result))
+
+    obj = Dummy()
+    hooks.attach(obj)
+    if obj.distribute_schools(1000) != Dummy().distribute_schools(1000):
+        print('Profiled method returns a different result')
+        return False
+    obj.group_carpools(10)
+
+    if called != ['group_carpools', Dummy().distribute_schools(1000), 'group_carpools']:
+        print('Callbacks not called correctly')
+        return False
+
+    files = sorted(os.listdir(out_dir))
+    if files != ['distribute_schools_1.prof', 'group_carpools_2.prof']:
+        print('Wrong profile files ' + str(files))
+        return False
+
+    # Nested stage is part of the outer profile
+    stats = pstats.Stats(os.path.join(out_dir, 'distribute_schools_1.prof'))
+    if not any([func[2] == 'group_carpools' for func in stats.stats]):
+        print('Nested stage missing from the profile')
+        return False
+    return True
+
+def check_sampling(out_dir):
+    ''' Sampling profiler collects stacks of the profiled method '''
+
+    hooks = prof.ProfilingHooks('sampling', out_dir, ['group_carpools'], 0.001)
+    obj = Dummy()
+    hooks.attach(obj)
+    obj.group_carpools(2000000)
+
+    fname = os.path.join(out_dir, 'group_carpools_1.txt')
+    if not os.path.exists(fname):
+        print('Missing sampling profile')
+        return False
+    with open(fname, 'r') as fin:
+        lines = fin.readlines()
+    if not lines or not any(['group_carpools' in line for line in lines]):
+        print('Profiled method missing from the samples')
+        return False
+    return True
+
+def check_deepcopy(out_dir):
+    ''' Profiled methods of a deep copy of Agents run on the copy '''
+
+    cpath = '../../town_data/NewRochelle/census_data/'
+    os.environ['ABM_PROFILE'] = 'cprofile'
+    os.environ['ABM_PROFILE_DIR'] = out_dir
+    os.environ['ABM_PROFILE_METHODS'] = 'distribute_schools'
+    agents = aab.Agents(cpath + 'age_distribution.txt', cpath + 'age_household_head.txt', cpath + 'household_size.txt',
+                            100, 100, 50, 0.05, 0.6727, 0.49, 0.25, 0.423, 1, 'test_data/occupation_stats.txt')
+    del os.environ['ABM_PROFILE']
+    del os.environ['ABM_PROFILE_DIR']
+    del os.environ['ABM_PROFILE_METHODS']
+
+    agents.agents.append(dict(agents.default_parameters, ID=1, yrs=10))
+    copied = deepcopy(agents)
+    copied.distribute_schools([{'ID': 1, 'school type': 'primary', 'num students': 10}])
+
+    if copied.agents[0]['schoolID'] != 1:
+        print('Profiled method did not modify the copy')
+        return False
+    if agents.agents[0]['schoolID'] != 0:
+        print('Profiled method of the copy modified the original')
+        return False
+    if not os.path.exists(os.path.join(out_dir, 'distribute_schools_1.prof')):
+        print('Method of the copy not profiled')
+        return False
+    return True
+
+#
+# Tests
+#
+
+out_dir = 'test_data/profiles'
+
+for test, name in [(check_environment, 'Hooks from the environment'),
+                    (check_cprofile, 'Deterministic profiling and callbacks'),
+                    (check_sampling, 'Sampling profiling'),
+                    (check_deepcopy, 'Profiling copied agents')]:
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    if test == check_environment:
+        ut.test_pass(test(), name)
+    else:
+        ut.test_pass(test(out_dir), name)
+
+if os.path.exists(out_dir):
+    shutil.rmtree(out_dir)
@@ -0,0 +1,126 @@
+# ------------------------------------------------------------------
+#
+#   Tests for random number streams
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import utils as ut
+from colors import *
+
+import abm_random as ar
+import abm_transit as travel
+
+#
+# Supporting functions
+#
+
+def same_seed_same_streams(seed):
+    ''' Two contexts with the same seed give identical streams '''
+
+    rng1 = ar.RandomContext(seed)
+    rng2 = ar.RandomContext(seed)
+
+    for name in ['households', 'workplaces', 'travel_times']:
+        if not (rng1.stream(name).integers(0, 1000, 100) == rng2.stream(name).integers(0, 1000, 100)).all():
+            print('Stream ' + name + ' differs for the same seed')
+            return False
+    return True
+
+def stream_order_independence(seed):
+    ''' Stream of a stage does not depend on which other
+            stages used their streams before '''
+
+    rng1 = ar.RandomContext(seed)
+    rng2 = ar.RandomContext(seed)
+
+    rng1.stream('households').uniform(0, 1, 1000)
+    x1 = rng1.stream('workplaces').uniform(0, 1, 100)
+    x2 = rng2.stream('workplaces').uniform(0, 1, 100)
+
+    if not (x1 == x2).all():
+        print('Stream depends on order of use')
+        return False
+
+    # Different stages are different streams
+    y = rng2.stream('schools').uniform(0, 1, 100)
+    if (x2 == y).all():
+        print('Different stages share a stream')
+        return False
+
+    return True
+
+def reset_and_spawn(seed):
+    ''' Resetting restarts a stream, spawned contexts are
+            reproducible and independent '''
+
+    rng = ar.RandomContext(seed)
+    x1 = rng.stream('occupations').integers(0, 1000, 100)
+    rng.reset('occupations')
+    x2 = rng.stream('occupations').integers(0, 1000, 100)
+    if not (x1 == x2).all():
+        print('Reset does not restart the stream')
+        return False
+
+    reps1 = ar.RandomContext(seed).spawn(2)
+    reps2 = ar.RandomContext(seed).spawn(2)
+    y1 = reps1[1].stream('occupations').integers(0, 1000, 100)
+    y2 = reps2[1].stream('occupations').integers(0, 1000, 100)
+    y3 = reps1[0].stream('occupations').integers(0, 1000, 100)
+    if not (y1 == y2).all():
+        print('Spawned contexts are not reproducible')
+        return False
+    if (y1 == y3).all():
+        print('Spawned contexts are not independent')
+        return False
+
+    return True
+
+def transit_reproducibility(seed, args):
+    ''' Transit sampling is the same for the same seed '''
+
+    nsamples = 1000
+    transit1 = travel.Transit(*args, rng=ar.RandomContext(seed))
+    transit2 = travel.Transit(*args, rng=ar.RandomContext(seed))
+
+    if transit1.sample_travel_times(nsamples)[0] != transit2.sample_travel_times(nsamples)[0]:
+        print('Travel times differ for the same seed')
+        return False
+    if transit1.sample_travel_modes(nsamples) != transit2.sample_travel_modes(nsamples):
+        print('Travel modes differ for the same seed')
+        return False
+    if transit1.sample_carpool_numbers(nsamples) != transit2.sample_carpool_numbers(nsamples):
+        print('Carpool numbers differ for the same seed')
+        return False
+
+    return True
+
+#
+# Tests
+#
+
+seed = 2021
+
+# Input files
+ftimes = '../../town_data/NewRochelle/census_data/travel_time_to_work.txt'
+fmodes = '../../town_data/NewRochelle/census_data/transit_mode.txt'
+fcpools = '../../town_data/NewRochelle/census_data/carpool_stats.txt'
+fpt_routes = '../../town_data/NewRochelle/database/public_transit_routes.txt'
+
+mode_speed = {'car': 30, 'carpool': 30, 'public': 20,
+                    'walk': 2, 'other': 3, 'wfh': 0}
+t_wfh = 5.0
+t_walk = 12.0
+
+transit_args = (ftimes, fmodes, fcpools, fpt_routes, mode_speed, t_wfh, t_walk)
+
+ut.test_pass(same_seed_same_streams(seed), 'Same seed, same streams')
+ut.test_pass(stream_order_independence(seed), 'Streams independent of stage order')
+ut.test_pass(reset_and_spawn(seed), 'Resetting and spawning streams')
+ut.test_pass(transit_reproducibility(seed, transit_args), 'Reproducible transit sampling')
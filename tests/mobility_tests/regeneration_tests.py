@@ -0,0 +1,135 @@
+# ------------------------------------------------------------------
+#
+#   Tests for loading a generated population to redo
+#    the work and transit stages
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import os
+import numpy as np
+import utils as ut
+from colors import *
+
+import abm_agents as aab
+import abm_residential as res
+import abm_random as ar
+
+#
+# Supporting functions
+#
+
+def empty_agents(seed):
+    ''' Agents object without agents '''
+
+    agents = aab.Agents.__new__(aab.Agents)
+    agents.rng = ar.RandomContext(seed)
+    agents.n_infected = 3
+    agents.ID = 1
+    agents.first_ID = 1
+    agents.agents = []
+    agents.rh_agents = []
+    agents.age_remaining = {'0-4': {'min': 0, 'max': 4, 'number': 5}}
+    agents.default_parameters = {'ID':0, 'student':False, 'works':False, 'yrs':-1, 'lon':0, 'lat':0, 'houseID':0,
+                                    'isPatient':False, 'schoolID':0, 'workID':0, 'worksHospital':False,
+                                    'hospitalID':0, 'infected':False, 'RetirementHome': False, 'worksRH': False,
+                                    'worksSchool': False, 'isFamily': False, 'works from home': False,
+                                    'work travel time': 0.0, 'work travel mode': None, 'specialWorkID': 0,
+                                    'carpoolID': 0, 'publicID': 0, 'occupation': 'none', 'work_type': 'muzikant'}
+    return agents
+
+def random_agents(n, seed):
+    ''' Agents object with n agents with random properties '''
+
+    rng = np.random.default_rng(seed)
+    agents = empty_agents(seed)
+    for i in range(n):
+        agent = dict(agents.default_parameters, ID=i+1, yrs=int(rng.integers(0, 101)), lon=float(rng.uniform(-74, -73)),
+                        lat=float(rng.uniform(40, 41)), houseID=int(rng.integers(1, 100)))
+        kind = rng.integers(0, 5)
+        if kind == 0:
+            agent.update({'isPatient': True, 'hospitalID': 2})
+        elif kind == 1:
+            agent.update({'student': True, 'schoolID': int(rng.integers(1, 5))})
+        elif kind == 2:
+            agent.update({'worksHospital': True, 'hospitalID': 1, 'workID': 3, 'specialWorkID': 1, 'work travel time': 20.0,
+                            'work travel mode': 'public', 'publicID': 4, 'occupation': 'A'})
+        elif kind == 3:
+            agent.update({'works': True, 'works from home': True, 'workID': agent['houseID'], 'work travel time': 2.5,
+                            'work travel mode': 'wfh', 'occupation': 'B'})
+        else:
+            agent.update({'works': True, 'worksSchool': True, 'workID': int(rng.integers(1, 50)), 'specialWorkID': 2,
+                            'work travel time': float(rng.integers(1, 60)), 'work travel mode': 'carpool',
+                            'carpoolID': int(rng.integers(1, 10)), 'occupation': 'C'})
+        agents.agents.append(agent)
+    return agents
+
+def check_load(fname):
+    ''' Agents loaded from a file are the same as written '''
+
+    agents = random_agents(300, 50)
+    with open(fname, 'w') as fout:
+        fout.write(repr(agents))
+
+    loaded = empty_agents(50)
+    loaded.load_agents(fname)
+    if loaded.agents != agents.agents:
+        print('Different agents after loading')
+        return False
+    if loaded.ID != 301 or loaded.age_remaining['0-4']['number'] != 0:
+        print('Wrong state after loading')
+        return False
+    return True
+
+def check_reset(fname):
+    ''' Only work, transit, and infection data are removed '''
+
+    agents = empty_agents(50)
+    agents.load_agents(fname)
+    original = [dict(agent) for agent in agents.agents]
+    agents.reset_work()
+
+    demographics = ['ID', 'student', 'yrs', 'lon', 'lat', 'houseID', 'isPatient', 'schoolID', 'RetirementHome']
+    for agent, orig in zip(agents.agents, original):
+        if any([agent[key] != orig[key] for key in demographics]):
+            print('Demographics of agent ' + str(agent['ID']) + ' changed')
+            return False
+        if agent['works'] or agent['worksHospital'] or agent['infected'] or (agent['workID'] != 0):
+            print('Work of agent ' + str(agent['ID']) + ' not removed')
+            return False
+        if (agent['work travel mode'] is not None) or (agent['carpoolID'] + agent['publicID'] != 0):
+            print('Transit of agent ' + str(agent['ID']) + ' not removed')
+            return False
+        if agent['hospitalID'] != (orig['hospitalID'] if orig['isPatient'] else 0):
+            print('Wrong hospital of agent ' + str(agent['ID']))
+            return False
+    return True
+
+def check_households(fname):
+    ''' Households loaded from a file are the same as written '''
+
+    households = res.Households.__new__(res.Households)
+    rng = np.random.default_rng(50)
+    households.households = [{'ID': i+1, 'lat': float(rng.uniform(40, 41)), 'lon': float(rng.uniform(-74, -73))}
+                                for i in range(100)]
+    with open(fname, 'w') as fout:
+        fout.write(repr(households))
+    return res.Households.load(fname).households == households.households
+
+#
+# Tests
+#
+
+fname = 'test_data/regeneration.txt'
+
+ut.test_pass(check_load(fname), 'Loading agents')
+ut.test_pass(check_reset(fname), 'Removing work and transit')
+ut.test_pass(check_households(fname), 'Loading households')
+
+os.remove(fname)
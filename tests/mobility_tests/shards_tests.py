@@ -0,0 +1,150 @@
+# ------------------------------------------------------------------
+#
+#   Tests for sharded generation of household residents
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import os
+import numpy as np
+import utils as ut
+from colors import *
+
+import abm_agents as aab
+import abm_shards as ash
+import abm_random as ar
+
+#
+# Supporting functions
+#
+
+def write_distribution(fname, groups, percents):
+    ''' Census-like distribution file '''
+    with open(fname, 'w') as fout:
+        for group, percent in zip(groups, percents):
+            fout.write(group + '\t' + str(percent) + '\n')
+
+def shard_files(prefix, age_percents, head_percents):
+    ''' Distribution files of one shard, returns
+            age, head age, and household size file '''
+
+    age_groups = ['Under 4 years', '5 to 9 years', '10 to 14 years', '15 to 19 years', '20 to 24 years',
+                    '25 to 34 years', '35 to 44 years', '45 to 54 years', '55 to 59 years', '60 to 64 years',
+                    '65 to 74 years', '75 to 84 years', '85 years and over']
+    head_groups = ['15 to 24 years', '25 to 34 years', '35 to 44 years', '45 to 54 years', '55 to 59 years',
+                    '60 to 64 years', '65 to 74 years', '75 to 84 years', '85 years and over']
+    files = [prefix + '_age.txt', prefix + '_head_age.txt', prefix + '_household_size.txt']
+    write_distribution(files[0], age_groups, age_percents)
+    write_distribution(files[1], head_groups, head_percents)
+    write_distribution(files[2], ['1', '2', '3', '4'], [28.5, 27.9, 17.7, 25.9])
+    return files
+
+def town_agents(files, n_agents, n_houses, params):
+    ''' Agents of the whole town with retirement home residents '''
+
+    agents = aab.Agents(files[0], files[1], files[2], n_agents, params['max_age'], n_houses, params['fr_vacancy'],
+                            params['fr_fam'], params['fr_couple'], params['fr_sp'], params['fr_60'], 1,
+                            params['fname_census'], rng=ar.RandomContext(49))
+    agents.distribute_retirement_homes([{'ID': 1, 'num residents': 30, 'lat': 40.9, 'lon': -73.8}])
+    return agents
+
+def generate(shards, params, files, households, n_proc):
+    ''' Town agents with household residents of all shards '''
+
+    # Shard residents and 30 in retirement homes
+    agents = town_agents(files, 30 + sum([shard['n_agents'] for shard in shards]), len(households), params)
+    ash.Shards(shards, params, 49).generate(agents, households, n_proc)
+    return agents
+
+def check_shards(shards, params, files, households):
+    ''' Residents of each shard live in its households, follow
+            its distributions, and have contiguous IDs; same
+            population in one and several processes '''
+
+    agents = generate(shards, params, files, households, 1)
+    n_exp = 30 + sum([shard['n_agents'] for shard in shards])
+    if [agent['ID'] for agent in agents.agents] != list(range(1, n_exp+1)) or agents.ID != n_exp+1:
+        print('Agent IDs not contiguous')
+        return False
+
+    start = 30
+    mean_ages = []
+    for shard in shards:
+        residents = agents.agents[start:start+shard['n_agents']]
+        start += shard['n_agents']
+        house_IDs = set(shard['house_IDs'])
+        if any([(not agent['RetirementHome']) and (not agent['houseID'] in house_IDs) for agent in residents]):
+            print('Agent outside of its shard')
+            return False
+        mean_ages.append(np.mean([agent['yrs'] for agent in residents]))
+    # Young and old shards
+    if not (mean_ages[0] + 10 < mean_ages[1]):
+        print('Shard age distributions not followed')
+        return False
+
+    if any([agent['RetirementHome'] and agent['houseID'] != 1 for agent in agents.agents]):
+        print('Remaining agents outside of retirement homes')
+        return False
+
+    # Independent of the number of processes
+    if generate(shards, params, files, households, 2).agents != agents.agents:
+        print('Different agents in several processes')
+        return False
+    return True
+
+def check_invalid(shards, params, files, households):
+    ''' Shards that overlap, have households that do not exist, 
+            or a wrong number of agents are not generated '''
+
+    overlap = [dict(shards[0]), dict(shards[1], house_IDs=list(range(2, 1201, 2)) + [1])]
+    outside = [dict(shards[0]), dict(shards[1], house_IDs=list(range(2, 1203, 2)))]
+    repeated = [dict(shards[0], house_IDs=shards[0]['house_IDs'] + [1]), dict(shards[1])]
+    for name, invalid in [('overlapping', overlap), ('outside', outside), ('repeated', repeated)]:
+        try:
+            generate(invalid, params, files, households, 1)
+        except ValueError:
+            continue
+        print('Shards with ' + name + ' households generated')
+        return False
+
+    agents = town_agents(files, 3000, len(households), params)
+    try:
+        ash.Shards(shards, params, 49).generate(agents, households, 1)
+    except ValueError:
+        return True
+    print('Shards with a wrong number of agents generated')
+    return False
+
+#
+# Tests
+#
+
+if __name__ == '__main__':
+    prefix = 'test_data/shard'
+    params = {'max_age': 100, 'fr_vacancy': 0.05, 'fr_fam': 0.6727, 'fr_couple': 0.49, 'fr_sp': 0.25,
+                'fr_60': 0.423, 'fname_census': 'test_data/occupation_stats.txt', 'composition': 'batch'}
+    town = [5.3, 6.0, 5.7, 7.5, 7.8, 11.9, 13.0, 13.8, 6.6, 6.0, 8.2, 5.6, 2.6]
+    files = shard_files(prefix + '_town', town, [1.6, 11.2, 16.9, 20.4, 10.3, 9.8, 14.9, 10.9, 4.1])
+    young = shard_files(prefix + '_young', [10.0, 10.0, 10.0, 8.0, 8.0, 16.0, 14.0, 10.0, 4.0, 3.0, 4.0, 2.0, 1.0],
+                            [3.0, 25.0, 27.0, 20.0, 8.0, 6.0, 6.0, 4.0, 1.0])
+    old = shard_files(prefix + '_old', [2.0, 2.0, 2.0, 3.0, 3.0, 8.0, 10.0, 14.0, 10.0, 10.0, 16.0, 14.0, 6.0],
+                            [1.0, 5.0, 8.0, 16.0, 12.0, 13.0, 22.0, 17.0, 6.0])
+
+    households = [{'ID': i+1, 'lat': 40.9 + i*1e-4, 'lon': -73.8} for i in range(1200)]
+    # Shard households do not have to be contiguous
+    shards = [{'age': young[0], 'head_age': young[1], 'household_size': young[2], 'n_agents': 1600,
+                    'house_IDs': list(range(1, 1201, 2))},
+                {'age': old[0], 'head_age': old[1], 'household_size': old[2], 'n_agents': 1600,
+                    'house_IDs': list(range(2, 1201, 2))}]
+
+    ut.test_pass(check_shards(shards, params, files, households), 'Sharded household generation')
+    ut.test_pass(check_invalid(shards, params, files, households), 'Invalid shards')
+
+    for fname in files + young + old:
+        os.remove(fname)
@@ -0,0 +1,135 @@
+# ------------------------------------------------------------------
+#
+#   Tests for spatial index and leisure location queries
+#
+# ------------------------------------------------------------------
+
+import sys
+py_path = '../../tools/'
+sys.path.insert(0, py_path)
+
+py_path = '../../src/mobility/'
+sys.path.insert(0, py_path)
+
+import numpy as np
+import utils as ut
+from colors import *
+
+import abm_utils as aut
+import abm_spatial as spatial
+import abm_public as apb
+
+#
+# Supporting functions
+#
+
+def random_points(n, rng):
+    ''' n random points in and around New Rochelle '''
+    return rng.uniform(40.85, 41.05, n), rng.uniform(-73.9, -73.7, n)
+
+def brute_force(lat, lon, loc_lat, loc_lon):
+    ''' All distances and location indices, sorted for each point '''
+
+    dist = aut.compute_distances(lat[:,None], lon[:,None], loc_lat, loc_lon)
+    idx = np.broadcast_to(np.arange(len(loc_lat)), dist.shape)
+    srt = np.lexsort((idx, dist), axis=1)
+    return np.take_along_axis(idx, srt, axis=1), np.take_along_axis(dist, srt, axis=1)
+
+def check_distances(rng):
+    ''' Vectorized distances same as one at a time '''
+
+    lat1, lon1 = random_points(50, rng)
+    lat2, lon2 = random_points(50, rng)
+    dist = aut.compute_distances(lat1, lon1, lat2, lon2)
+    for i in range(50):
+        exp = aut.compute_distance({'lat': lat1[i], 'lon': lon1[i]}, {'lat': lat2[i], 'lon': lon2[i]})
+        if not ut.float_equality(dist[i], exp, 1e-10):
+            print('Different distance ' + str(dist[i]) + ' ' + str(exp))
+            return False
+    return True
+
+def check_knn(rng):
+    ''' Nearest neighbors same as brute force, including
+            points outside the grid and small cells '''
+
+    loc_lat, loc_lon = random_points(2000, rng)
+    lat, lon = random_points(500, rng)
+    lat = np.concatenate((lat, [41.3, 40.5, 40.95]))
+    lon = np.concatenate((lon, [-73.8, -74.2, -73.3]))
+    exp_idx, exp_dist = brute_force(lat, lon, loc_lat, loc_lon)
+
+    for cell_size in [0.2, 1.0, 5.0]:
+        index = spatial.GridIndex(loc_lat, loc_lon, cell_size)
+        for k in [1, 7, 100]:
+            idx, dist = index.query_knn(lat, lon, k)
+            if not (np.array_equal(idx, exp_idx[:,:k]) and np.array_equal(dist, exp_dist[:,:k])):
+                print('Wrong nearest neighbors for cell size ' + str(cell_size) + ' and k ' + str(k))
+                return False
+    return True
+
+def check_radius(rng):
+    ''' Locations within radius same as brute force '''
+
+    loc_lat, loc_lon = random_points(2000, rng)
+    lat, lon = random_points(300, rng)
+    lat = np.concatenate((lat, [41.3]))
+    lon = np.concatenate((lon, [-73.8]))
+    exp_idx, exp_dist = brute_force(lat, lon, loc_lat, loc_lon)
+
+    for cell_size, radius in [(0.5, 0.5), (1.0, 2.5), (2.0, 0.3)]:
+        index = spatial.GridIndex(loc_lat, loc_lon, cell_size)
+        offsets, idx, dist = index.query_radius(lat, lon, radius)
+        for i in range(len(lat)):
+            n_in = np.count_nonzero(exp_dist[i] <= radius)
+            if not np.array_equal(idx[offsets[i]:offsets[i+1]], exp_idx[i,:n_in]):
+                print('Wrong locations within radius ' + str(radius) + ' for point ' + str(i))
+                return False
+        if offsets[-1] != len(idx) or len(dist) != len(idx):
+            print('Inconsistent offsets')
+            return False
+    return True
+
+def check_candidates(leisure):
+    ''' Candidate tables of leisure locations '''
+
+    lat = np.array([40.91, 40.99])
+    lon = np.array([-73.78, -73.82])
+    dist = aut.compute_distances(lat[:,None], lon[:,None],
+                [x['lat'] for x in leisure.leisure_locations], [x['lon'] for x in leisure.leisure_locations])
+
+    # k nearest, IDs start from 1
+    offsets, IDs, distances = leisure.candidate_table(lat, lon, k=3)
+    if offsets.tolist() != [0, 3, 6] or IDs.dtype != np.int32 or distances.dtype != np.float32:
+        print('Wrong format of the candidate table')
+        return False
+    for i in range(2):
+        exp = (np.argsort(dist[i], kind='stable')[:3] + 1).tolist()
+        if IDs[offsets[i]:offsets[i+1]].tolist() != exp:
+            print('Wrong nearest leisure locations')
+            return False
+
+    # Nearest within a radius and radius only
+    radius = 3.0
+    off_k, IDs_k, dist_k = leisure.candidate_table(lat, lon, k=len(leisure.leisure_locations), radius=radius)
+    off_r, IDs_r, dist_r = leisure.candidate_table(lat, lon, radius=radius)
+    for i in range(2):
+        exp = set((np.flatnonzero(dist[i] <= radius) + 1).tolist())
+        if set(IDs_k[off_k[i]:off_k[i+1]].tolist()) != exp or set(IDs_r[off_r[i]:off_r[i+1]].tolist()) != exp:
+            print('Wrong leisure locations within radius')
+            return False
+    return True
+
+#
+# Tests
+#
+
+rng = np.random.default_rng(38)
+
+ut.test_pass(check_distances(rng), 'Vectorized distances')
+ut.test_pass(check_knn(rng), 'Nearest neighbors')
+ut.test_pass(check_radius(rng), 'Locations within radius')
+
+fleisureIn = 'test_data/core_poi_NRIn_LeisureTrimmed.csv'
+fleisureOut = 'test_data/core_poi_NROut_LeisureTrimmed.csv'
+leisure = apb.LeisureLocations(fleisureIn, fleisureOut, True)
+ut.test_pass(check_candidates(leisure), 'Leisure candidate tables')
@@ -1,4 +1,6 @@
 import csv
+import contextlib
+import multiprocessing as mp
 
 #
 # The original SafeGraph data are uploaded to Google drive due to the size limit of GitHub
@@ -7,66 +9,73 @@ import csv
 # with 1 group (5 files) of 2020 and 3 groups (6 files each) of 2021
 #
 
-def convertFile(inFileName, outFileName):
-    ''' Convert the comma separated file to a tab separated file for future processing '''
-    csv.writer(open(outFileName, 'w+'), delimiter='\t').writerows(csv.reader(open(inFileName)))
+# Columns kept from the raw data: building's name, top_category, latitude, longitude, zip code
+# (the raw data from 2020 and 2021 has different layout)
+columns2020 = [2, 5, 8, 9, 13]
+columns2021 = [4, 7, 10, 11, 15]
+
+# Cities with known zip codes, see getInTownZip and getOutOfTownZip
+supportedCities = ["Utica", "Colonie", "NewRochelle"]
+
+def cleanField(field):
+    ''' Remove tabs and line breaks inside a field so that each building stays on one tab separated line '''
+    return ' '.join(field.replace('\t', ' ').splitlines())
+
+def streamFile(inFileName, outFileName, columns, zipSet=None):
+    ''' Read the comma separated SafeGraph file once and write the given columns tab separated,
+        keeping only buildings with zip code in zipSet (all if None), return number of buildings kept '''
+
+    countKept = 0
+    with open(inFileName, 'r', newline='') as inFile, open(outFileName, 'w') as outFile:
+        reader = csv.reader(inFile)
+        header = next(reader)
+        outFile.write('\t'.join([cleanField(header[i]) for i in columns]) + '\n')
+        for row in reader:
+            if zipSet is not None and row[columns[4]].strip() not in zipSet:
+                continue
+            outFile.write('\t'.join([cleanField(row[i]) for i in columns]) + '\n')
+            countKept += 1
+    return countKept
+
+def getPartNumbers(year, group=0):
+    ''' Return the numbers of the raw data files (parts) for given year and group '''
 
-def filterFile2020(inFileName, outFileName):
-    ''' Clean up the 2020 SafeGraph data file, keeping building's name, top_category, latitude, longitude, zip code '''
-    with open(inFileName, 'r') as inFile, open(outFileName, 'w') as outFile:
-        for line in inFile:
-            lineList = line.split('\t')
-            newLine = '\t'.join([lineList[2], lineList[5], lineList[8], lineList[9], lineList[13]])
-            outFile.write(newLine+'\n')
+    if year == "2020":
+        return list(range(1, 6))
+    elif year == "2021" and group in [1, 2, 3]:
+        return list(range(6*group-5, 6*group+1))
+    else:
+        raise Exception("The year/group is not supported.")
 
-def filterFile2021(inFileName, outFileName):
-    ''' Clean up the 2021 SafeGraph data file, keeping building's name, top_category, latitude, longitude, zip code '''
-    with open(inFileName, 'r') as inFile, open(outFileName, 'w') as outFile:
-        for line in inFile:
-            lineList = line.split('\t')
-            newLine = '\t'.join([lineList[4], lineList[7], lineList[10], lineList[11], lineList[15]])
-            outFile.write(newLine+'\n')
+def getAllZip(cityList=supportedCities):
+    ''' Build and return a set of all in-town and out-of-town zip codes of the cities '''
 
-def preProcessing(year, group=0):
-    ''' Pre-process the SafeGraph data, calling the convertFile and filterFile function, output text files '''
+    zipSet = set()
+    for city in cityList:
+        zipSet.update(getInTownZip(city))
+        zipSet.update(getOutOfTownZip(city))
+    return zipSet
 
-    # Note that the 2020 data and 2021 data call different filterFile202x functions accordingly
-    # (Since the raw data from 2020 and 2021 has different layout)
+def preProcessing(year, group=0, zipSet=None, nProc=None):
+    ''' Pre-process the SafeGraph data, streaming each raw file once, output text files '''
 
-    if year == "2020":
-        for i in range(1,6):
-            inFile = "2020_core_poi-part" + str(i) + ".csv"
-            tabFile = "2020_core_poi-part" + str(i) + ".tsv"
-            outFile = "2020_poi-part" + str(i) + ".txt"
-            convertFile(inFile, tabFile)
-            filterFile2020(tabFile, outFile)
-
-    elif year == "2021" and group == 1:
-        for i in range(1,7):
-            inFile = "2021_core_poi-part" + str(i) + ".csv"
-            tabFile = "2021_core_poi-part" + str(i) + ".tsv"
-            outFile = "2021_poi-part" + str(i) + ".txt"
-            convertFile(inFile, tabFile)
-            filterFile2021(tabFile, outFile)
-
-    elif year == "2021" and group == 2:
-        for i in range(7, 13):
-            inFile = "2021_core_poi-part" + str(i) + ".csv"
-            tabFile = "2021_core_poi-part" + str(i) + ".tsv"
-            outFile = "2021_poi-part" + str(i) + ".txt"
-            convertFile(inFile, tabFile)
-            filterFile2021(tabFile, outFile)
-
-    elif year == "2021" and group == 3:
-        for i in range(13, 19):
-            inFile = "2021_core_poi-part" + str(i) + ".csv"
-            tabFile = "2021_core_poi-part" + str(i) + ".tsv"
-            outFile = "2021_poi-part" + str(i) + ".txt"
-            convertFile(inFile, tabFile)
-            filterFile2021(tabFile, outFile)
+    # Only buildings with zip codes in zipSet are kept, by default
+    # all zip codes of the supported cities; nProc is the number
+    # of processes, each processes one part at a time (default - all cores)
 
-    else:
-        raise Exception("The year/group is not supported.")
+    if zipSet is None:
+        zipSet = getAllZip()
+    columns = columns2020 if year == "2020" else columns2021
+
+    tasks = []
+    for i in getPartNumbers(year, group):
+        inFile = year + "_core_poi-part" + str(i) + ".csv"
+        outFile = year + "_poi-part" + str(i) + ".txt"
+        tasks.append((inFile, outFile, columns, zipSet))
+
+    with mp.Pool(nProc) as pool:
+        counts = pool.starmap(streamFile, tasks)
+    print(year, group, ":", sum(counts), "buildings kept from", len(tasks), "files")
 
 def buildLeisureMap():
     ''' Build and return a map that contains all categories that are considered leisure locations '''
@@ -200,6 +209,40 @@ def matchUncat():
 
     return catMap
 
+class KeywordMatcher(object):
+    ''' Map an uncategorized building's name to a business category in one scan of its words '''
+
+    def __init__(self, keyMap):
+        ''' Build the matcher from a map of key word to business category, see matchUncat '''
+
+        # Key words are matched as whole words, key words without a category are skipped;
+        # key words made of several words are grouped by their first word, longest first
+        self.words = {}
+        self.phrases = {}
+        for key, category in keyMap.items():
+            words = tuple(key.split())
+            if len(words) == 0 or category == '':
+                continue
+            if len(words) == 1:
+                self.words[words[0]] = category
+            else:
+                self.phrases.setdefault(words[0], []).append((words, category))
+        for candidates in self.phrases.values():
+            candidates.sort(key=lambda x: -len(x[0]))
+
+    def match(self, name):
+        ''' Return the category of the first key word in the name, empty string if there is none '''
+
+        words = name.split()
+        for i, word in enumerate(words):
+            if word in self.phrases:
+                for phrase, category in self.phrases[word]:
+                    if tuple(words[i:i+len(phrase)]) == phrase:
+                        return category
+            if word in self.words:
+                return self.words[word]
+        return ''
+
 def matchTopCatOcc():
     ''' Build and return a map from SafeGraph category to occupation '''
 
@@ -232,245 +275,156 @@ def printIgnored(countIgnored, countTotal, city, category, inOrOut):
     print(countIgnored, ",", percent, "% uncategorized buildings were ignored in", \
           city, category, inOrOut)
 
-def cleanLeisure(inFileNameList, outFileName, cityName, inOrOut):
-    ''' Output all leisure locations in/out-of-town in given city, return number of ignored & total buildings '''
-
-    leisureMap = buildLeisureMap()
-    unCatMap = matchUncat()
-    countIgnored = 0
-    countTotal = 0
+def newOutput(outFileName, cityName, category, inOrOut):
+    ''' Build and return the description of one output file: buildings of the category in/out-of-town in the city '''
 
     if inOrOut == "in":
         zipList = getInTownZip(cityName)
     elif inOrOut == "out":
         zipList = getOutOfTownZip(cityName)
     else:
-        return False
+        raise Exception("Only in and out are supported.")
+    if category not in ["leisure", "work", "occupation"]:
+        raise Exception("The category is not supported.")
 
-    with open(outFileName, 'w') as outFile:
-        print("location_name\ttop_category\tlatitude\tlongitude", file=outFile)
-        for eachFileName in inFileNameList:
-            with open(eachFileName, 'r') as inFile:
-                next(inFile)
-                for line in inFile:
-                    infoList = line.split('\t')
-                    zipcode = infoList[4].strip()
-                    if zipcode in zipList:
-                        if infoList[1] == '': # uncategorized
-                            posName = infoList[0].split()
-                            for word in posName:
-                                if infoList[1] != '':
-                                    break
-                                try:
-                                    infoList[1] = unCatMap[word]
-                                except KeyError:
-                                    continue
-                            if infoList[1] == '':
-                                countIgnored += 1
-                        try:
-                            if (leisureMap[infoList[1]] == 1):
-                                newLine = '\t'.join(infoList[:4])
-                                countTotal += 1
-                                print(newLine, file=outFile)
-                        except KeyError: # top_category not in leisureMap
-                            continue
+    return {"fileName": outFileName, "city": cityName, "category": category, "inOrOut": inOrOut,
+            "zipList": zipList, "countIgnored": 0, "countTotal": 0}
 
-    printIgnored(countIgnored, countTotal, cityName, "leisure", inOrOut)
+def getHeader(category):
+    ''' Return the header line of an output file of the category '''
 
-def cleanWork(inFileNameList, outFileName, cityName, inOrOut, occupation = False):
-    ''' Output all workplaces in/out-of-town in given city, return number of ignored & total buildings '''
+    if category == "leisure":
+        return "location_name\ttop_category\tlatitude\tlongitude"
+    elif category == "work":
+        return "location_name\tcategory\tlatitude\tlongitude"
+    else:
+        return "location_name\toccupation\tlatitude\tlongitude"
 
-    workMap = buildWorkMap()
-    catMap = matchCategory()
-    unCatMap = matchUncat()
-    occMap_Top = matchTopCatOcc()
-    occMap_Code = matchCatCodeOcc()
-    countIgnored = 0
-    countTotal = 0
+def getCategory(topCat, category, maps):
+    ''' Return what is written as the building's category in an output file of the category,
+        None if the building does not belong in that file '''
 
-    if inOrOut == "in":
-        zipList = getInTownZip(cityName)
-    elif inOrOut == "out":
-        zipList = getOutOfTownZip(cityName)
+    if category == "leisure":
+        if topCat in maps["leisure"]:
+            return topCat
+        return None
+    elif category == "work":
+        # Workplaces are all buildings that are NOT in workMap
+        # and have a business category
+        if topCat in maps["work"]:
+            return None
+        return maps["category"].get(topCat)
     else:
-        return False
+        if topCat in maps["occupationCode"]:
+            return maps["occupationCode"][topCat]
+        return maps["occupationTop"].get(topCat)
+
+def scanFiles(inFileNameList, outputList, matcher=None):
+    ''' Read each pre-processed file once, writing every building to all outputs whose zip codes include it '''
+
+    # outputList - list of outputs from newOutput, counts of
+    #   ignored and total buildings are stored in each output
+    # matcher - KeywordMatcher for uncategorized buildings, built here if not given
+
+    if matcher is None:
+        matcher = KeywordMatcher(matchUncat())
+    maps = {"leisure": buildLeisureMap(), "work": buildWorkMap(), "category": matchCategory(),
+            "occupationTop": matchTopCatOcc(), "occupationCode": matchCatCodeOcc()}
+
+    # Zip code : all outputs that include it
+    routes = {}
+    for output in outputList:
+        for zipcode in set(output["zipList"]):
+            routes.setdefault(zipcode, []).append(output)
+
+    with contextlib.ExitStack() as stack:
+        outFiles = [stack.enter_context(open(output["fileName"], 'w')) for output in outputList]
+        for output, outFile in zip(outputList, outFiles):
+            output["file"] = outFile
+            print(getHeader(output["category"]), file=outFile)
 
-    with open(outFileName, 'w') as outFile:
-        if occupation:
-            print("location_name\toccupation\tlatitude\tlongitude", file=outFile)
-        else:
-            print("location_name\tcategory\tlatitude\tlongitude", file=outFile)
         for eachFileName in inFileNameList:
             with open(eachFileName, 'r') as inFile:
                 next(inFile)
                 for line in inFile:
                     infoList = line.split('\t')
-                    zipcode = infoList[4].strip()
-                    if zipcode in zipList:
-                        if infoList[1] == '': # uncategorized
-                            posName = infoList[0].split()
-                            infoList[1] = ''
-                            for word in posName:
-                                if infoList[1] != '':
-                                    break
-                                try:
-                                    infoList[1] = unCatMap[word]
-                                except KeyError:
-                                    continue
-                            if infoList[1] == '':
-                                countIgnored += 1
-                        if occupation: # get occupation
-                            try:
-                                infoList[1] = occMap_Code[infoList[1]]
-                            except KeyError:
-                                try:
-                                    infoList[1] = occMap_Top[infoList[1]]
-                                except KeyError:
-                                    continue
-                            newLine = '\t'.join(infoList[:4])
-                            countTotal += 1
-                            print(newLine, file=outFile)
-                        else: # get workplaces
-                            try:
-                                if (workMap[infoList[1]] == 1):
-                                    pass
-                            except KeyError:  # building is a workplace
-                                topCat = infoList[1]
-                                try:
-                                    infoList[1] = catMap[topCat]
-                                except KeyError:
-                                    continue
-                                newLine = '\t'.join(infoList[:4])
-                                countTotal += 1
-                                print(newLine, file=outFile)
-    if occupation:
-        printIgnored(countIgnored, countTotal, cityName, "occupation", inOrOut)
-    else:
-        printIgnored(countIgnored, countTotal, cityName, "work", inOrOut)
+                    outputs = routes.get(infoList[4].strip())
+                    if outputs is None:
+                        continue
+                    ignored = False
+                    if infoList[1] == '': # uncategorized
+                        infoList[1] = matcher.match(infoList[0])
+                        ignored = (infoList[1] == '')
+                    for output in outputs:
+                        if ignored:
+                            output["countIgnored"] += 1
+                        category = getCategory(infoList[1], output["category"], maps)
+                        if category is None:
+                            continue
+                        newLine = '\t'.join([infoList[0], category, infoList[2], infoList[3]])
+                        output["countTotal"] += 1
+                        print(newLine, file=output["file"])
 
-def dataProcessing(city, category, year, group=0):
-    ''' Process SafeGraph data for given city, category, year, and group(optional) '''
+    for output in outputList:
+        del output["file"]
+        printIgnored(output["countIgnored"], output["countTotal"], output["city"], output["category"], output["inOrOut"])
 
-    if category == "leisure":
-        if year == "2020":
-            cleanLeisure(["2020_poi-part1.txt", "2020_poi-part2.txt", "2020_poi-part3.txt", \
-                    "2020_poi-part4.txt", "2020_poi-part5.txt"], "2020_core_poi_"+city+"In_LeisureTrimmed.csv", city, "in")
-            cleanLeisure(["2020_poi-part1.txt", "2020_poi-part2.txt", "2020_poi-part3.txt", \
-                    "2020_poi-part4.txt", "2020_poi-part5.txt"], "2020_core_poi_"+city+"Out_LeisureTrimmed.csv", city, "out")
-
-        elif year == "2021":
-            if group == 1:
-                cleanLeisure(["2021_poi-part1.txt", "2021_poi-part2.txt", "2021_poi-part3.txt", \
-                             "2021_poi-part4.txt", "2021_poi-part5.txt", "2021_poi-part5.txt"], \
-                             "2021_1_core_poi_"+city+"In_LeisureTrimmed.csv", city, "in")
-                cleanLeisure(["2021_poi-part1.txt", "2021_poi-part2.txt", "2021_poi-part3.txt", \
-                             "2021_poi-part4.txt", "2021_poi-part5.txt", "2021_poi-part6.txt"], \
-                             "2021_1_core_poi_"+city+"Out_LeisureTrimmed.csv", city, "out")
-
-            elif group == 2:
-                cleanLeisure(["2021_poi-part7.txt", "2021_poi-part8.txt", "2021_poi-part9.txt", \
-                             "2021_poi-part10.txt", "2021_poi-part11.txt", "2021_poi-part12.txt"], \
-                             "2021_2_core_poi_"+city+"In_LeisureTrimmed.csv", city, "in")
-                cleanLeisure(["2021_poi-part7.txt", "2021_poi-part8.txt", "2021_poi-part9.txt", \
-                             "2021_poi-part10.txt", "2021_poi-part11.txt", "2021_poi-part12.txt"], \
-                             "2021_2_core_poi_"+city+"Out_LeisureTrimmed.csv", city, "out")
-
-            elif group == 3:
-                cleanLeisure(["2021_poi-part13.txt", "2021_poi-part14.txt", "2021_poi-part15.txt",\
-                             "2021_poi-part16.txt", "2021_poi-part17.txt", "2021_poi-part18.txt"], \
-                             "2021_3_core_poi_"+city+"In_LeisureTrimmed.csv", city, "in")
-                cleanLeisure(["2021_poi-part13.txt", "2021_poi-part14.txt", "2021_poi-part15.txt", \
-                             "2021_poi-part16.txt", "2021_poi-part17.txt", "2021_poi-part18.txt"], \
-                             "2021_3_core_poi_"+city+"Out_LeisureTrimmed.csv", city, "out")
+def cleanLeisure(inFileNameList, outFileName, cityName, inOrOut, matcher=None):
+    ''' Output all leisure locations in/out-of-town in given city, return number of ignored & total buildings '''
 
-            else:
-                raise Exception("The group is not supported.")
-        else:
-            raise Exception("The year is not supported.")
+    # matcher - KeywordMatcher for uncategorized buildings, built here if not given
 
-    elif category == "work":
-        if year == "2020":
-            cleanWork(["2020_poi-part1.txt", "2020_poi-part2.txt", "2020_poi-part3.txt", \
-                          "2020_poi-part4.txt", "2020_poi-part5.txt"], "2020_core_poi_"+city+"In_WorkTrimmed.csv", city, "in")
-            cleanWork(["2020_poi-part1.txt", "2020_poi-part2.txt", "2020_poi-part3.txt", \
-                          "2020_poi-part4.txt", "2020_poi-part5.txt"], "2020_core_poi_"+city+"Out_WorkTrimmed.csv", city, "out")
-
-        elif year == "2021":
-            if group == 1:
-                cleanWork(["2021_poi-part1.txt", "2021_poi-part2.txt", "2021_poi-part3.txt", \
-                             "2021_poi-part4.txt", "2021_poi-part5.txt", "2021_poi-part6.txt"], \
-                             "2021_1_core_poi_"+city+"In_WorkTrimmed.csv", city, "in")
-                cleanWork(["2021_poi-part1.txt", "2021_poi-part2.txt", "2021_poi-part3.txt", \
-                             "2021_poi-part4.txt", "2021_poi-part5.txt", "2021_poi-part6.txt"], \
-                             "2021_1_core_poi_"+city+"Out_WorkTrimmed.csv", city, "out")
-
-            elif group == 2:
-                cleanWork(["2021_poi-part7.txt", "2021_poi-part8.txt", "2021_poi-part9.txt", \
-                             "2021_poi-part10.txt", "2021_poi-part11.txt", "2021_poi-part12.txt"], \
-                             "2021_2_core_poi_"+city+"In_WorkTrimmed.csv", city, "in")
-                cleanWork(["2021_poi-part7.txt", "2021_poi-part8.txt", "2021_poi-part9.txt", \
-                             "2021_poi-part10.txt", "2021_poi-part11.txt", "2021_poi-part12.txt"], \
-                             "2021_2_core_poi_"+city+"Out_WorkTrimmed.csv", city, "out")
-
-            elif group == 3:
-                cleanWork(["2021_poi-part13.txt", "2021_poi-part14.txt", "2021_poi-part15.txt", \
-                             "2021_poi-part16.txt", "2021_poi-part17.txt", "2021_poi-part18.txt"], \
-                             "2021_3_core_poi_"+city+"In_WorkTrimmed.csv", city, "in")
-                cleanWork(["2021_poi-part13.txt", "2021_poi-part14.txt", "2021_poi-part15.txt", \
-                             "2021_poi-part16.txt", "2021_poi-part17.txt", "2021_poi-part18.txt"], \
-                             "2021_3_core_poi_"+city+"Out_WorkTrimmed.csv", city, "out")
+    if inOrOut not in ["in", "out"]:
+        return False
+    output = newOutput(outFileName, cityName, "leisure", inOrOut)
+    scanFiles(inFileNameList, [output], matcher)
+    return output["countIgnored"], output["countTotal"]
 
-            else:
-                raise Exception("The group is not supported.")
-        else:
-            raise Exception("The year is not supported.")
-
-    elif category == "occupation":
-        if year == "2020":
-            cleanWork(["2020_poi-part1.txt", "2020_poi-part2.txt", "2020_poi-part3.txt", \
-                  "2020_poi-part4.txt", "2020_poi-part5.txt"], "2020_core_poi_"+city+"In_OccupationTrimmed.csv", city, "in", True)
-            cleanWork(["2020_poi-part1.txt", "2020_poi-part2.txt", "2020_poi-part3.txt", \
-                  "2020_poi-part4.txt", "2020_poi-part5.txt"], "2020_core_poi_"+city+"Out_OccupationTrimmed.csv", city, "out", True)
-
-        elif year == "2021":
-            if group == 1:
-                cleanWork(["2021_poi-part1.txt", "2021_poi-part2.txt", "2021_poi-part3.txt", \
-                             "2021_poi-part4.txt", "2021_poi-part5.txt", "2021_poi-part6.txt"], \
-                             "2021_1_core_poi_"+city+"In_OccupationTrimmed.csv", city, "in", True)
-                cleanWork(["2021_poi-part1.txt", "2021_poi-part2.txt", "2021_poi-part3.txt", \
-                             "2021_poi-part4.txt", "2021_poi-part5.txt", "2021_poi-part6.txt"], \
-                             "2021_1_core_poi_"+city+"Out_OccupationTrimmed.csv", city, "out", True)
-
-            elif group == 2:
-                cleanWork(["2021_poi-part7.txt", "2021_poi-part8.txt", "2021_poi-part9.txt", \
-                             "2021_poi-part10.txt", "2021_poi-part11.txt", "2021_poi-part12.txt"], \
-                             "2021_2_core_poi_"+city+"In_OccupationTrimmed.csv", city, "in", True)
-                cleanWork(["2021_poi-part7.txt", "2021_poi-part8.txt", "2021_poi-part9.txt", \
-                             "2021_poi-part10.txt", "2021_poi-part11.txt", "2021_poi-part12.txt"], \
-                             "2021_2_core_poi_"+city+"Out_OccupationTrimmed.csv", city, "out", True)
-
-            elif group == 3:
-                cleanWork(["2021_poi-part13.txt", "2021_poi-part14.txt", "2021_poi-part15.txt", "2021_poi-part16.txt", \
-                     "2021_poi-part17.txt", "2021_poi-part18.txt"], \
-                    "2021_3_core_poi_"+city+"In_OccupationTrimmed.csv", city, "in", True)
-                cleanWork(["2021_poi-part13.txt", "2021_poi-part14.txt", "2021_poi-part15.txt", "2021_poi-part16.txt", \
-                     "2021_poi-part17.txt", "2021_poi-part18.txt"], \
-                    "2021_3_core_poi_"+city+"Out_OccupationTrimmed.csv", city, "out", True)
+def cleanWork(inFileNameList, outFileName, cityName, inOrOut, occupation = False, matcher=None):
+    ''' Output all workplaces in/out-of-town in given city, return number of ignored & total buildings '''
 
-            else:
-                raise Exception("The group is not supported.")
-        else:
-            raise Exception("The year is not supported.")
+    # matcher - KeywordMatcher for uncategorized buildings, built here if not given
 
+    if inOrOut not in ["in", "out"]:
+        return False
+    if occupation:
+        output = newOutput(outFileName, cityName, "occupation", inOrOut)
     else:
-        raise Exception("The category is not supported.")
+        output = newOutput(outFileName, cityName, "work", inOrOut)
+    scanFiles(inFileNameList, [output], matcher)
+    return output["countIgnored"], output["countTotal"]
+
+def getOutputName(city, category, inOrOut, year, group=0):
+    ''' Return the name of the output file for given city, category, in/out-of-town, year, and group '''
+
+    fileTypes = {"leisure": "LeisureTrimmed", "work": "WorkTrimmed", "occupation": "OccupationTrimmed"}
+    if year == "2020":
+        prefix = "2020_core_poi_"
+    else:
+        prefix = year + "_" + str(group) + "_core_poi_"
+    return prefix + city + inOrOut.capitalize() + "_" + fileTypes[category] + ".csv"
+
+def batchProcessing(cityList, categoryList, year, group=0, matcher=None):
+    ''' Process SafeGraph data for all combinations of given cities and categories,
+        for given year and group(optional), reading each pre-processed file only once '''
+
+    inFileNameList = [year + "_poi-part" + str(i) + ".txt" for i in getPartNumbers(year, group)]
+    outputList = []
+    for city in cityList:
+        for category in categoryList:
+            for inOrOut in ["in", "out"]:
+                outputList.append(newOutput(getOutputName(city, category, inOrOut, year, group), \
+                                  city, category, inOrOut))
+    scanFiles(inFileNameList, outputList, matcher)
+
+def dataProcessing(city, category, year, group=0):
+    ''' Process SafeGraph data for given city, category, year, and group(optional) '''
+    batchProcessing([city], [category], year, group)
 
 def testMain():
     # Pre-processing for sample test file
-    convertFile("test_file_2020_raw_safegraph.csv", "test_file_2020_raw_safegraph.tsv")
-    filterFile2020("test_file_2020_raw_safegraph.tsv", "test_file_2020_clean_safegraph.txt")
-    convertFile("test_file_2021_raw_safegraph.csv", "test_file_2021_raw_safegraph.tsv")
-    filterFile2021("test_file_2021_raw_safegraph.tsv", "test_file_2021_clean_safegraph.txt")
+    streamFile("test_file_2020_raw_safegraph.csv", "test_file_2020_clean_safegraph.txt", columns2020)
+    streamFile("test_file_2021_raw_safegraph.csv", "test_file_2021_clean_safegraph.txt", columns2021)
 
     # Data processing for sample test file
     cleanLeisure(["test_file_2020_clean_safegraph.txt"], "2020_core_poi_" + "Utica" + "In_LeisureTrimmed.csv", \
@@ -498,49 +452,17 @@ if __name__ == '__main__':
     preProcessing("2021", 2)
     preProcessing("2021", 3)
 
-    # Process SafeGraph data for specific city, category, and time frame
+    # Process SafeGraph data for all cities and categories, one time frame at a time
     # city: Utica, Colonie, NewRochelle (note: no spaces)
     # category: leisure, work, occupation
     # year: 2020, 2021
     # group: (only for year 2021) 1, 2, 3
-    # dataProcessing(city, category, year, group), where param "group" is optional
-
-    dataProcessing("Utica", "leisure", "2020")
-    dataProcessing("Utica", "leisure", "2021", 1)
-    dataProcessing("Utica", "leisure", "2021", 2)
-    dataProcessing("Utica", "leisure", "2021", 3)
-    dataProcessing("Colonie", "leisure", "2020")
-    dataProcessing("Colonie", "leisure", "2021", 1)
-    dataProcessing("Colonie", "leisure", "2021", 2)
-    dataProcessing("Colonie", "leisure", "2021", 3)
-    dataProcessing("NewRochelle", "leisure", "2020")
-    dataProcessing("NewRochelle", "leisure", "2021", 1)
-    dataProcessing("NewRochelle", "leisure", "2021", 2)
-    dataProcessing("NewRochelle", "leisure", "2021", 3)
-
-    dataProcessing("Utica", "work", "2020")
-    dataProcessing("Utica", "work", "2021", 1)
-    dataProcessing("Utica", "work", "2021", 2)
-    dataProcessing("Utica", "work", "2021", 3)
-    dataProcessing("Colonie", "work", "2020")
-    dataProcessing("Colonie", "work", "2021", 1)
-    dataProcessing("Colonie", "work", "2021", 2)
-    dataProcessing("Colonie", "work", "2021", 3)
-    dataProcessing("NewRochelle", "work", "2020")
-    dataProcessing("NewRochelle", "work", "2021", 1)
-    dataProcessing("NewRochelle", "work", "2021", 2)
-    dataProcessing("NewRochelle", "work", "2021", 3)
-
-    dataProcessing("Utica", "occupation", "2020")
-    dataProcessing("Utica", "occupation", "2021", 1)
-    dataProcessing("Utica", "occupation", "2021", 2)
-    dataProcessing("Utica", "occupation", "2021", 3)
-    dataProcessing("Colonie", "occupation", "2020")
-    dataProcessing("Colonie", "occupation", "2021", 1)
-    dataProcessing("Colonie", "occupation", "2021", 2)
-    dataProcessing("Colonie", "occupation", "2021", 3)
-    dataProcessing("NewRochelle", "occupation", "2020")
-    dataProcessing("NewRochelle", "occupation", "2021", 1)
-    dataProcessing("NewRochelle", "occupation", "2021", 2)
-    dataProcessing("NewRochelle", "occupation", "2021", 3)
-
+    # batchProcessing(cities, categories, year, group), where param "group" is optional
+    # dataProcessing(city, category, year, group) processes a single city and category
+
+    matcher = KeywordMatcher(matchUncat())
+    categories = ["leisure", "work", "occupation"]
+    batchProcessing(supportedCities, categories, "2020", matcher=matcher)
+    batchProcessing(supportedCities, categories, "2021", 1, matcher)
+    batchProcessing(supportedCities, categories, "2021", 2, matcher)
+    batchProcessing(supportedCities, categories, "2021", 3, matcher)